@@ -1,7 +1,10 @@
 import os
 import sys
 import json
+import time
 import logging
+import threading
+import pandas as pd
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
 
 logging.basicConfig(level=logging.DEBUG,
@@ -24,8 +27,8 @@ except Exception as e:
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here' 
 
-DATA_DIR = os.path.join(current_dir, 'data')
-MODELS_DIR = os.path.join(current_dir, 'models')
+DATA_DIR = os.environ.get('MOVIES_DATA_DIR', os.path.join(current_dir, 'data'))
+MODELS_DIR = os.environ.get('MOVIES_MODELS_DIR', os.path.join(current_dir, 'models'))
 logger.debug(f"DATA_DIR: {DATA_DIR}")
 logger.debug(f"MODELS_DIR: {MODELS_DIR}")
 logger.debug(f"Файл movies.csv существует: {os.path.exists(os.path.join(DATA_DIR, 'movies.csv'))}")
@@ -36,22 +39,54 @@ try:
         ratings_path=os.path.join(DATA_DIR, 'ratings.csv'),
         user_profiles_path=os.path.join(MODELS_DIR, 'user_profiles.pkl'),
         kmeans_model_path=os.path.join(MODELS_DIR, 'kmeans_model.pkl'),
-        knn_model_path=os.path.join(MODELS_DIR, 'knn_model.pkl')
+        knn_model_path=os.path.join(MODELS_DIR, 'knn_model.pkl'),
+        content_model_path=os.path.join(MODELS_DIR, 'content_model.pkl'),
+        item_model_path=os.path.join(MODELS_DIR, 'item_model.pkl'),
+        mf_model_path=os.path.join(MODELS_DIR, 'mf_model.pkl'),
+        bundle_path=os.path.join(MODELS_DIR, 'bundle'),
+        csv_cache_dir=os.path.join(DATA_DIR, '.cache'),
+        recommendation_method=os.environ.get('MOVIES_RECOMMENDATION_METHOD', 'users'),
+        result_cache_size=int(os.environ.get('MOVIES_RESULT_CACHE_SIZE', 1024)),
+        result_cache_ttl=float(os.environ.get('MOVIES_RESULT_CACHE_TTL', 300))
     )
     logger.info("Рекомендательная система успешно инициализирована")
 except Exception as e:
     logger.error(f"Ошибка при инициализации рекомендательной системы: {e}")
     raise
 
-DB_PATH = os.path.join(current_dir, 'user_ratings.db')
+DB_PATH = os.environ.get('MOVIES_DB_PATH', os.path.join(current_dir, 'user_ratings.db'))
 logger.debug(f"Путь к базе данных: {DB_PATH}")
 try:
     user_db = UserDatabase(DB_PATH)
+    # Статистика профилей в базе считается по тем же жанрам, что и профили рекомендательной системы
+    user_db.sync_movie_genres(recommender.movie_genre_pairs())
     logger.info("База данных пользователей успешно инициализирована")
 except Exception as e:
     logger.error(f"Ошибка при инициализации базы данных пользователей: {e}")
     raise
 
+# retrain_incremental.py записывает новые версии пакета моделей; приложение подхватывает их без перезапуска
+BUNDLE_CHECK_INTERVAL = float(os.environ.get('MOVIES_BUNDLE_CHECK_INTERVAL', 30))
+bundle_reload_lock = threading.Lock()
+bundle_checked_at = time.monotonic()
+
+
+@app.before_request
+def reload_models_if_updated():
+    """Не чаще раза в BUNDLE_CHECK_INTERVAL секунд проверяет LATEST и загружает новую версию пакета:
+    MovieRecommender.reload_bundle пересчитывает рейтинг популярности и сбрасывает кэш результатов"""
+    global bundle_checked_at
+    if time.monotonic() - bundle_checked_at < BUNDLE_CHECK_INTERVAL or not bundle_reload_lock.acquire(blocking=False):
+        return
+    try:
+        bundle_checked_at = time.monotonic()
+        if recommender.reload_bundle():
+            logger.info(f"Загружена версия {recommender.model_version} пакета моделей")
+    except Exception as e:
+        logger.error(f"Ошибка при перезагрузке пакета моделей: {e}")
+    finally:
+        bundle_reload_lock.release()
+
 @app.route('/')
 def index():
     """Главная страница приложения"""
@@ -63,16 +98,7 @@ def index():
         logger.error(f"Ошибка при получении популярных фильмов: {e}")
         popular_movies = pd.DataFrame(columns=['movieId', 'title', 'genres', 'score'])
 
-    genres_set = set()
-    try:
-        for genres in recommender.movies['genres'].str.split('|'):
-            if isinstance(genres, list):
-                genres_set.update(genres)
-        genres_list = sorted(list(genres_set))
-        logger.debug(f"Получено {len(genres_list)} уникальных жанров")
-    except Exception as e:
-        logger.error(f"Ошибка при получении списка жанров: {e}")
-        genres_list = []
+    genres_list = recommender.genres
 
     user_ratings = {}
     if 'user_id' in session:
@@ -160,13 +186,7 @@ def search_movies():
     logger.debug(f"Поиск фильмов: query='{query}', genre='{genre}'")
 
     try:
-        filtered_movies = recommender.movies
-        if query:
-            filtered_movies = filtered_movies[filtered_movies['title'].str.lower().str.contains(query)]
-        if genre and genre != 'all':
-            filtered_movies = filtered_movies[filtered_movies['genres'].str.contains(genre)]
-
-        filtered_movies = filtered_movies.head(100)
+        filtered_movies = recommender.search_movies(query, genre, limit=100)
         logger.debug(f"Найдено фильмов: {len(filtered_movies)}")
 
         user_ratings = {}
@@ -217,6 +237,7 @@ def rate_movie():
         success = user_db.save_rating(session['user_id'], movie_id, rating)
 
         if success:
+            recommender.invalidate_user(session['user_id'])
             logger.info(
                 f"Оценка успешно сохранена через AJAX: user_id={session['user_id']}, movie_id={movie_id}, rating={rating}")
             return jsonify({
@@ -245,6 +266,69 @@ def rate_movie():
         }), 500
 
 
+@app.route('/rate_movies', methods=['POST'])
+def rate_movies():
+    """Пакет изменений оценок из AJAX-очереди: [{movie_id, rating}], rating = null - удаление оценки"""
+    if 'user_id' not in session:
+        logger.warning("Попытка сохранить оценки без авторизации")
+        return jsonify({
+            'success': False,
+            'message': 'Необходимо войти в систему для сохранения оценок'
+        }), 401
+
+    try:
+        data = request.get_json(force=True)
+        changes = data.get('changes') if isinstance(data, dict) else None
+        if not isinstance(changes, list):
+            logger.warning("Неверные параметры запроса при сохранении оценок")
+            return jsonify({
+                'success': False,
+                'message': 'Неверные параметры запроса'
+            }), 400
+
+        # Повторные изменения одного фильма схлопываются: действует последнее
+        ratings, deletions = {}, set()
+        for change in changes:
+            movie_id = int(change['movie_id'])
+            rating = change.get('rating')
+            if rating is None or rating == '':
+                deletions.add(movie_id)
+                ratings.pop(movie_id, None)
+            else:
+                rating = float(rating)
+                if not 0.5 <= rating <= 5.0:
+                    raise ValueError(f"оценка вне диапазона: {rating}")
+                ratings[movie_id] = rating
+                deletions.discard(movie_id)
+
+        logger.debug(f"Сохранение пакета оценок: user_id={session['user_id']}, "
+                     f"оценок={len(ratings)}, удалений={len(deletions)}")
+
+        success = user_db.apply_rating_changes(session['user_id'], ratings, deletions)
+
+        if success:
+            recommender.invalidate_user(session['user_id'])
+            return jsonify({
+                'success': True,
+                'message': 'Оценки сохранены',
+                'saved': len(ratings),
+                'deleted': len(deletions)
+            })
+        else:
+            logger.warning(f"Ошибка при сохранении пакета оценок: user_id={session['user_id']}")
+            return jsonify({
+                'success': False,
+                'message': 'Ошибка при сохранении оценок'
+            }), 500
+
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"Неверный формат данных при сохранении оценок: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Неверный формат данных: {str(e)}'
+        }), 400
+
+
 @app.route('/save_rating', methods=['POST'])
 def save_rating():
     """Сохранение оценки фильма через форму"""
@@ -271,6 +355,7 @@ def save_rating():
         success = user_db.save_rating(session['user_id'], int(movie_id), rating)
 
         if success:
+            recommender.invalidate_user(session['user_id'])
             logger.info(f"Оценка успешно сохранена: user_id={session['user_id']}, movie_id={movie_id}, rating={rating}")
             return jsonify({
                 'success': True,
@@ -320,6 +405,7 @@ def delete_rating():
         success = user_db.delete_rating(session['user_id'], int(movie_id))
 
         if success:
+            recommender.invalidate_user(session['user_id'])
             logger.info(f"Оценка успешно удалена: user_id={session['user_id']}, movie_id={movie_id}")
             return jsonify({
                 'success': True,
@@ -344,13 +430,15 @@ def get_recommendations():
     logger.debug("Запрос на получение рекомендаций")
 
     user_ratings = {}
+    profile = None
 
     if 'user_id' in session:
-        try:
-            user_ratings = user_db.get_user_ratings(session['user_id'])
-            logger.debug(f"Загружены оценки пользователя из БД: {len(user_ratings)} оценок")
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке оценок пользователя из БД: {e}")
+        # Профиль ведется в базе при каждой записи оценки, сами оценки здесь не читаются
+        profile = user_db.get_user_profile(session['user_id'])
+        if profile is None:
+            logger.error("Ошибка при загрузке профиля пользователя из БД")
+        else:
+            logger.debug(f"Загружен профиль пользователя из БД: {profile.rating_count} оценок")
     else:
         for key, value in request.form.items():
             if key.startswith('rating_') and value:
@@ -363,21 +451,32 @@ def get_recommendations():
                     pass
         logger.debug(f"Загружены оценки из формы: {len(user_ratings)} оценок")
 
-    if not user_ratings:
+    if not user_ratings and not (profile is not None and profile.rating_count):
         logger.warning("Нет оценок для получения рекомендаций")
         return jsonify({
             'success': False,
             'message': 'Пожалуйста, оцените хотя бы один фильм.'
         })
 
-    logger.debug(f"Получение рекомендаций на основе оценок: {user_ratings}")
-
     try:
-        recommendations = recommender.get_recommendations(
-            user_id=session.get('user_id'),
-            user_ratings=user_ratings,
-            n_recommendations=10
-        )
+        recommendations = None
+        if profile is not None:
+            # Готовые рекомендации из офлайн-расчета актуальны, пока не изменились оценки пользователя,
+            # способ рекомендаций и версия моделей
+            fingerprint, method, model_version, precomputed = user_db.get_precomputed_recommendations(
+                session['user_id'])
+            if (precomputed and fingerprint == profile.fingerprint
+                    and method == recommender.recommendation_method and model_version == recommender.model_version):
+                recommendations = recommender.precomputed_frame(precomputed, n_recommendations=10)
+                logger.debug("Использованы готовые рекомендации из офлайн-расчета")
+
+        if recommendations is None:
+            recommendations = recommender.get_recommendations(
+                user_id=session.get('user_id'),
+                user_ratings=user_ratings,
+                n_recommendations=10,
+                profile=profile
+            )
 
         logger.debug(f"Получено {len(recommendations)} рекомендаций")
         for i, row in recommendations.iterrows():
@@ -399,6 +498,34 @@ def get_recommendations():
         })
 
 
+@app.route('/similar_movies', methods=['POST'])
+def similar_movies():
+    """Фильмы, похожие на выбранный, по Tag Genome"""
+    movie_id = request.form.get('movie_id')
+    logger.debug(f"Поиск похожих фильмов для movie_id={movie_id}")
+
+    try:
+        similar = recommender.get_similar_movies(int(movie_id), n_recommendations=10)
+        return jsonify({
+            'success': True,
+            'movies': similar.to_dict('records')
+        })
+    except (ValueError, TypeError):
+        logger.warning(f"Неверный movie_id при поиске похожих фильмов: {movie_id}")
+        return jsonify({
+            'success': False,
+            'message': 'Неверные параметры запроса'
+        })
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Счетчики кэша результатов рекомендаций"""
+    if recommender.result_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, **recommender.result_cache.stats()})
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     logger.error(f"Необработанное исключение: {e}")
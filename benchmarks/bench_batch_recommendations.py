@@ -0,0 +1,55 @@
+"""Пропускная способность пакетных рекомендаций против последовательных вызовов get_recommendations"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_recommender
+
+N_TRAIN_USERS, N_MOVIES = 20_000, 20_000
+BATCH_SIZES = [1_000, 10_000, 50_000]
+SEQUENTIAL_SAMPLE = 500
+RATINGS_PER_USER = 30
+
+
+def make_users(rng, movie_ids, n_users):
+    return {
+        f"user_{i}": {str(m): float(rng.integers(1, 11) / 2)
+                      for m in rng.choice(movie_ids, size=RATINGS_PER_USER, replace=False)}
+        for i in range(n_users)
+    }
+
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender = make_recommender(tmp_dir, N_TRAIN_USERS, N_MOVIES, N_TRAIN_USERS * 50)
+        movie_ids = recommender.movies['movieId'].to_numpy()
+
+        users = make_users(rng, movie_ids, SEQUENTIAL_SAMPLE)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for user_id, user_ratings in users.items():
+                recommender.get_recommendations(user_id, user_ratings, 10)
+        sequential = SEQUENTIAL_SAMPLE / (time.perf_counter() - start)
+
+        print(f"{'пользователей':>14} {'по одному, польз/с':>20} {'пакетом, польз/с':>18} {'ускорение':>10}")
+        for batch_size in BATCH_SIZES:
+            users = make_users(rng, movie_ids, batch_size)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommendations = recommender.get_recommendations_batch(users, 10)
+            batched = batch_size / (time.perf_counter() - start)
+            assert recommendations['userId'].nunique() == batch_size
+            print(f"{batch_size:>14} {sequential:>20.0f} {batched:>18.0f} {batched / sequential:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
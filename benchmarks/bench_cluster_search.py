@@ -0,0 +1,58 @@
+"""Бенчмарк поиска соседей внутри ближайших кластеров KMeans против поиска по всем пользователям"""
+import os
+import sys
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.clustering import UserClustering
+from src.data_processing import DataProcessor
+from src.neighbors import ClusterNeighborIndex
+from bench_neighbor_index import query_latencies
+from synthetic import make_movies, make_ratings
+
+N_MOVIES, N_RATINGS_PER_USER = 20_000, 50
+USER_COUNTS = [20_000, 80_000, 160_000]
+N_CLUSTERS = 200
+N_NEIGHBORS = 5
+N_QUERIES = 300
+N_CLUSTERS_PROBE = [1, 2, 3]
+
+
+def main():
+    print(f"{'пользователей':>14} {'поиск':<22} {'recall@k':>9} {'p50, мс':>8} {'p99, мс':>8}")
+    for n_users in USER_COUNTS:
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor = DataProcessor()
+            processor.movies = make_movies(N_MOVIES)
+            processor.ratings = make_ratings(n_users, N_MOVIES, n_users * N_RATINGS_PER_USER)
+            _, profiles_scaled, _ = processor.create_user_profiles(processor.create_user_item_matrix())
+
+            clustering = UserClustering(user_profiles_scaled=profiles_scaled)
+            clustering.perform_clustering(n_clusters=N_CLUSTERS, backend='minibatch')
+            exact = clustering.build_knn_model(n_neighbors=N_NEIGHBORS, backend='exact')
+
+        rng = np.random.default_rng(0)
+        queries = profiles_scaled.to_numpy()[rng.choice(len(profiles_scaled), size=N_QUERIES, replace=False)]
+        queries = queries + rng.normal(0, 0.05, size=queries.shape)
+
+        exact_ms, exact_indices = query_latencies(exact, queries)
+        print(f"{len(profiles_scaled):>14} {'все пользователи':<22} {1.0:>9.3f} "
+              f"{np.percentile(exact_ms, 50):>8.3f} {np.percentile(exact_ms, 99):>8.3f}")
+
+        labels = clustering.user_clusters['cluster'].to_numpy()
+        for n_clusters_probe in N_CLUSTERS_PROBE:
+            index = ClusterNeighborIndex(clustering.kmeans_model, n_neighbors=N_NEIGHBORS,
+                                         n_clusters_probe=n_clusters_probe).fit(profiles_scaled.to_numpy(), labels)
+            cluster_ms, cluster_indices = query_latencies(index, queries)
+            recall = np.mean([len(np.intersect1d(a, b)) / N_NEIGHBORS
+                              for a, b in zip(exact_indices, cluster_indices)])
+            print(f"{len(profiles_scaled):>14} {f'кластеров: {n_clusters_probe}':<22} {recall:>9.3f} "
+                  f"{np.percentile(cluster_ms, 50):>8.3f} {np.percentile(cluster_ms, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
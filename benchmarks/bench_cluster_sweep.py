@@ -0,0 +1,49 @@
+"""Бенчмарк перебора k в UserClustering.find_optimal_clusters: последовательный полный перебор
+против параллельного с теплым стартом и силуэтом по выборке"""
+import os
+import sys
+import time
+import contextlib
+import io
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.clustering import UserClustering
+from src.data_processing import DataProcessor
+from synthetic import make_movies, make_ratings
+
+N_USERS, N_MOVIES, N_RATINGS = 10_000, 5_000, 500_000
+MAX_CLUSTERS = 40
+
+CONFIGS = [
+    ('последовательно, n_init=10, полный силуэт',
+     dict(n_jobs=1, warm_start=False, silhouette_sample_size=None)),
+    ('последовательно, теплый старт, силуэт по 3000',
+     dict(n_jobs=1, warm_start=True, silhouette_sample_size=3000)),
+    (f'{os.cpu_count()} процессов, теплый старт, силуэт по 3000',
+     dict(n_jobs=os.cpu_count(), warm_start=True, silhouette_sample_size=3000)),
+]
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = DataProcessor()
+        processor.movies = make_movies(N_MOVIES)
+        processor.ratings = make_ratings(N_USERS, N_MOVIES, N_RATINGS)
+        _, profiles_scaled, _ = processor.create_user_profiles(processor.create_user_item_matrix())
+
+    print(f"Профилей: {len(profiles_scaled)}, k от 2 до {MAX_CLUSTERS}, метод силуэта")
+    for title, params in CONFIGS:
+        clustering = UserClustering(user_profiles_scaled=profiles_scaled)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            best_k = clustering.find_optimal_clusters(max_clusters=MAX_CLUSTERS, method='silhouette', **params)
+        elapsed = time.perf_counter() - start
+        slowest = clustering.sweep_results.nlargest(3, 'seconds')
+        print(f"{title:<50} {elapsed:7.2f} с, лучшее k={best_k}, "
+              f"самые долгие k: {', '.join(f'{k} ({t:.2f} с)' for k, t in zip(slowest.n_clusters, slowest.seconds))}")
+
+
+if __name__ == "__main__":
+    main()
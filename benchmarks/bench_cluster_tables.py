@@ -0,0 +1,53 @@
+"""Бенчмарк рекомендаций из готовых списков кластеров против агрегации оценок похожих пользователей"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_recommender
+
+N_MOVIES = 20_000
+USER_COUNTS = [5_000, 20_000]
+RATINGS_PER_USER = [10, 100]
+N_QUERIES = 200
+
+
+def latencies(func, requests):
+    timings = []
+    for user_ratings in requests:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(None, user_ratings, 10)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'пользователей':>14} {'оценок':>7} {'способ':<18} {'p50, мс':>8} {'p99, мс':>8}")
+    for n_users in USER_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommender = make_recommender(tmp_dir, n_users, N_MOVIES, n_users * 50)
+
+            for n_ratings in RATINGS_PER_USER:
+                requests = [
+                    {str(m): float(rng.integers(1, 11) / 2)
+                     for m in rng.choice(recommender.movies['movieId'], size=n_ratings, replace=False)}
+                    for _ in range(N_QUERIES)
+                ]
+                for name, func in [('похожие', recommender.get_recommendations_by_similar_users),
+                                   ('список кластера', recommender.get_recommendations_by_cluster)]:
+                    timings = latencies(func, requests)
+                    print(f"{n_users:>14} {n_ratings:>7} {name:<18} "
+                          f"{np.percentile(timings, 50):>8.3f} {np.percentile(timings, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
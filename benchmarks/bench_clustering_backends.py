@@ -0,0 +1,74 @@
+"""Бенчмарк бэкендов UserClustering.perform_clustering: KMeans против MiniBatchKMeans,
+а также дообучение partial_fit на новых профилях против полного переобучения"""
+import os
+import sys
+import time
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+from src.clustering import UserClustering
+from src.data_processing import DataProcessor
+from synthetic import make_movies, make_ratings
+
+SIZES = [
+    # (пользователей, фильмов, оценок)
+    (50_000, 10_000, 2_000_000),
+    (200_000, 20_000, 8_000_000),
+]
+N_CLUSTERS = 50
+NEW_USERS_SHARE = 0.05
+
+
+def make_profiles(n_users, n_movies, n_ratings):
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = DataProcessor()
+        processor.movies = make_movies(n_movies)
+        processor.ratings = make_ratings(n_users, n_movies, n_ratings)
+        _, profiles_scaled, _ = processor.create_user_profiles(processor.create_user_item_matrix())
+    return profiles_scaled
+
+
+def main():
+    for n_users, n_movies, n_ratings in SIZES:
+        profiles = make_profiles(n_users, n_movies, n_ratings)
+        n_new = int(len(profiles) * NEW_USERS_SHARE)
+        base_profiles, new_profiles = profiles.iloc[:-n_new], profiles.iloc[-n_new:]
+        sample = np.random.default_rng(0).choice(len(profiles), size=10_000, replace=False)
+
+        print(f"Профилей: {len(profiles)}, кластеров: {N_CLUSTERS}")
+        labels = {}
+        for backend in ('kmeans', 'minibatch'):
+            clustering = UserClustering(user_profiles_scaled=profiles)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                clustering.perform_clustering(n_clusters=N_CLUSTERS, backend=backend)
+            elapsed = time.perf_counter() - start
+
+            labels[backend] = clustering.user_clusters['cluster'].to_numpy()
+            inertia = -clustering.kmeans_model.score(profiles)
+            silhouette = silhouette_score(profiles.values[sample], labels[backend][sample])
+            print(f"  {backend:<10} обучение {elapsed:7.2f} с, инерция {inertia:12.1f}, силуэт {silhouette:.4f}")
+        print(f"  Согласованность разбиений (ARI): {adjusted_rand_score(labels['kmeans'], labels['minibatch']):.3f}")
+
+        clustering = UserClustering(user_profiles_scaled=base_profiles)
+        with contextlib.redirect_stdout(io.StringIO()):
+            clustering.perform_clustering(n_clusters=N_CLUSTERS, backend='minibatch')
+            start = time.perf_counter()
+            clustering.partial_fit(new_profiles)
+            partial_time = time.perf_counter() - start
+
+            full = UserClustering(user_profiles_scaled=profiles)
+            start = time.perf_counter()
+            full.perform_clustering(n_clusters=N_CLUSTERS, backend='kmeans')
+            refit_time = time.perf_counter() - start
+        print(f"  {n_new} новых профилей: partial_fit {partial_time:.3f} с, "
+              f"полное переобучение KMeans {refit_time:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
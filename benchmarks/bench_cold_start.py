@@ -0,0 +1,51 @@
+"""Бенчмарк холодного старта MovieRecommender: CSV + pkl против пакета моделей с mmap"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.recommender import MovieRecommender
+from synthetic import write_dataset, write_models
+
+N_USERS, N_MOVIES, N_RATINGS = 50_000, 20_000, 5_000_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = os.path.join(tmp_dir, 'data')
+        models_dir = os.path.join(tmp_dir, 'models')
+        bundle_dir = os.path.join(models_dir, 'bundle')
+        paths = dict(
+            movies_path=os.path.join(data_dir, 'movies.csv'),
+            ratings_path=os.path.join(data_dir, 'ratings.csv'),
+            user_profiles_path=os.path.join(models_dir, 'user_profiles.pkl'),
+            kmeans_model_path=os.path.join(models_dir, 'kmeans_model.pkl'),
+            knn_model_path=os.path.join(models_dir, 'knn_model.pkl'),
+        )
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            movies, ratings = write_dataset(data_dir, N_USERS, N_MOVIES, N_RATINGS)
+            write_models(models_dir, movies, ratings)
+
+            start = time.perf_counter()
+            recommender = MovieRecommender(**paths)
+            csv_time = time.perf_counter() - start
+
+            recommender.save_bundle(bundle_dir)
+
+            start = time.perf_counter()
+            MovieRecommender(bundle_path=bundle_dir, **paths)
+            bundle_time = time.perf_counter() - start
+
+        print(f"Оценок: {len(ratings)}, фильмов: {len(movies)}, пользователей: {N_USERS}")
+        print(f"Старт из CSV и pkl:      {csv_time:6.2f} с")
+        print(f"Старт из пакета моделей: {bundle_time:6.2f} с")
+
+
+if __name__ == "__main__":
+    main()
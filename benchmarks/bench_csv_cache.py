@@ -0,0 +1,68 @@
+"""Бенчмарк DataProcessor.load_data: время чтения и пиковая память для CSV и колоночного кэша.
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS отражал только его.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import subprocess
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from measure import peak_rss_mb
+
+N_USERS, N_MOVIES, N_RATINGS = 50_000, 20_000, 5_000_000
+N_GENOME_MOVIES = 13_000
+
+CASES = [
+    ('csv', 'CSV без типов (как раньше)'),
+    ('csv_dtypes', 'CSV с типами + запись кэша'),
+    ('cached', 'Колоночный кэш'),
+]
+
+
+def run_case(case, data_dir):
+    import pandas as pd
+    from src.data_processing import DataProcessor
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if case == 'csv':
+            frames = [pd.read_csv(os.path.join(data_dir, name)) for name in
+                      ['movies.csv', 'ratings.csv', 'tags.csv', 'genome-scores.csv', 'genome-tags.csv', 'links.csv']]
+        else:
+            processor = DataProcessor(data_dir=data_dir).load_data()
+            frames = [processor.movies, processor.ratings, processor.tags,
+                      processor.genome_scores, processor.genome_tags, processor.links]
+    elapsed = time.perf_counter() - start
+
+    frames_mb = sum(df.memory_usage(deep=True).sum() for df in frames) / 2 ** 20
+    peak_mb = peak_rss_mb()
+    print(f"{elapsed:.2f} {frames_mb:.0f} {peak_mb:.0f}")
+
+
+def main():
+    from synthetic import write_full_dataset
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_full_dataset(data_dir, N_USERS, N_MOVIES, N_RATINGS, n_genome_movies=N_GENOME_MOVIES)
+
+        print(f"{'вариант':<30} {'время, с':>9} {'таблицы, МБ':>12} {'пик RSS, МБ':>12}")
+        for case, title in CASES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', case, data_dir],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            elapsed, frames_mb, peak_mb = output[-3:]
+            print(f"{title:<30} {float(elapsed):>9.2f} {frames_mb:>12} {peak_mb:>12}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--case':
+        run_case(sys.argv[2], sys.argv[3])
+    else:
+        main()
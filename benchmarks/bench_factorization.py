@@ -0,0 +1,138 @@
+"""Бенчмарк матричной факторизации (ALS) против поиска похожих пользователей (KNN по профилям жанров).
+
+Оценки генерируются из скрытых факторов, связанных с жанрами фильмов, чтобы точность имела смысл.
+Тестовые пользователи не участвуют в обучении: часть их оценок подается на вход, по остальным
+считается RMSE предсказаний. Для KNN предсказание - средняя оценка соседей, поэтому для части
+фильмов его нет (доля покрытия выводится отдельно).
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_movies, write_models
+
+N_USERS = 20_000
+N_MOVIES = 5_000
+RATINGS_PER_USER = 50
+N_TEST_USERS = 300
+TEST_GIVEN, TEST_HIDDEN = 30, 10
+N_LATENT = 8
+
+
+def make_latent_ratings(movies, n_users, ratings_per_user, first_user_id=1, seed=0):
+    """Оценки из модели 3.5 + смещение фильма + вкусы пользователя . свойства фильма + шум"""
+    rng = np.random.default_rng(seed)
+    genre_matrix = movies['genres'].str.get_dummies('|').to_numpy(dtype=np.float64)
+    genre_rng = np.random.default_rng(12345)
+    item_factors = genre_matrix @ genre_rng.normal(0, 0.6, (genre_matrix.shape[1], N_LATENT))
+    item_factors += genre_rng.normal(0, 0.3, item_factors.shape)
+    item_biases = genre_rng.normal(0, 0.4, len(movies))
+
+    popularity = 1.0 / np.arange(1, len(movies) + 1) ** 0.8
+    popularity /= popularity.sum()
+    user_factors = rng.normal(0, 0.5, (n_users, N_LATENT))
+    user_rows = np.repeat(np.arange(n_users), ratings_per_user)
+    movie_rows = rng.choice(len(movies), size=len(user_rows), p=popularity)
+
+    raw = 3.5 + item_biases[movie_rows] + (user_factors[user_rows] * item_factors[movie_rows]).sum(axis=1)
+    raw += rng.normal(0, 0.3, len(raw))
+    ratings = pd.DataFrame({
+        'userId': user_rows + first_user_id,
+        'movieId': movies['movieId'].to_numpy()[movie_rows],
+        'rating': np.clip(np.round(raw * 2) / 2, 0.5, 5.0),
+        'timestamp': rng.integers(800_000_000, 1_600_000_000, size=len(raw)),
+    })
+    return ratings.drop_duplicates(['userId', 'movieId']).reset_index(drop=True)
+
+
+def main():
+    from src.recommender import MovieRecommender
+    from src.factorization import build_factorization_model
+
+    movies = make_movies(N_MOVIES)
+    ratings = make_latent_ratings(movies, N_USERS, RATINGS_PER_USER)
+    test = make_latent_ratings(movies, N_TEST_USERS, TEST_GIVEN + TEST_HIDDEN, first_user_id=N_USERS + 1, seed=1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir, models_dir = os.path.join(tmp_dir, 'data'), os.path.join(tmp_dir, 'models')
+        os.makedirs(data_dir)
+        movies.to_csv(os.path.join(data_dir, 'movies.csv'), index=False)
+        ratings.to_csv(os.path.join(data_dir, 'ratings.csv'), index=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_models(models_dir, movies, ratings)
+        n_jobs = os.cpu_count() or 1
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_factorization_model(ratings, n_jobs=n_jobs, save_model_path=os.path.join(models_dir, 'mf_model.pkl'))
+        print(f"{len(ratings)} оценок, {N_USERS} пользователей, {N_MOVIES} фильмов: "
+              f"ALS обучена за {time.perf_counter() - start:.1f} с в {n_jobs} процессах")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender = MovieRecommender(
+                movies_path=os.path.join(data_dir, 'movies.csv'),
+                ratings_path=os.path.join(data_dir, 'ratings.csv'),
+                user_profiles_path=os.path.join(models_dir, 'user_profiles.pkl'),
+                kmeans_model_path=os.path.join(models_dir, 'kmeans_model.pkl'),
+                knn_model_path=os.path.join(models_dir, 'knn_model.pkl'),
+                mf_model_path=os.path.join(models_dir, 'mf_model.pkl'),
+            )
+
+        requests, hidden = [], []
+        for _, user_ratings in test.groupby('userId'):
+            given = user_ratings.iloc[:TEST_GIVEN]
+            requests.append({str(m): float(r) for m, r in zip(given['movieId'], given['rating'])})
+            hidden.append(user_ratings.iloc[TEST_GIVEN:])
+
+        print(f"{'способ':<10} {'p50, мс':>8} {'p99, мс':>8} {'RMSE':>7} {'покрытие':>9}")
+        for name, func, predict in [
+            ('похожие', recommender.get_recommendations_by_similar_users, knn_predictions),
+            ('ALS', recommender.get_recommendations_by_factorization, als_predictions),
+        ]:
+            timings = []
+            for user_ratings in requests:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    func(None, user_ratings, 10)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            errors, covered, total = [], 0, 0
+            for user_ratings, user_hidden in zip(requests, hidden):
+                predicted = predict(recommender, user_ratings, user_hidden['movieId'].to_numpy())
+                known = ~np.isnan(predicted)
+                errors.append(predicted[known] - user_hidden['rating'].to_numpy()[known])
+                covered += known.sum()
+                total += len(known)
+            rmse = np.sqrt(np.mean(np.concatenate(errors) ** 2))
+            print(f"{name:<10} {np.percentile(timings, 50):>8.3f} {np.percentile(timings, 99):>8.3f} "
+                  f"{rmse:>7.3f} {covered / total:>9.1%}")
+
+
+def knn_predictions(recommender, user_ratings, movie_ids):
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, user_profile_scaled = recommender.create_user_profile(user_ratings)
+    _, indices = recommender.neighbor_index.kneighbors(user_profile_scaled)
+    similar_users = recommender.user_profiles_scaled.index[indices[0]]
+    rated_movies, _ = recommender.parse_user_ratings(user_ratings)
+    neighbour_movies, scores = recommender.aggregate_neighbour_ratings(similar_users, rated_movies)
+    return pd.Series(scores, index=neighbour_movies).reindex(movie_ids).to_numpy()
+
+
+def als_predictions(recommender, user_ratings, movie_ids):
+    model = recommender.factorization
+    rated_movies, ratings = recommender.parse_user_ratings(user_ratings)
+    predicted, _ = model.predict(rated_movies, ratings)
+    rows = model.rows(movie_ids)
+    return np.where(rows >= 0, predicted[rows], np.nan)
+
+
+if __name__ == "__main__":
+    main()
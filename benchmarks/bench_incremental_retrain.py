@@ -0,0 +1,66 @@
+"""Бенчмарк инкрементального обновления моделей против полного конвейера.
+
+Полный конвейер - профили всех пользователей, KMeans с заданным k (без перебора k), списки
+кластеров, индекс KNN и сборка пакета моделей. Инкрементальное обновление читает из UserDatabase
+только изменившихся пользователей и записывает новую версию пакета.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import write_dataset, write_models
+
+N_USERS = 50_000
+N_MOVIES = 20_000
+N_RATINGS = 2_500_000
+CHANGED_USERS = [100, 1_000, 10_000]
+RATINGS_PER_WEB_USER = 50
+
+
+def main():
+    from src.model_bundle import compile_model_bundle
+    from user_db import UserDatabase
+    from retrain_incremental import retrain_incremental
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir, models_dir = os.path.join(tmp_dir, 'data'), os.path.join(tmp_dir, 'models')
+        bundle_dir = os.path.join(models_dir, 'bundle')
+        with contextlib.redirect_stdout(io.StringIO()):
+            movies, ratings = write_dataset(data_dir, N_USERS, N_MOVIES, N_RATINGS)
+            start = time.perf_counter()
+            write_models(models_dir, movies, ratings)
+            compile_model_bundle(bundle_dir, os.path.join(data_dir, 'movies.csv'), os.path.join(data_dir, 'ratings.csv'),
+                                 os.path.join(models_dir, 'user_profiles.pkl'),
+                                 os.path.join(models_dir, 'kmeans_model.pkl'), os.path.join(models_dir, 'knn_model.pkl'))
+            full_seconds = time.perf_counter() - start
+        print(f"{N_USERS} пользователей, {len(ratings)} оценок: полный конвейер {full_seconds:.1f} с")
+
+        db_path = os.path.join(tmp_dir, 'user_ratings.db')
+        user_db = UserDatabase(db_path)
+        print(f"{'изменилось польз.':>18} {'инкрементально, с':>18}")
+        n_registered = 0
+        for n_changed in CHANGED_USERS:
+            user_ids = [user_db.register_user(f'user{n_registered + i}', 'password') for i in range(n_changed)]
+            n_registered += n_changed
+            user_db.save_ratings_bulk(
+                (user_id, int(movie_id), float(rng.integers(1, 11) / 2))
+                for user_id in user_ids
+                for movie_id in rng.choice(movies['movieId'], size=RATINGS_PER_WEB_USER, replace=False)
+            )
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                retrain_incremental(db_path, bundle_dir)
+            print(f"{n_changed:>18} {time.perf_counter() - start:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
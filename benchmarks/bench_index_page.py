@@ -0,0 +1,90 @@
+"""Бенчмарк главной страницы: запросов в секунду на / до и после кэширования популярных фильмов"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import logging
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import write_dataset, write_models
+
+N_USERS, N_MOVIES, N_RATINGS = 20_000, 20_000, 2_000_000
+N_REQUESTS = 50
+
+
+def legacy_popular_recommendations(recommender, n_recommendations):
+    movie_stats = recommender.ratings.groupby('movieId').agg(
+        mean_rating=('rating', 'mean'),
+        count=('rating', 'count')
+    ).reset_index()
+    popular_movies = movie_stats[movie_stats['count'] > 100]
+    popular_movies = popular_movies.sort_values('mean_rating', ascending=False)
+    recommendations = pd.merge(popular_movies.head(n_recommendations), recommender.movies, on='movieId')
+    recommendations = recommendations.rename(columns={'mean_rating': 'score'})
+    return recommendations[['movieId', 'title', 'genres', 'score']]
+
+
+def register_legacy_index(app_module):
+    from flask import render_template
+
+    @app_module.app.route('/legacy_index')
+    def legacy_index():
+        recommender = app_module.recommender
+        popular_movies = legacy_popular_recommendations(recommender, 100)
+        genres_set = set()
+        for genres in recommender.movies['genres'].str.split('|'):
+            if isinstance(genres, list):
+                genres_set.update(genres)
+        return render_template(
+            'index.html',
+            movies=popular_movies.to_dict('records'),
+            genres=sorted(list(genres_set)),
+            logged_in=False,
+            username='',
+            user_ratings={}
+        )
+
+
+def requests_per_second(client, path):
+    client.get(path)
+    start = time.perf_counter()
+    for _ in range(N_REQUESTS):
+        response = client.get(path)
+        assert response.status_code == 200
+    return N_REQUESTS / (time.perf_counter() - start)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = os.path.join(tmp_dir, 'data')
+        models_dir = os.path.join(tmp_dir, 'models')
+        with contextlib.redirect_stdout(io.StringIO()):
+            movies, ratings = write_dataset(data_dir, N_USERS, N_MOVIES, N_RATINGS)
+            write_models(models_dir, movies, ratings)
+
+        os.environ['MOVIES_DATA_DIR'] = data_dir
+        os.environ['MOVIES_MODELS_DIR'] = models_dir
+        os.environ['MOVIES_DB_PATH'] = os.path.join(tmp_dir, 'user_ratings.db')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+        logging.disable(logging.CRITICAL)
+        register_legacy_index(app_module)
+
+        client = app_module.app.test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            legacy_rps = requests_per_second(client, '/legacy_index')
+            cached_rps = requests_per_second(client, '/')
+
+        print(f"Оценок: {len(ratings)}, фильмов: {len(movies)}")
+        print(f"До кэширования:   {legacy_rps:8.1f} запросов/с")
+        print(f"После кэширования: {cached_rps:8.1f} запросов/с")
+
+
+if __name__ == "__main__":
+    main()
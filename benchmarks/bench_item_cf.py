@@ -0,0 +1,64 @@
+"""Бенчмарк item-based CF: построение списков соседей по оценкам и время ответа в сравнении с поиском
+похожих пользователей. Время ответа item-based CF зависит от числа оценок пользователя и K, но не от
+числа пользователей и оценок в обучающих данных.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_recommender
+
+N_MOVIES = 10_000
+USER_COUNTS = [5_000, 20_000]
+RATINGS_PER_USER = [10, 100, 1000]
+N_QUERIES = 200
+K = 50
+
+
+def latencies(func, requests):
+    timings = []
+    for user_ratings in requests:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(None, user_ratings, 10)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def main():
+    from src.item_similarity import build_rating_neighbors
+
+    rng = np.random.default_rng(0)
+    for n_users in USER_COUNTS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommender = make_recommender(tmp_dir, n_users, N_MOVIES, n_users * 50)
+                start = time.perf_counter()
+                recommender.item_neighbors = build_rating_neighbors(recommender.rating_index, k=K)
+                build_seconds = time.perf_counter() - start
+
+            print(f"{n_users} пользователей, {recommender.rating_index.matrix.nnz} оценок: "
+                  f"списки top-{K} для {N_MOVIES} фильмов построены за {build_seconds:.1f} с")
+            print(f"{'оценок':>7} {'способ':<18} {'p50, мс':>8} {'p99, мс':>8}")
+            for n_ratings in RATINGS_PER_USER:
+                requests = [
+                    {str(m): float(rng.integers(1, 11) / 2)
+                     for m in rng.choice(recommender.movies['movieId'], size=n_ratings, replace=False)}
+                    for _ in range(N_QUERIES)
+                ]
+                for name, func in [('похожие', recommender.get_recommendations_by_similar_users),
+                                   ('item-based CF', recommender.get_recommendations_by_items)]:
+                    timings = latencies(func, requests)
+                    print(f"{n_ratings:>7} {name:<18} "
+                          f"{np.percentile(timings, 50):>8.3f} {np.percentile(timings, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Бенчмарк списков похожих фильмов по Tag Genome: блочный top-K против полной матрицы cosine_similarity.
+
+Построение запускается в отдельном процессе, чтобы пиковый RSS отражал только его; затем измеряется
+время ответа "больше похожего" и рекомендаций по содержанию из готовых списков.
+"""
+import os
+import sys
+import time
+import contextlib
+import io
+import subprocess
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from measure import peak_rss_mb
+from synthetic import make_genome_scores
+
+GENOME_MOVIES = [5_000, 13_816]
+N_TAGS = 1128
+K = 50
+ALL_PAIRS_LIMIT = 5_000
+N_QUERIES = 2_000
+
+
+def run_case(case, n_movies):
+    from sklearn.metrics.pairwise import cosine_similarity
+    from src.item_similarity import top_k_cosine
+
+    # Матрица создается сразу, без таблицы genome-scores, чтобы пик памяти отражал только построение
+    matrix = np.random.default_rng(0).beta(0.5, 4.0, size=(n_movies, N_TAGS)).astype(np.float32)
+    start = time.perf_counter()
+    if case == 'blocked':
+        top_k_cosine(matrix, k=K)
+    else:
+        similarities = cosine_similarity(matrix)
+        np.fill_diagonal(similarities, -np.inf)
+        np.argsort(-similarities, axis=1)[:, :K]
+    print(f"{time.perf_counter() - start:.2f} {peak_rss_mb():.0f}")
+
+
+def serving_latency(n_movies):
+    from src.item_similarity import build_genome_neighbors
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        item_neighbors = build_genome_neighbors(make_genome_scores(n_movies, n_tags=N_TAGS), k=K)
+    rng = np.random.default_rng(0)
+    movie_ids = item_neighbors.movie_ids
+
+    timings = []
+    for movie_id in rng.choice(movie_ids, size=N_QUERIES):
+        start = time.perf_counter()
+        item_neighbors.similar(movie_id, 10)
+        timings.append((time.perf_counter() - start) * 1e6)
+    similar_us = np.median(timings)
+
+    timings = []
+    for _ in range(N_QUERIES // 10):
+        rated = rng.choice(movie_ids, size=30, replace=False)
+        ratings = rng.integers(1, 11, size=30) / 2
+        start = time.perf_counter()
+        item_neighbors.score(rated, ratings)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return similar_us, np.median(timings)
+
+
+def main():
+    print(f"{'фильмов':>8} {'вариант':<26} {'время, с':>9} {'пик RSS, МБ':>12}")
+    for n_movies in GENOME_MOVIES:
+        cases = [('blocked', f'блочный top-{K}')]
+        if n_movies <= ALL_PAIRS_LIMIT:
+            cases.append(('all_pairs', 'cosine_similarity целиком'))
+        for case, title in cases:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--case', case, str(n_movies)],
+                check=True, capture_output=True, text=True
+            ).stdout.split()
+            elapsed, peak_mb = output[-2:]
+            print(f"{n_movies:>8} {title:<26} {float(elapsed):>9.2f} {peak_mb:>12}")
+
+    similar_us, score_us = serving_latency(GENOME_MOVIES[-1])
+    print(f"Похожие фильмы: {similar_us:.1f} мкс, рекомендации по 30 оценкам: {score_us:.1f} мкс (медиана)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--case':
+        run_case(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -0,0 +1,68 @@
+"""Бенчмарк индексов соседей: точный NearestNeighbors против IVF на центроидах KMeans.
+
+Для каждого n_probe выводится recall@k относительно точного поиска и задержка одиночного запроса
+(p50/p99), как в /get_recommendations.
+"""
+import os
+import sys
+import time
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.clustering import UserClustering
+from src.data_processing import DataProcessor
+from synthetic import make_movies, make_ratings
+
+N_USERS, N_MOVIES, N_RATINGS = 160_000, 20_000, 8_000_000
+N_CLUSTERS = 200
+N_NEIGHBORS = 5
+N_QUERIES = 500
+N_PROBES = [1, 2, 4, 8, 16, 32]
+
+
+def query_latencies(index, queries):
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = index.kneighbors(query[np.newaxis, :])
+        timings.append(time.perf_counter() - start)
+        results.append(indices[0])
+    return np.array(timings) * 1000, np.array(results)
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = DataProcessor()
+        processor.movies = make_movies(N_MOVIES)
+        processor.ratings = make_ratings(N_USERS, N_MOVIES, N_RATINGS)
+        _, profiles_scaled, _ = processor.create_user_profiles(processor.create_user_item_matrix())
+
+        clustering = UserClustering(user_profiles_scaled=profiles_scaled)
+        clustering.perform_clustering(n_clusters=N_CLUSTERS, backend='minibatch')
+        exact = clustering.build_knn_model(n_neighbors=N_NEIGHBORS, backend='exact')
+
+    rng = np.random.default_rng(0)
+    queries = profiles_scaled.to_numpy()[rng.choice(len(profiles_scaled), size=N_QUERIES, replace=False)]
+    queries = queries + rng.normal(0, 0.05, size=queries.shape)
+
+    exact_ms, exact_indices = query_latencies(exact, queries)
+    print(f"Профилей: {len(profiles_scaled)}, кластеров: {N_CLUSTERS}, k={N_NEIGHBORS}")
+    print(f"{'индекс':<16} {'recall@k':>9} {'p50, мс':>8} {'p99, мс':>8}")
+    print(f"{'точный':<16} {1.0:>9.3f} {np.percentile(exact_ms, 50):>8.3f} {np.percentile(exact_ms, 99):>8.3f}")
+
+    for n_probe in N_PROBES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ivf = clustering.build_knn_model(n_neighbors=N_NEIGHBORS, backend='ivf', n_probe=n_probe)
+        ivf_ms, ivf_indices = query_latencies(ivf, queries)
+        recall = np.mean([len(np.intersect1d(a, b)) / N_NEIGHBORS for a, b in zip(exact_indices, ivf_indices)])
+        print(f"{f'IVF n_probe={n_probe}':<16} {recall:>9.3f} "
+              f"{np.percentile(ivf_ms, 50):>8.3f} {np.percentile(ivf_ms, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк агрегации оценок соседей: ratings.isin + groupby + sort_values против CSR-индекса"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.data_processing import UserItemMatrix
+from src.recommender import MovieRecommender, top_n_indices
+from synthetic import make_movies, make_ratings
+
+SIZES = [
+    # (пользователей, фильмов, оценок)
+    (10_000, 10_000, 1_000_000),
+    (50_000, 20_000, 5_000_000),
+    (160_000, 60_000, 25_000_000),
+]
+N_NEIGHBOURS = 5
+N_RECOMMENDATIONS = 10
+REPEATS = 20
+
+
+def legacy_aggregate(ratings, movies, similar_users, rated_movies):
+    similar_users_ratings = ratings[ratings['userId'].isin(similar_users)]
+    movie_ratings = similar_users_ratings.groupby('movieId')['rating'].mean().reset_index()
+    movie_ratings = movie_ratings.sort_values('rating', ascending=False)
+    movie_ratings = movie_ratings[~movie_ratings['movieId'].isin(rated_movies)]
+    return pd.merge(movie_ratings.head(N_RECOMMENDATIONS), movies, on='movieId')
+
+
+def indexed_aggregate(recommender, similar_users, rated_movies):
+    movie_ids, scores = recommender.aggregate_neighbour_ratings(similar_users, rated_movies)
+    top = top_n_indices(scores, N_RECOMMENDATIONS)
+    return recommender.movies_frame(movie_ids[top], scores[top])
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'оценок':>10} {'было, мс':>10} {'стало, мс':>10}")
+    for n_users, n_movies, n_ratings in SIZES:
+        recommender = MovieRecommender.__new__(MovieRecommender)
+        recommender.movies = make_movies(n_movies)
+        recommender.ratings = make_ratings(n_users, n_movies, n_ratings)
+        recommender.build_movie_index()
+        recommender.rating_index = UserItemMatrix.from_ratings(recommender.ratings)
+
+        legacy_timings, indexed_timings = [], []
+        for _ in range(REPEATS):
+            similar_users = rng.choice(recommender.rating_index.user_ids, size=N_NEIGHBOURS, replace=False)
+            rated_movies = rng.choice(recommender.movies['movieId'], size=20, replace=False)
+
+            start = time.perf_counter()
+            legacy_aggregate(recommender.ratings, recommender.movies, similar_users, rated_movies)
+            legacy_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            indexed_aggregate(recommender, similar_users, rated_movies)
+            indexed_timings.append(time.perf_counter() - start)
+
+        print(f"{len(recommender.ratings):>10} {np.median(legacy_timings) * 1000:>10.2f} "
+              f"{np.median(indexed_timings) * 1000:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк рекомендаций для зарегистрированного пользователя: чтение всех оценок из SQLite и пересчет
+профиля против готового профиля, который UserDatabase ведет при записи оценок. Также измеряется
+стоимость записи одной оценки вместе с обновлением статистики профиля.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_recommender
+
+N_USERS = 20_000
+N_MOVIES = 20_000
+RATINGS_PER_USER = [10, 100, 1000, 5000]
+N_QUERIES = 100
+
+
+def median_ms(func, repeats=N_QUERIES):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings)
+
+
+def main():
+    from src.recommender import ratings_fingerprint
+    from user_db import UserDatabase
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender = make_recommender(tmp_dir, N_USERS, N_MOVIES, N_USERS * 50)
+            db = UserDatabase(os.path.join(tmp_dir, 'user_ratings.db'))
+            db.sync_movie_genres(recommender.movie_genre_pairs())
+
+        print(f"{'оценок':>7} {'пересчет, мс':>13} {'готовый профиль, мс':>20} {'запись оценки, мс':>18}")
+        for n_ratings in RATINGS_PER_USER:
+            user_id = db.register_user(f'user{n_ratings}', 'password')
+            movie_ids = rng.choice(recommender.movies['movieId'], size=n_ratings, replace=False)
+            db.save_ratings_bulk([(user_id, int(m), float(rng.integers(1, 11) / 2)) for m in movie_ids])
+
+            def full_rebuild():
+                user_ratings = db.get_user_ratings(user_id)
+                ratings_fingerprint(user_ratings)
+                recommender.get_recommendations(user_id, user_ratings, 10)
+
+            def stored_profile():
+                profile = db.get_user_profile(user_id)
+                recommender.get_recommendations(user_id, n_recommendations=10, profile=profile)
+
+            def write_rating():
+                db.save_rating(user_id, int(rng.choice(movie_ids)), float(rng.integers(1, 11) / 2))
+
+            print(f"{n_ratings:>7} {median_ms(full_rebuild):>13.2f} {median_ms(stored_profile):>20.2f} "
+                  f"{median_ms(write_rating):>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк процессорного времени сервера на одну оценку: /rate_movie по одной и /rate_movies пакетом"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import logging
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import write_dataset, write_models
+
+N_USERS, N_MOVIES, N_RATINGS = 2_000, 5_000, 100_000
+N_SESSIONS = 30
+BURST_SIZES = [5, 20, 50]
+
+
+def cpu_per_rating(send, bursts):
+    start = time.process_time()
+    for burst in bursts:
+        send(burst)
+    return (time.process_time() - start) / sum(len(burst) for burst in bursts) * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = os.path.join(tmp_dir, 'data')
+        models_dir = os.path.join(tmp_dir, 'models')
+        with contextlib.redirect_stdout(io.StringIO()):
+            movies, ratings = write_dataset(data_dir, N_USERS, N_MOVIES, N_RATINGS)
+            write_models(models_dir, movies, ratings)
+
+        os.environ['MOVIES_DATA_DIR'] = data_dir
+        os.environ['MOVIES_MODELS_DIR'] = models_dir
+        os.environ['MOVIES_DB_PATH'] = os.path.join(tmp_dir, 'user_ratings.db')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+        logging.disable(logging.CRITICAL)
+
+        client = app_module.app.test_client()
+        client.post('/register', data={'username': 'bench', 'password': 'bench', 'confirm_password': 'bench'})
+
+        def send_single(burst):
+            for movie_id, rating in burst:
+                client.post('/rate_movie', json={'movie_id': movie_id, 'rating': rating})
+
+        def send_batch(burst):
+            client.post('/rate_movies', json={'changes': [{'movie_id': m, 'rating': r} for m, r in burst]})
+
+        print(f"{'оценок в сессии':>16} {'по одной, мс CPU/оценку':>24} {'пакетом, мс CPU/оценку':>23}")
+        movie_ids = movies['movieId'].to_numpy()
+        for burst_size in BURST_SIZES:
+            bursts = [[(int(m), float(rng.integers(1, 11) / 2))
+                       for m in rng.choice(movie_ids, size=burst_size, replace=False)]
+                      for _ in range(N_SESSIONS)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                single_ms = cpu_per_rating(send_single, bursts)
+                batch_ms = cpu_per_rating(send_batch, bursts)
+            print(f"{burst_size:>16} {single_ms:>24.3f} {batch_ms:>23.3f}")
+
+
+if __name__ == "__main__":
+    main()
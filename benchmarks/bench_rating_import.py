@@ -0,0 +1,57 @@
+"""Бенчмарк массовой загрузки и выгрузки оценок в UserDatabase, строк в секунду"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from user_db import UserDatabase
+
+N_USERS, N_MOVIES = 20_000, 20_000
+SINGLE_ROWS = 20_000
+BULK_ROWS = [100_000, 1_000_000]
+BATCH_SIZE = 10_000
+
+
+def make_rows(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    users = rng.integers(1, N_USERS + 1, size=n_rows)
+    movies = rng.integers(1, N_MOVIES + 1, size=n_rows)
+    ratings = rng.integers(1, 11, size=n_rows) / 2
+    return list(zip(users.tolist(), movies.tolist(), ratings.tolist()))
+
+
+def main():
+    print(f"{'строк':>10} {'операция':<28} {'строк/с':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = UserDatabase(os.path.join(tmp_dir, 'users.db'))
+        rows = make_rows(SINGLE_ROWS)
+        start = time.perf_counter()
+        for user_id, movie_id, rating in rows:
+            db.save_rating(user_id, movie_id, rating)
+        print(f"{SINGLE_ROWS:>10} {'save_rating по одной':<28} {SINGLE_ROWS / (time.perf_counter() - start):>10.0f}")
+
+    for n_rows in BULK_ROWS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = UserDatabase(os.path.join(tmp_dir, 'users.db'))
+            rows = make_rows(n_rows)
+
+            start = time.perf_counter()
+            db.save_ratings_bulk(rows, batch_size=BATCH_SIZE)
+            print(f"{n_rows:>10} {'save_ratings_bulk':<28} {n_rows / (time.perf_counter() - start):>10.0f}")
+
+            # Повторная загрузка тех же пар (user_id, movie_id) идет через ветку UPDATE
+            start = time.perf_counter()
+            db.save_ratings_bulk(make_rows(n_rows), batch_size=BATCH_SIZE)
+            print(f"{n_rows:>10} {'save_ratings_bulk, обновление':<28} {n_rows / (time.perf_counter() - start):>10.0f}")
+
+            start = time.perf_counter()
+            exported = sum(len(chunk) for chunk in db.export_ratings(chunksize=BATCH_SIZE))
+            print(f"{exported:>10} {'export_ratings':<28} {exported / (time.perf_counter() - start):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Бенчмарк кэша результатов /get_recommendations: повторяющиеся наборы оценок анонимных пользователей"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.result_cache import RecommendationCache
+from synthetic import make_recommender
+
+N_USERS, N_MOVIES = 20_000, 20_000
+N_REQUESTS = 3_000
+N_DISTINCT_SETS = [50, 500, 5_000]
+CACHE_SIZE = 1024
+
+
+def run(recommender, requests):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for user_ratings in requests:
+            recommender.get_recommendations(None, user_ratings, 10)
+    return len(requests) / (time.perf_counter() - start)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recommender = make_recommender(tmp_dir, N_USERS, N_MOVIES, N_USERS * 50)
+        onboarding = recommender.popular_movies['movieId'].to_numpy()[:30]
+
+        print(f"{'наборов':>8} {'без кэша, зап/с':>16} {'с кэшем, зап/с':>15} {'доля попаданий':>15}")
+        for n_sets in N_DISTINCT_SETS:
+            # Анонимные пользователи оценивают несколько фильмов с онбординга; популярность наборов - Zipf
+            sets = [{str(m): float(rng.integers(1, 11) / 2) for m in rng.choice(onboarding, size=5, replace=False)}
+                    for _ in range(n_sets)]
+            requests = [sets[(i - 1) % n_sets] for i in rng.zipf(1.3, size=N_REQUESTS)]
+
+            recommender.result_cache = None
+            uncached = run(recommender, requests)
+
+            recommender.result_cache = RecommendationCache(CACHE_SIZE, 300)
+            cached = run(recommender, requests)
+            print(f"{n_sets:>8} {uncached:>16.0f} {cached:>15.0f} {recommender.result_cache.stats()['hit_rate']:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
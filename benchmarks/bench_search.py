@@ -0,0 +1,67 @@
+"""Бенчмарк поиска фильмов: str.contains по всему каталогу против n-граммного индекса"""
+import os
+import sys
+import time
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.data_processing import build_genre_index
+from src.search import MovieSearchIndex
+from synthetic import make_movies
+
+N_MOVIES = 62_000
+N_QUERIES = 300
+QUERY_LENGTHS = [1, 2, 3, 5, 8]
+LIMIT = 100
+
+
+def legacy_search(movies, query, genre):
+    filtered_movies = movies
+    if query:
+        filtered_movies = filtered_movies[filtered_movies['title'].str.lower().str.contains(query, regex=False)]
+    if genre and genre != 'all':
+        filtered_movies = filtered_movies[filtered_movies['genres'].str.contains(genre, regex=False)]
+    return filtered_movies.head(LIMIT)
+
+
+def latencies(func, queries):
+    timings = []
+    for query, genre in queries:
+        start = time.perf_counter()
+        func(query, genre)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    movies = make_movies(N_MOVIES)
+    genres, _, genre_matrix = build_genre_index(movies)
+    genre_masks = (genre_matrix.toarray() > 0).astype(np.int64) @ (np.int64(1) << np.arange(len(genres), dtype=np.int64))
+
+    start = time.perf_counter()
+    index = MovieSearchIndex(movies['title'], genre_masks, genres)
+    print(f"Индекс для {N_MOVIES} фильмов построен за {time.perf_counter() - start:.2f} с, "
+          f"вхождений n-грамм: {len(index.contains)}")
+
+    titles = movies['title'].str.lower().to_numpy()
+    print(f"{'длина':>6} {'жанр':>5} {'было p50, мс':>13} {'стало p50, мс':>14} {'стало p99, мс':>14}")
+    for length in QUERY_LENGTHS:
+        for with_genre in (False, True):
+            queries = []
+            for _ in range(N_QUERIES):
+                title = titles[rng.integers(len(titles))]
+                start = int(rng.integers(0, max(1, len(title) - length)))
+                genre = genres[rng.integers(len(genres))] if with_genre else 'all'
+                queries.append((title[start:start + length], genre))
+
+            legacy_ms = latencies(lambda q, g: legacy_search(movies, q, g), queries[:30])
+            index_ms = latencies(lambda q, g: index.search(q, g, LIMIT), queries)
+            print(f"{length:>6} {'да' if with_genre else 'нет':>5} {np.percentile(legacy_ms, 50):>13.2f} "
+                  f"{np.percentile(index_ms, 50):>14.3f} {np.percentile(index_ms, 99):>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Бенчмарк пиковой памяти построения профилей: вся таблица ratings против потокового режима.
+
+Каждый вариант запускается в отдельном процессе, чтобы пиковый RSS отражал только его.
+"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import subprocess
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from measure import peak_rss_mb
+
+SIZES = [
+    # (пользователей, фильмов, оценок)
+    (20_000, 10_000, 2_000_000),
+    (50_000, 20_000, 8_000_000),
+]
+CHUNKSIZE = 500_000
+
+CASES = [
+    ('full', 'Вся таблица ratings'),
+    ('streaming', f'Блоки по {CHUNKSIZE}'),
+]
+
+
+def run_case(case, data_dir):
+    from src.data_processing import DataProcessor
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = DataProcessor(data_dir=data_dir, use_cache=False)
+        if case == 'full':
+            processor.movies = processor.read_csv('movies.csv')
+            processor.ratings = processor.read_csv('ratings.csv')
+            processor.create_user_profiles(processor.create_user_item_matrix())
+        else:
+            processor.create_user_profiles_streaming(chunksize=CHUNKSIZE)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = peak_rss_mb()
+    print(f"{elapsed:.2f} {peak_mb:.0f}")
+
+
+def main():
+    from synthetic import write_dataset
+
+    print(f"{'оценок':>10} {'вариант':<22} {'время, с':>9} {'пик RSS, МБ':>12}")
+    for n_users, n_movies, n_ratings in SIZES:
+        with tempfile.TemporaryDirectory() as data_dir:
+            _, ratings = write_dataset(data_dir, n_users, n_movies, n_ratings)
+            for case, title in CASES:
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--case', case, data_dir],
+                    check=True, capture_output=True, text=True
+                ).stdout.split()
+                elapsed, peak_mb = output[-2:]
+                print(f"{len(ratings):>10} {title:<22} {float(elapsed):>9.2f} {peak_mb:>12}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--case':
+        run_case(sys.argv[2], sys.argv[3])
+    else:
+        main()
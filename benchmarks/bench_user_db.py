@@ -0,0 +1,96 @@
+"""Нагрузочный бенчмарк UserDatabase: параллельные записи и чтения оценок из нескольких потоков"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from user_db import UserDatabase
+
+N_USERS, N_MOVIES = 200, 5_000
+OPS_PER_THREAD = 1_000
+THREAD_COUNTS = [1, 4, 16]
+WRITE_SHARE = 0.3
+
+
+class LegacyUserDatabase(UserDatabase):
+    """Прежнее поведение: новое соединение на каждый вызов, журнал по умолчанию"""
+
+    def _connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def save_rating(self, user_id, movie_id, rating):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM user_ratings WHERE user_id = ? AND movie_id = ?', (user_id, movie_id))
+            if cursor.fetchone():
+                cursor.execute('UPDATE user_ratings SET rating = ?, timestamp = ? WHERE user_id = ? AND movie_id = ?',
+                               (rating, time.time(), user_id, movie_id))
+            else:
+                cursor.execute('INSERT INTO user_ratings (user_id, movie_id, rating, timestamp) VALUES (?, ?, ?, ?)',
+                               (user_id, movie_id, rating, time.time()))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception:
+            return False
+
+    def get_user_ratings(self, user_id):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            ratings = conn.execute('SELECT movie_id, rating FROM user_ratings WHERE user_id = ?',
+                                   (user_id,)).fetchall()
+            conn.close()
+            return {str(movie_id): rating for movie_id, rating in ratings}
+        except Exception:
+            return None
+
+
+def worker(db, seed, counters, lock):
+    rng = np.random.default_rng(seed)
+    errors = 0
+    for _ in range(OPS_PER_THREAD):
+        user_id = int(rng.integers(1, N_USERS + 1))
+        if rng.random() < WRITE_SHARE:
+            ok = db.save_rating(user_id, int(rng.integers(1, N_MOVIES)), float(rng.integers(1, 11) / 2))
+        else:
+            ok = db.get_user_ratings(user_id) is not None
+        errors += not ok
+    with lock:
+        counters['errors'] += errors
+
+
+def run(db_class, db_path, n_threads):
+    db = db_class(db_path)
+    counters, lock = {'errors': 0}, threading.Lock()
+    threads = [threading.Thread(target=worker, args=(db, seed, counters, lock)) for seed in range(n_threads)]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    return n_threads * OPS_PER_THREAD / elapsed, counters['errors']
+
+
+def main():
+    print(f"{'потоков':>8} {'режим':<28} {'оп/с':>8} {'ошибок':>7}")
+    for n_threads in THREAD_COUNTS:
+        for name, db_class in [('соединение на вызов', LegacyUserDatabase),
+                               ('соединение на поток, WAL', UserDatabase)]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                ops, errors = run(db_class, os.path.join(tmp_dir, 'users.db'), n_threads)
+            print(f"{n_threads:>8} {name:<28} {ops:>8.0f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
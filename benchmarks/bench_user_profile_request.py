@@ -0,0 +1,68 @@
+"""Микро-бенчмарк create_user_profile: 10, 100 и 1000 оценок на пользователя при разном размере каталога"""
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import io
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from synthetic import make_recommender
+
+CATALOG_SIZES = [2_000, 20_000, 60_000]
+RATINGS_PER_USER = [10, 100, 1000]
+REPEATS = 50
+
+
+def legacy_create_user_profile(movies, user_ratings):
+    all_genres = []
+    for genres_list in movies['genres'].str.split('|'):
+        if isinstance(genres_list, list):
+            all_genres.extend(genres_list)
+    unique_genres = sorted(list(set(all_genres)))
+
+    genre_profile = {genre: 0 for genre in unique_genres}
+    genre_counts = {genre: 0 for genre in unique_genres}
+    for movie_id, rating in user_ratings.items():
+        movie_data = movies[movies['movieId'] == int(float(movie_id))]
+        if not movie_data.empty:
+            for genre in movie_data['genres'].iloc[0].split('|'):
+                genre_profile[genre] += float(rating)
+                genre_counts[genre] += 1
+    return genre_profile
+
+
+def timed(func, *args, repeats=REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(*args)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'фильмов':>8} {'оценок':>7} {'было, мс':>10} {'стало, мс':>10}")
+    for n_movies in CATALOG_SIZES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with contextlib.redirect_stdout(io.StringIO()):
+                recommender = make_recommender(tmp_dir, 2_000, n_movies, 100_000)
+
+            for n_ratings in RATINGS_PER_USER:
+                movie_ids = rng.choice(recommender.movies['movieId'], size=n_ratings, replace=False)
+                user_ratings = {str(m): float(rng.integers(1, 11) / 2) for m in movie_ids}
+
+                legacy_repeats = max(1, REPEATS // n_ratings)
+                legacy_ms = timed(legacy_create_user_profile, recommender.movies, user_ratings,
+                                  repeats=legacy_repeats)
+                new_ms = timed(recommender.create_user_profile, user_ratings)
+                print(f"{n_movies:>8} {n_ratings:>7} {legacy_ms:>10.2f} {new_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
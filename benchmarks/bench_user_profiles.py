@@ -0,0 +1,91 @@
+"""Бенчмарк построения профилей пользователей: цикл по пользователям против разреженного произведения матриц"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+
+from src.data_processing import DataProcessor
+from synthetic import make_movies, make_ratings
+
+SIZES = [
+    # (пользователей, фильмов, оценок)
+    (200, 500, 5_000),
+    (1_000, 2_000, 50_000),
+    (5_000, 5_000, 250_000),
+    (20_000, 10_000, 1_000_000),
+    (50_000, 20_000, 5_000_000),
+    (160_000, 60_000, 25_000_000),
+]
+LEGACY_MAX_RATINGS = 50_000
+
+
+def legacy_create_user_profiles(movies, user_item_matrix):
+    all_genres = []
+    for genres_list in movies['genres_list']:
+        if isinstance(genres_list, list):
+            all_genres.extend(genres_list)
+    unique_genres = sorted(list(set(all_genres)))
+
+    user_profiles = {}
+    for user_id in user_item_matrix.index:
+        rated_movies = user_item_matrix.loc[user_id]
+        rated_movies = rated_movies[rated_movies > 0]
+        if len(rated_movies) == 0:
+            continue
+
+        genre_profile = {genre: 0 for genre in unique_genres}
+        for movie_id, rating in rated_movies.items():
+            movie_data = movies[movies['movieId'] == movie_id]
+            if not movie_data.empty and isinstance(movie_data['genres_list'].iloc[0], list):
+                for genre in movie_data['genres_list'].iloc[0]:
+                    if genre in genre_profile:
+                        genre_profile[genre] += rating
+
+        total_weight = sum(genre_profile.values())
+        if total_weight > 0:
+            for genre in genre_profile:
+                genre_profile[genre] /= total_weight
+        user_profiles[user_id] = genre_profile
+
+    user_profiles_df = pd.DataFrame.from_dict(user_profiles, orient='index')
+    user_profiles_df['mean_rating'] = user_item_matrix.replace(0, np.nan).mean(axis=1).fillna(0)
+    user_profiles_df['rated_count'] = (user_item_matrix > 0).sum(axis=1)
+    return user_profiles_df
+
+
+def make_processor(n_users, n_movies, n_ratings):
+    processor = DataProcessor()
+    processor.movies = make_movies(n_movies)
+    processor.movies['genres_list'] = processor.movies['genres'].str.split('|')
+    processor.ratings = make_ratings(n_users, n_movies, n_ratings)
+    return processor
+
+
+def main():
+    print(f"{'пользователей':>14} {'фильмов':>8} {'оценок':>10} {'цикл, с':>10} {'sparse, с':>10}")
+    for n_users, n_movies, n_ratings in SIZES:
+        processor = make_processor(n_users, n_movies, n_ratings)
+        user_item_matrix = processor.create_user_item_matrix()
+
+        start = time.perf_counter()
+        profiles, _, _ = processor.create_user_profiles(user_item_matrix)
+        sparse_time = time.perf_counter() - start
+
+        legacy_time = float('nan')
+        if n_ratings <= LEGACY_MAX_RATINGS:
+            start = time.perf_counter()
+            legacy_profiles = legacy_create_user_profiles(processor.movies, user_item_matrix.to_frame())
+            legacy_time = time.perf_counter() - start
+            legacy_profiles = legacy_profiles.loc[profiles.index, profiles.columns]
+            assert np.allclose(legacy_profiles.values, profiles.values), "Профили не совпадают"
+
+        print(f"{n_users:>14} {n_movies:>8} {len(processor.ratings):>10} "
+              f"{legacy_time:>10.2f} {sparse_time:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import resource
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса в МБ.
+
+    На Linux читается VmHWM: ru_maxrss наследуется от родителя через fork/exec и завышает результат
+    дочерних процессов бенчмарка.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
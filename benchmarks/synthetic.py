@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import pandas as pd
+
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Children', 'Comedy', 'Crime',
+    'Documentary', 'Drama', 'Fantasy', 'Film-Noir', 'Horror', 'IMAX',
+    'Musical', 'Mystery', 'Romance', 'Sci-Fi', 'Thriller', 'War', 'Western',
+]
+
+
+def make_movies(n_movies, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array(['Star', 'Dark', 'Love', 'City', 'Night', 'Story', 'War', 'King',
+                      'Lost', 'Return', 'Girl', 'Man', 'House', 'Dead', 'Last', 'Secret'])
+    titles = []
+    genres = []
+    for movie_id in range(1, n_movies + 1):
+        title_words = rng.choice(words, size=rng.integers(1, 4))
+        year = rng.integers(1920, 2020)
+        titles.append(f"{' '.join(title_words)} {movie_id} ({year})")
+        if rng.random() < 0.01:
+            genres.append('(no genres listed)')
+        else:
+            movie_genres = rng.choice(GENRES, size=rng.integers(1, 4), replace=False)
+            genres.append('|'.join(movie_genres))
+    return pd.DataFrame({
+        'movieId': np.arange(1, n_movies + 1),
+        'title': titles,
+        'genres': genres,
+    })
+
+
+def make_ratings(n_users, n_movies, n_ratings, seed=0):
+    rng = np.random.default_rng(seed)
+    # Популярность фильмов распределена по закону Ципфа, как в MovieLens
+    popularity = 1.0 / np.arange(1, n_movies + 1) ** 0.8
+    popularity /= popularity.sum()
+    user_ids = rng.integers(1, n_users + 1, size=n_ratings)
+    movie_ids = rng.choice(np.arange(1, n_movies + 1), size=n_ratings, p=popularity)
+    ratings = pd.DataFrame({
+        'userId': user_ids,
+        'movieId': movie_ids,
+        'rating': rng.integers(1, 11, size=n_ratings) / 2.0,
+        'timestamp': rng.integers(800_000_000, 1_600_000_000, size=n_ratings),
+    })
+    ratings = ratings.drop_duplicates(['userId', 'movieId']).sort_values(['userId', 'movieId'])
+    return ratings.reset_index(drop=True)
+
+
+def write_dataset(data_dir, n_users, n_movies, n_ratings, seed=0):
+    os.makedirs(data_dir, exist_ok=True)
+    movies = make_movies(n_movies, seed=seed)
+    ratings = make_ratings(n_users, n_movies, n_ratings, seed=seed)
+    movies.to_csv(os.path.join(data_dir, 'movies.csv'), index=False)
+    ratings.to_csv(os.path.join(data_dir, 'ratings.csv'), index=False)
+    return movies, ratings
+
+
+def write_models(models_dir, movies, ratings, n_clusters=20, n_neighbors=5):
+    from src.data_processing import DataProcessor
+    from src.clustering import UserClustering
+
+    os.makedirs(models_dir, exist_ok=True)
+    processor = DataProcessor()
+    processor.movies = movies.copy()
+    processor.ratings = ratings
+    user_item_matrix = processor.create_user_item_matrix()
+    processor.create_user_profiles(user_item_matrix, save_path=os.path.join(models_dir, 'user_profiles.pkl'))
+
+    clustering = UserClustering(profiles_path=os.path.join(models_dir, 'user_profiles.pkl'))
+    clustering.perform_clustering(n_clusters=n_clusters,
+                                  save_model_path=os.path.join(models_dir, 'kmeans_model.pkl'))
+    clustering.build_cluster_recommendations(ratings, save_model_path=os.path.join(models_dir, 'kmeans_model.pkl'))
+    clustering.build_knn_model(n_neighbors=n_neighbors,
+                               save_model_path=os.path.join(models_dir, 'knn_model.pkl'))
+
+
+def make_recommender(base_dir, n_users, n_movies, n_ratings, seed=0, **kwargs):
+    from src.recommender import MovieRecommender
+
+    data_dir = os.path.join(base_dir, 'data')
+    models_dir = os.path.join(base_dir, 'models')
+    movies, ratings = write_dataset(data_dir, n_users, n_movies, n_ratings, seed=seed)
+    write_models(models_dir, movies, ratings)
+    return MovieRecommender(
+        movies_path=os.path.join(data_dir, 'movies.csv'),
+        ratings_path=os.path.join(data_dir, 'ratings.csv'),
+        user_profiles_path=os.path.join(models_dir, 'user_profiles.pkl'),
+        kmeans_model_path=os.path.join(models_dir, 'kmeans_model.pkl'),
+        knn_model_path=os.path.join(models_dir, 'knn_model.pkl'),
+        **kwargs
+    )
+
+
+def make_genome_scores(n_movies, n_tags=1128, seed=0):
+    rng = np.random.default_rng(seed)
+    movie_ids = np.repeat(np.arange(1, n_movies + 1), n_tags)
+    tag_ids = np.tile(np.arange(1, n_tags + 1), n_movies)
+    relevance = rng.beta(0.5, 4.0, size=n_movies * n_tags).round(5)
+    return pd.DataFrame({'movieId': movie_ids, 'tagId': tag_ids, 'relevance': relevance})
+
+
+def write_full_dataset(data_dir, n_users, n_movies, n_ratings, n_genome_movies=None, n_tags=1128, seed=0):
+    """Все шесть файлов MovieLens, которые читает DataProcessor.load_data"""
+    movies, ratings = write_dataset(data_dir, n_users, n_movies, n_ratings, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    tag_sample = ratings.sample(n=min(len(ratings), n_ratings // 50), random_state=seed)
+    tags = tag_sample[['userId', 'movieId', 'timestamp']].copy()
+    tags.insert(2, 'tag', rng.choice(['funny', 'dark', 'classic', 'twist ending', 'boring'], size=len(tags)))
+    tags.to_csv(os.path.join(data_dir, 'tags.csv'), index=False)
+
+    genome_scores = make_genome_scores(n_genome_movies or n_movies, n_tags=n_tags, seed=seed)
+    genome_scores.to_csv(os.path.join(data_dir, 'genome-scores.csv'), index=False)
+    pd.DataFrame({
+        'tagId': np.arange(1, n_tags + 1),
+        'tag': [f"tag {tag_id}" for tag_id in range(1, n_tags + 1)],
+    }).to_csv(os.path.join(data_dir, 'genome-tags.csv'), index=False)
+
+    links = pd.DataFrame({
+        'movieId': movies['movieId'],
+        'imdbId': rng.integers(1, 9_999_999, size=len(movies)),
+        'tmdbId': np.where(rng.random(len(movies)) < 0.01, np.nan, rng.integers(1, 999_999, size=len(movies))),
+    })
+    links.to_csv(os.path.join(data_dir, 'links.csv'), index=False)
+    return movies, ratings, genome_scores
@@ -0,0 +1,115 @@
+"""Офлайн-расчет рекомендаций для всех зарегистрированных пользователей.
+
+Оценки читаются из UserDatabase потоком, пачки пользователей считаются в пуле процессов через
+MovieRecommender.get_recommendations_batch, результат записывается в таблицу
+precomputed_recommendations вместе с отпечатком оценок. Маршрут /get_recommendations отдает эти
+рекомендации, пока оценки пользователя не изменились.
+
+    python precompute_recommendations.py [--workers N] [--batch-size N] [--n N]
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from src.recommender import MovieRecommender, ratings_fingerprint
+from user_db import UserDatabase
+
+DATA_DIR = os.environ.get('MOVIES_DATA_DIR', os.path.join(current_dir, 'data'))
+MODELS_DIR = os.environ.get('MOVIES_MODELS_DIR', os.path.join(current_dir, 'models'))
+DB_PATH = os.environ.get('MOVIES_DB_PATH', os.path.join(current_dir, 'user_ratings.db'))
+
+# get_recommendations_batch считает рекомендации по похожим пользователям
+PRECOMPUTED_METHOD = 'users'
+
+_recommender = None
+
+
+def load_recommender():
+    return MovieRecommender(
+        movies_path=os.path.join(DATA_DIR, 'movies.csv'),
+        ratings_path=os.path.join(DATA_DIR, 'ratings.csv'),
+        user_profiles_path=os.path.join(MODELS_DIR, 'user_profiles.pkl'),
+        kmeans_model_path=os.path.join(MODELS_DIR, 'kmeans_model.pkl'),
+        knn_model_path=os.path.join(MODELS_DIR, 'knn_model.pkl'),
+        content_model_path=os.path.join(MODELS_DIR, 'content_model.pkl'),
+        item_model_path=os.path.join(MODELS_DIR, 'item_model.pkl'),
+        mf_model_path=os.path.join(MODELS_DIR, 'mf_model.pkl'),
+        bundle_path=os.path.join(MODELS_DIR, 'bundle'),
+        csv_cache_dir=os.path.join(DATA_DIR, '.cache')
+    )
+
+
+def _init_worker():
+    # Каждый процесс загружает модели один раз; массивы пакета моделей отображаются в память и общие
+    global _recommender
+    with contextlib.redirect_stdout(io.StringIO()):
+        _recommender = load_recommender()
+
+
+def _recommend_batch(users, n_recommendations):
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommendations = _recommender.get_recommendations_batch(users, n_recommendations)
+    rows = list(zip(recommendations['userId'].tolist(), recommendations['rank'].tolist(),
+                    recommendations['movieId'].tolist(), recommendations['score'].tolist()))
+    fingerprints = {user_id: ratings_fingerprint(user_ratings) for user_id, user_ratings in users}
+    return rows, fingerprints, _recommender.model_version
+
+
+def iter_batches(items, batch_size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def precompute_recommendations(db_path=DB_PATH, n_recommendations=10, batch_size=1000, workers=None):
+    user_db = UserDatabase(db_path)
+    workers = workers or os.cpu_count() or 1
+    batches = iter_batches(user_db.iter_users_ratings(), batch_size)
+
+    n_users, start = 0, time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # Не больше двух пачек на процесс в работе одновременно: память не зависит от числа пользователей
+        pending = set()
+        for batch in batches:
+            pending.add(executor.submit(_recommend_batch, batch, n_recommendations))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                n_users += _save_results(user_db, done)
+        n_users += _save_results(user_db, pending)
+
+    elapsed = time.perf_counter() - start
+    print(f"Рекомендации посчитаны для {n_users} пользователей за {elapsed:.1f} с "
+          f"({n_users / max(elapsed, 1e-9):.0f} польз/с, процессов: {workers})")
+    return n_users
+
+
+def _save_results(user_db, futures):
+    n_users = 0
+    for future in futures:
+        rows, fingerprints, model_version = future.result()
+        user_db.save_precomputed_recommendations(rows, fingerprints, PRECOMPUTED_METHOD, model_version)
+        n_users += len(fingerprints)
+    return n_users
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Офлайн-расчет рекомендаций для пользователей из базы")
+    parser.add_argument('--db', default=DB_PATH, help="путь к базе пользователей")
+    parser.add_argument('--n', type=int, default=10, help="число рекомендаций на пользователя")
+    parser.add_argument('--batch-size', type=int, default=1000, help="пользователей в одной пачке")
+    parser.add_argument('--workers', type=int, default=None, help="число процессов (по умолчанию - число ядер)")
+    args = parser.parse_args()
+
+    precompute_recommendations(args.db, n_recommendations=args.n, batch_size=args.batch_size,
+                               workers=args.workers)
@@ -0,0 +1,60 @@
+"""Инкрементальное обновление пакета моделей оценками пользователей из UserDatabase.
+
+Каждая запись оценок получает в базе номер изменения; текущая версия пакета моделей хранит номер,
+до которого оценки уже учтены (user_db_checkpoint). Задача читает только пользователей, изменившихся
+после него, обновляет их профили, статистики масштабирования, кластеры, списки кластеров и индекс
+соседей (src/incremental.py) и записывает новую версию пакета с новым номером. Полный конвейер
+(data_processing, clustering) по-прежнему нужен для переобучения KMeans, списков соседей фильмов и ALS.
+
+    python retrain_incremental.py [--db PATH] [--bundle DIR]
+"""
+import os
+import sys
+import time
+import argparse
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from src.model_bundle import bundle_exists
+from src.recommender import MovieRecommender
+from src.incremental import apply_user_changes
+from user_db import UserDatabase
+
+MODELS_DIR = os.environ.get('MOVIES_MODELS_DIR', os.path.join(current_dir, 'models'))
+DB_PATH = os.environ.get('MOVIES_DB_PATH', os.path.join(current_dir, 'user_ratings.db'))
+BUNDLE_DIR = os.path.join(MODELS_DIR, 'bundle')
+
+
+def retrain_incremental(db_path=DB_PATH, bundle_dir=BUNDLE_DIR):
+    """Записывает новую версию пакета с учетом изменившихся оценок; возвращает ее каталог или None"""
+    if not bundle_exists(bundle_dir):
+        print(f"Пакет моделей {bundle_dir} не найден. Сначала соберите его: python src/model_bundle.py")
+        return None
+
+    start = time.perf_counter()
+    recommender = MovieRecommender(bundle_path=bundle_dir)
+    user_db = UserDatabase(db_path)
+
+    checkpoint, user_ids, ratings = user_db.get_changed_ratings(recommender.user_db_checkpoint)
+    if len(user_ids) == 0:
+        print(f"Новых оценок после изменения {checkpoint} нет, пакет моделей не изменен")
+        return None
+    print(f"Изменились оценки {len(user_ids)} пользователей ({len(ratings)} оценок), "
+          f"изменения {recommender.user_db_checkpoint} -> {checkpoint}")
+
+    apply_user_changes(recommender, user_ids, ratings)
+    recommender.user_db_checkpoint = checkpoint
+    version_dir = recommender.save_bundle(bundle_dir)
+
+    print(f"Инкрементальное обновление завершено за {time.perf_counter() - start:.1f} с")
+    return version_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Инкрементальное обновление моделей оценками из базы")
+    parser.add_argument('--db', default=DB_PATH, help="путь к базе пользователей")
+    parser.add_argument('--bundle', default=BUNDLE_DIR, help="каталог пакета моделей")
+    args = parser.parse_args()
+
+    retrain_incremental(args.db, args.bundle)
@@ -3,10 +3,72 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import joblib
 import os
-from sklearn.cluster import KMeans
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+import scipy.sparse as sp
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 from sklearn.neighbors import NearestNeighbors
 
+try:
+    from src.data_processing import read_csv_cached, UserItemMatrix
+    from src.neighbors import IVFNeighborIndex
+except ImportError:
+    from data_processing import read_csv_cached, UserItemMatrix
+    from neighbors import IVFNeighborIndex
+
+
+def _extend_centers(profiles, centers, n_clusters, rng):
+    """Добавляет к центроидам предыдущего k новые центры выбором пропорционально D^2 (k-means++)"""
+    centers = [np.asarray(center) for center in centers]
+    closest = ((profiles - centers[0]) ** 2).sum(axis=1)
+    for center in centers[1:]:
+        closest = np.minimum(closest, ((profiles - center) ** 2).sum(axis=1))
+
+    while len(centers) < n_clusters:
+        total = closest.sum()
+        if total > 0:
+            index = rng.choice(len(profiles), p=closest / total)
+        else:
+            index = rng.integers(len(profiles))
+        centers.append(profiles[index])
+        closest = np.minimum(closest, ((profiles - profiles[index]) ** 2).sum(axis=1))
+
+    return np.vstack(centers)
+
+
+def _sweep_block(profiles, cluster_range, warm_start=True, n_init=10, silhouette_sample_size=10000,
+                 compute_silhouette=False, n_threads=None, random_state=42):
+    rng = np.random.default_rng(random_state)
+    results = []
+    centers = None
+
+    with threadpool_limits(limits=n_threads):
+        for n_clusters in cluster_range:
+            start = time.perf_counter()
+
+            if warm_start and centers is not None and len(centers) < n_clusters:
+                init = _extend_centers(profiles, centers, n_clusters, rng)
+                kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=random_state)
+            else:
+                kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=n_init)
+            cluster_labels = kmeans.fit_predict(profiles)
+            centers = kmeans.cluster_centers_
+
+            silhouette_avg = np.nan
+            if compute_silhouette:
+                sample_size = silhouette_sample_size
+                if sample_size is not None and sample_size >= len(profiles):
+                    sample_size = None
+                silhouette_avg = silhouette_score(profiles, cluster_labels, sample_size=sample_size,
+                                                  random_state=random_state)
+
+            results.append((n_clusters, kmeans.inertia_, silhouette_avg, time.perf_counter() - start))
+
+    return results
+
 
 class UserClustering:
     def __init__(self, user_profiles_scaled=None, profiles_path=None):
@@ -31,10 +93,17 @@ class UserClustering:
         self.n_clusters = None
         self.user_clusters = None
         self.knn_model = None
+        self.sweep_results = None
+        self.backend = 'kmeans'
+        self.cluster_recommendations = None
 
-    def find_optimal_clusters(self, max_clusters=300, method='elbow', save_plot_path=None):
+    def find_optimal_clusters(self, max_clusters=300, method='elbow', save_plot_path=None,
+                              n_jobs=None, warm_start=True, n_init=10, silhouette_sample_size=10000):
         print(f"Определение оптимального количества кластеров методом {method}...")
 
+        if method not in ('elbow', 'silhouette'):
+            raise ValueError("Метод должен быть 'elbow' или 'silhouette'")
+
         if max_clusters <= 50:
             step = 1
         elif max_clusters <= 100:
@@ -43,16 +112,21 @@ class UserClustering:
             step = 5
 
         cluster_range = range(2, max_clusters + 1, step)
+        if method == 'silhouette':
+            cluster_range = [k for k in cluster_range if k <= self.user_profiles_scaled.shape[0] - 1]
+
+        self.sweep_results = self.sweep_clusters(
+            cluster_range,
+            n_jobs=n_jobs,
+            warm_start=warm_start,
+            n_init=n_init,
+            silhouette_sample_size=silhouette_sample_size if method == 'silhouette' else None,
+            compute_silhouette=method == 'silhouette'
+        )
 
         if method == 'elbow':
  
-            inertia_values = []
-
-            for n_clusters in cluster_range:
-                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-                kmeans.fit(self.user_profiles_scaled)
-                inertia_values.append(kmeans.inertia_)
-                print(f"Кластеров: {n_clusters}, Инерция: {kmeans.inertia_:.2f}")
+            inertia_values = list(self.sweep_results['inertia'])
 
             normalized_inertia = [inertia / inertia_values[0] for inertia in inertia_values]
 
@@ -82,15 +156,7 @@ class UserClustering:
             return optimal_clusters
 
         elif method == 'silhouette':
-            silhouette_scores = []
-
-            for n_clusters in cluster_range:
-                if n_clusters <= self.user_profiles_scaled.shape[0] - 1:
-                    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-                    cluster_labels = kmeans.fit_predict(self.user_profiles_scaled)
-                    silhouette_avg = silhouette_score(self.user_profiles_scaled, cluster_labels)
-                    silhouette_scores.append(silhouette_avg)
-                    print(f"Кластеров: {n_clusters}, Коэффициент силуэта: {silhouette_avg:.4f}")
+            silhouette_scores = list(self.sweep_results['silhouette'])
 
             optimal_index = np.argmax(silhouette_scores)
             optimal_clusters = list(cluster_range)[optimal_index]
@@ -114,10 +180,48 @@ class UserClustering:
 
             return optimal_clusters
 
-        else:
-            raise ValueError("Метод должен быть 'elbow' или 'silhouette'")
+    def sweep_clusters(self, cluster_range, n_jobs=None, warm_start=True, n_init=10,
+                       silhouette_sample_size=10000, compute_silhouette=False):
+        """Обучает KMeans для каждого k; диапазон делится на непрерывные блоки по процессам.
+
+        Внутри блока каждое следующее k стартует с центроидов предыдущего (плюс новые центры,
+        выбранные как в k-means++), поэтому достаточно одного запуска вместо n_init.
+        """
+        cluster_range = list(cluster_range)
+        n_jobs = n_jobs or os.cpu_count() or 1
+        n_jobs = max(1, min(n_jobs, len(cluster_range)))
+        profiles = np.ascontiguousarray(self.user_profiles_scaled, dtype=np.float64)
+
+        blocks = [list(block) for block in np.array_split(cluster_range, n_jobs) if len(block)]
+        block_args = dict(
+            warm_start=warm_start,
+            n_init=n_init,
+            silhouette_sample_size=silhouette_sample_size,
+            compute_silhouette=compute_silhouette,
+            n_threads=max(1, (os.cpu_count() or 1) // n_jobs)
+        )
 
-    def perform_clustering(self, n_clusters=None, save_model_path=None):
+        print(f"Перебор {len(cluster_range)} значений k в {n_jobs} процессах")
+        start = time.perf_counter()
+        if n_jobs == 1:
+            results = _sweep_block(profiles, blocks[0], **block_args)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(_sweep_block, profiles, block, **block_args) for block in blocks]
+                results = [row for future in futures for row in future.result()]
+
+        sweep_results = pd.DataFrame(results, columns=['n_clusters', 'inertia', 'silhouette', 'seconds'])
+        for row in sweep_results.itertuples():
+            message = f"Кластеров: {row.n_clusters}, Инерция: {row.inertia:.2f}"
+            if compute_silhouette:
+                message += f", Коэффициент силуэта: {row.silhouette:.4f}"
+            print(f"{message}, время: {row.seconds:.2f} с")
+        print(f"Перебор завершен за {time.perf_counter() - start:.2f} с "
+              f"(суммарно по k: {sweep_results['seconds'].sum():.2f} с)")
+
+        return sweep_results
+
+    def perform_clustering(self, n_clusters=None, save_model_path=None, backend='kmeans', batch_size=4096):
         if n_clusters is None:
             if self.n_clusters is None:
                 self.n_clusters = self.find_optimal_clusters(max_clusters=200)
@@ -125,12 +229,18 @@ class UserClustering:
         else:
             self.n_clusters = n_clusters
 
-        print(f"Выполнение кластеризации с {n_clusters} кластерами...")
+        print(f"Выполнение кластеризации с {n_clusters} кластерами (backend={backend})...")
 
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(self.user_profiles_scaled)
+        if backend == 'kmeans':
+            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        elif backend == 'minibatch':
+            kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, n_init=3, batch_size=batch_size)
+        else:
+            raise ValueError("backend должен быть 'kmeans' или 'minibatch'")
+        cluster_labels = kmeans.fit_predict(self.user_profiles_scaled.to_numpy(dtype=np.float64))
 
         self.kmeans_model = kmeans
+        self.backend = backend
 
         self.user_clusters = pd.DataFrame(
             {'cluster': cluster_labels},
@@ -143,39 +253,163 @@ class UserClustering:
             print(f"Кластер {cluster_id}: {count} пользователей")
 
         if save_model_path:
-            try:
+            self.save_clustering(save_model_path)
+
+        return self.user_clusters
+
+    def partial_fit(self, new_profiles_scaled, save_model_path=None, removed_user_ids=()):
+        """Обновляет кластеры новыми или изменившимися профилями без полного переобучения.
+
+        Мини-пакетный k-means дообучается на new_profiles_scaled. Для KMeans новые профили относятся
+        к ближайшим центрам, а центры заменяются средними участников с учетом прежних профилей тех
+        же пользователей. removed_user_ids - пользователи, которых больше нет в кластеризации.
+        """
+        if not isinstance(self.kmeans_model, (KMeans, MiniBatchKMeans)):
+            raise ValueError("Модель кластеризации не обучена")
+
+        print(f"Дообучение кластеризации на {len(new_profiles_scaled)} профилях...")
+
+        new_profiles = new_profiles_scaled.to_numpy(dtype=np.float64)
+        replaced = self.user_profiles_scaled.index.isin(new_profiles_scaled.index.union(pd.Index(removed_user_ids)))
+
+        minibatch = isinstance(self.kmeans_model, MiniBatchKMeans)
+        if minibatch and len(new_profiles):
+            self.kmeans_model.partial_fit(new_profiles)
+        cluster_labels = self.kmeans_model.predict(new_profiles) if len(new_profiles) else np.array([], dtype=np.int32)
+
+        if not minibatch:
+            centers = self.kmeans_model.cluster_centers_
+            # Центр KMeans - среднее участников: суммы и размеры кластеров правятся на разницу составов
+            labels = self.user_clusters['cluster'].reindex(self.user_profiles_scaled.index).to_numpy()
+            clustered = ~np.isnan(labels)
+            labels = np.where(clustered, labels, 0).astype(np.int64)
+            counts = np.bincount(labels[clustered], minlength=len(centers)).astype(np.float64)
+            sums = centers * counts[:, np.newaxis]
+
+            removed = replaced & clustered
+            np.add.at(sums, labels[removed], -self.user_profiles_scaled.to_numpy(dtype=np.float64)[removed])
+            counts -= np.bincount(labels[removed], minlength=len(centers))
+            np.add.at(sums, cluster_labels, new_profiles)
+            counts += np.bincount(cluster_labels, minlength=len(centers))
+
+            non_empty = counts > 0
+            centers = centers.copy()
+            centers[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+            self.kmeans_model.cluster_centers_ = centers
+
+        new_clusters = pd.DataFrame({'cluster': cluster_labels}, index=new_profiles_scaled.index)
+        self.user_clusters = pd.concat([
+            self.user_clusters[~self.user_clusters.index.isin(self.user_profiles_scaled.index[replaced])],
+            new_clusters
+        ])
+        self.user_profiles_scaled = pd.concat([self.user_profiles_scaled[~replaced], new_profiles_scaled])
 
-                save_dir = os.path.dirname(save_model_path)
-                if save_dir and not os.path.exists(save_dir):
-                    os.makedirs(save_dir, exist_ok=True)
-                    print(f"Создана директория: {save_dir}")
+        if save_model_path:
+            self.save_clustering(save_model_path)
+
+        return new_clusters
+
+    def save_clustering(self, save_model_path):
+        try:
+
+            save_dir = os.path.dirname(save_model_path)
+            if save_dir and not os.path.exists(save_dir):
+                os.makedirs(save_dir, exist_ok=True)
+                print(f"Создана директория: {save_dir}")
+
+            clustering_data = {
+                'kmeans_model': self.kmeans_model,
+                'n_clusters': self.n_clusters,
+                'user_clusters': self.user_clusters,
+                'backend': self.backend,
+                'cluster_recommendations': self.cluster_recommendations
+            }
+
+            joblib.dump(clustering_data, save_model_path)
+
+            if os.path.exists(save_model_path):
+                print(f"Модель кластеризации успешно сохранена в {save_model_path}")
+                print(f"Размер файла: {os.path.getsize(save_model_path)} байт")
+            else:
+                print(f"Ошибка: файл {save_model_path} не был создан")
+        except Exception as e:
+            print(f"Ошибка при сохранении модели кластеризации: {e}")
+            import traceback
+            print(traceback.format_exc())
+
+    def build_cluster_recommendations(self, ratings, top_n=500, min_support=5, save_model_path=None):
+        """Ранжированные списки фильмов для каждого кластера: средняя оценка участников и число оценок.
+
+        Списки всех кластеров хранятся подряд в плоских массивах, границы кластера c -
+        offsets[c]:offsets[c + 1].
+        """
+        print(f"Построение списков рекомендаций для {self.n_clusters} кластеров...")
+
+        rating_index = ratings if isinstance(ratings, UserItemMatrix) else UserItemMatrix.from_ratings(ratings)
+
+        labels = self.user_clusters['cluster'].reindex(rating_index.user_ids).to_numpy()
+        clustered = ~np.isnan(labels)
+        n_clusters = len(self.kmeans_model.cluster_centers_)
+        membership = sp.csr_matrix(
+            (np.ones(clustered.sum()), (labels[clustered].astype(np.int64), np.flatnonzero(clustered))),
+            shape=(n_clusters, rating_index.shape[0])
+        )
 
-                clustering_data = {
-                    'kmeans_model': self.kmeans_model,
-                    'n_clusters': self.n_clusters,
-                    'user_clusters': self.user_clusters
-                }
+        rating_sums = (membership @ rating_index.matrix).tocsr()
+        rating_counts = (membership @ rating_index.indicator()).tocsr()
+
+        offsets = [0]
+        movie_ids, scores, support = [], [], []
+        for cluster_id in range(n_clusters):
+            start, end = rating_sums.indptr[cluster_id], rating_sums.indptr[cluster_id + 1]
+            columns = rating_sums.indices[start:end]
+            sums = rating_sums.data[start:end]
+            counts = np.asarray(rating_counts[cluster_id, columns].todense()).ravel()
+
+            eligible = counts >= min_support
+            columns, means, counts = columns[eligible], sums[eligible] / counts[eligible], counts[eligible]
+
+            k = min(top_n, len(means))
+            top = np.argpartition(-means, k - 1)[:k] if 0 < k < len(means) else np.arange(k)
+            top = top[np.lexsort((-counts[top], -means[top]))]
+
+            movie_ids.append(rating_index.movie_ids[columns[top]])
+            scores.append(means[top])
+            support.append(counts[top])
+            offsets.append(offsets[-1] + len(top))
+
+        self.cluster_recommendations = {
+            'offsets': np.array(offsets, dtype=np.int64),
+            'movie_ids': np.concatenate(movie_ids).astype(np.int32),
+            'scores': np.concatenate(scores).astype(np.float32),
+            'support': np.concatenate(support).astype(np.int32),
+        }
+        print(f"Списки построены: в среднем {offsets[-1] / max(n_clusters, 1):.0f} фильмов на кластер")
 
-                joblib.dump(clustering_data, save_model_path)
+        if save_model_path:
+            self.save_clustering(save_model_path)
 
-                if os.path.exists(save_model_path):
-                    print(f"Модель кластеризации успешно сохранена в {save_model_path}")
-                    print(f"Размер файла: {os.path.getsize(save_model_path)} байт")
-                else:
-                    print(f"Ошибка: файл {save_model_path} не был создан")
-            except Exception as e:
-                print(f"Ошибка при сохранении модели кластеризации: {e}")
-                import traceback
-                print(traceback.format_exc())
+        return self.cluster_recommendations
 
-            return self.user_clusters
+    def build_knn_model(self, n_neighbors=5, save_model_path=None, backend='exact', n_probe=4, n_lists=None):
 
-    def build_knn_model(self, n_neighbors=5, save_model_path=None):
+        print(f"Построение модели KNN с {n_neighbors} соседями (backend={backend})...")
 
-        print(f"Построение модели KNN с {n_neighbors} соседями...")
+        profiles = self.user_profiles_scaled.to_numpy(dtype=np.float64)
 
-        knn = NearestNeighbors(n_neighbors=n_neighbors, algorithm='auto', metric='euclidean')
-        knn.fit(self.user_profiles_scaled)
+        if backend == 'exact':
+            knn = NearestNeighbors(n_neighbors=n_neighbors, algorithm='auto', metric='euclidean')
+            knn.fit(profiles)
+        elif backend == 'ivf':
+            knn = IVFNeighborIndex(n_neighbors=n_neighbors, n_probe=n_probe, n_lists=n_lists)
+            if self.kmeans_model is not None and n_lists is None:
+                # Инвертированные списки строятся на уже обученных центроидах KMeans
+                labels = self.user_clusters['cluster'].reindex(self.user_profiles_scaled.index).to_numpy()
+                knn.fit(profiles, centroids=self.kmeans_model.cluster_centers_, labels=labels)
+            else:
+                knn.fit(profiles)
+        else:
+            raise ValueError("backend должен быть 'exact' или 'ivf'")
         self.knn_model = knn
 
         if save_model_path:
@@ -187,7 +421,8 @@ class UserClustering:
 
                 knn_data = {
                     'knn_model': self.knn_model,
-                    'n_neighbors': n_neighbors
+                    'n_neighbors': n_neighbors,
+                    'backend': backend
                 }
 
                 joblib.dump(knn_data, save_model_path)
@@ -201,7 +436,7 @@ class UserClustering:
                 import traceback
                 print(traceback.format_exc())
 
-            return self.knn_model
+        return self.knn_model
 
     def find_similar_users(self, user_profile, n_neighbors=5):
         if self.knn_model is None:
@@ -243,12 +478,19 @@ if __name__ == "__main__":
 
         user_clusters = clustering.perform_clustering(
             n_clusters=optimal_clusters,
+            save_model_path='models/kmeans_model.pkl',
+            backend='minibatch' if '--minibatch' in sys.argv else 'kmeans'
+        )
+
+        clustering.build_cluster_recommendations(
+            read_csv_cached('data/ratings.csv', cache_dir='data/.cache'),
             save_model_path='models/kmeans_model.pkl'
         )
 
         knn_model = clustering.build_knn_model(
             n_neighbors=5,
-            save_model_path='models/knn_model.pkl'
+            save_model_path='models/knn_model.pkl',
+            backend='ivf' if '--ivf' in sys.argv else 'exact'
         )
 
         print("Кластеризация и построение модели KNN завершены!")
@@ -1,13 +1,219 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 import pickle
+import joblib
+import scipy.sparse as sp
 from sklearn.preprocessing import StandardScaler
 
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Компактные типы столбцов MovieLens: int32 для идентификаторов, float32 для оценок и релевантности
+CSV_DTYPES = {
+    'movies.csv': {'movieId': 'int32', 'genres': 'category'},
+    'ratings.csv': {'userId': 'int32', 'movieId': 'int32', 'rating': 'float32', 'timestamp': 'int64'},
+    'tags.csv': {'userId': 'int32', 'movieId': 'int32', 'timestamp': 'int64'},
+    'genome-scores.csv': {'movieId': 'int32', 'tagId': 'int32', 'relevance': 'float32'},
+    'genome-tags.csv': {'tagId': 'int32'},
+    'links.csv': {'movieId': 'int32', 'imdbId': 'int32', 'tmdbId': 'Int32'},
+}
+
+
+def _cache_key(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def read_csv_cached(path, dtype=None, cache_dir=None):
+    """Читает CSV с заданными типами и кэширует результат в Parquet (или pickle без pyarrow).
+
+    Кэш привязан к размеру и времени изменения исходного файла и пересоздается при их изменении.
+    """
+    if dtype is None:
+        dtype = CSV_DTYPES.get(os.path.basename(path))
+
+    if cache_dir is None:
+        return pd.read_csv(path, dtype=dtype)
+
+    name = os.path.basename(path)
+    extension = 'parquet' if HAS_PYARROW else 'pkl'
+    cache_path = os.path.join(cache_dir, f"{name}.{_cache_key(path)}.{extension}")
+
+    if os.path.exists(cache_path):
+        try:
+            if HAS_PYARROW:
+                return pd.read_parquet(cache_path)
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f"Ошибка при чтении кэша {cache_path}: {e}")
+
+    df = pd.read_csv(path, dtype=dtype)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for stale in os.listdir(cache_dir):
+            if stale.startswith(f"{name}.") and stale != os.path.basename(cache_path):
+                os.remove(os.path.join(cache_dir, stale))
+
+        tmp_path = f"{cache_path}.tmp"
+        if HAS_PYARROW:
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f"Ошибка при сохранении кэша {cache_path}: {e}")
+
+    return df
+
+
+def build_genre_index(movies):
+    """Словарь жанров и разреженная матрица фильм×жанр (строки в порядке movieId из movies)"""
+    movies = movies.drop_duplicates('movieId')
+    genres_lists = movies['genres'].astype(object).fillna('').str.split('|')
+
+    exploded = genres_lists.explode()
+    movie_rows = np.repeat(np.arange(len(movies)), genres_lists.str.len().to_numpy())
+    valid = (exploded != '').to_numpy()
+
+    genre_codes, unique_genres = pd.factorize(exploded[valid], sort=True)
+    genre_matrix = sp.csr_matrix(
+        (np.ones(len(genre_codes)), (movie_rows[valid], genre_codes)),
+        shape=(len(movies), len(unique_genres))
+    )
+
+    return list(unique_genres), movies['movieId'].to_numpy(), genre_matrix
+
+
+def iter_csv_chunks(path, chunksize, columns=('userId', 'movieId', 'rating')):
+    """Генератор блоков CSV фиксированного размера с компактными типами"""
+    dtype = CSV_DTYPES.get(os.path.basename(path))
+    with pd.read_csv(path, dtype=dtype, usecols=list(columns), chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+class UserItemMatrix:
+    """Разреженная матрица оценок пользователь×фильм (CSR) с отображениями userId/movieId"""
+
+    def __init__(self, matrix, user_ids, movie_ids):
+        self.matrix = matrix.tocsr()
+        self.user_ids = np.asarray(user_ids)
+        self.movie_ids = np.asarray(movie_ids)
+        self.user_index = pd.Index(self.user_ids)
+        self.movie_index = pd.Index(self.movie_ids)
+        self._indicator = None
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        if ratings.duplicated(['userId', 'movieId']).any():
+            # pivot_table усреднял повторные оценки одного фильма
+            ratings = ratings.groupby(['userId', 'movieId'], as_index=False)['rating'].mean()
+
+        user_rows, user_ids = pd.factorize(ratings['userId'], sort=True)
+        movie_cols, movie_ids = pd.factorize(ratings['movieId'], sort=True)
+
+        matrix = sp.csr_matrix(
+            (ratings['rating'].to_numpy(dtype=np.float32), (user_rows, movie_cols)),
+            shape=(len(user_ids), len(movie_ids))
+        )
+        matrix.eliminate_zeros()
+        return cls(matrix, user_ids.to_numpy(), movie_ids.to_numpy())
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Собирает матрицу из блоков оценок, не создавая общей таблицы ratings"""
+        user_parts, movie_parts, rating_parts = [], [], []
+        for chunk in chunks:
+            user_parts.append(chunk['userId'].to_numpy(dtype=np.int32))
+            movie_parts.append(chunk['movieId'].to_numpy(dtype=np.int32))
+            rating_parts.append(chunk['rating'].to_numpy(dtype=np.float32))
+
+        user_rows, user_ids = pd.factorize(np.concatenate(user_parts), sort=True)
+        del user_parts
+        movie_cols, movie_ids = pd.factorize(np.concatenate(movie_parts), sort=True)
+        del movie_parts
+
+        shape = (len(user_ids), len(movie_ids))
+        matrix = sp.csr_matrix((np.concatenate(rating_parts), (user_rows, movie_cols)), shape=shape)
+        del rating_parts
+        if matrix.nnz < len(user_rows):
+            # Конструктор суммирует повторные оценки одного фильма, а from_ratings их усредняет
+            counts = sp.csr_matrix((np.ones(len(user_rows), dtype=np.float32), (user_rows, movie_cols)),
+                                   shape=shape)
+            matrix.data /= counts.data
+        matrix.eliminate_zeros()
+        return cls(matrix, user_ids, movie_ids)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def indicator(self):
+        """Матрица 0/1 "пользователь оценил фильм" (float64): строится один раз и делит indices/indptr
+        с матрицей оценок, копируются только единицы"""
+        if self._indicator is None:
+            self._indicator = sp.csr_matrix(
+                (np.ones(self.matrix.nnz), self.matrix.indices, self.matrix.indptr),
+                shape=self.matrix.shape, copy=False
+            )
+        return self._indicator
+
+    def rated_counts(self):
+        return np.diff(self.matrix.indptr)
+
+    def rating_sums(self):
+        return np.asarray(self.matrix.sum(axis=1), dtype=np.float64).ravel()
+
+    def mean_ratings(self):
+        counts = self.rated_counts()
+        return np.divide(self.rating_sums(), counts,
+                         out=np.zeros(len(counts)), where=counts > 0)
+
+    def user_rows(self, user_ids):
+        return self.user_index.get_indexer(user_ids)
+
+    def movie_columns(self, movie_ids):
+        return self.movie_index.get_indexer(movie_ids)
+
+    def replace_users(self, user_ids, ratings):
+        """Новая матрица, в которой строки пользователей user_ids заменены их оценками из ratings.
+
+        ratings - таблица userId, movieId, rating со всеми текущими оценками этих пользователей;
+        пользователи без оценок в ratings удаляются. Остальные строки копируются срезом CSR, новые
+        фильмы добавляются в упорядоченный список movie_ids.
+        """
+        kept_rows = np.flatnonzero(~np.isin(self.user_ids, np.asarray(user_ids)))
+        kept = self.matrix[kept_rows]
+        update = UserItemMatrix.from_ratings(ratings) if len(ratings) else None
+        update_movie_ids = update.movie_ids if update is not None else self.movie_ids[:0]
+
+        movie_ids = np.union1d(self.movie_ids, update_movie_ids)
+        parts = [sp.csr_matrix((kept.data, np.searchsorted(movie_ids, self.movie_ids)[kept.indices], kept.indptr),
+                               shape=(len(kept_rows), len(movie_ids)))]
+        user_parts = [self.user_ids[kept_rows]]
+        if update is not None:
+            matrix = update.matrix
+            parts.append(sp.csr_matrix((matrix.data, np.searchsorted(movie_ids, update.movie_ids)[matrix.indices],
+                                        matrix.indptr), shape=(matrix.shape[0], len(movie_ids))))
+            user_parts.append(update.user_ids)
+
+        return UserItemMatrix(sp.vstack(parts, format='csr'), np.concatenate(user_parts), movie_ids)
+
+    def to_frame(self):
+        """Плотное представление - только для небольших матриц"""
+        return pd.DataFrame(self.matrix.toarray(), index=self.user_ids, columns=self.movie_ids)
+
 
 class DataProcessor:
-    def __init__(self, data_dir='data'):
+    def __init__(self, data_dir='data', use_cache=True, cache_dir=None):
         self.data_dir = data_dir
+        self.cache_dir = (cache_dir or os.path.join(data_dir, '.cache')) if use_cache else None
         self.movies = None
         self.ratings = None
         self.tags = None
@@ -19,17 +225,23 @@ class DataProcessor:
        
         print("Загрузка данных...")
 
-        self.movies = pd.read_csv(os.path.join(self.data_dir, 'movies.csv'))
-        self.ratings = pd.read_csv(os.path.join(self.data_dir, 'ratings.csv'))
-        self.tags = pd.read_csv(os.path.join(self.data_dir, 'tags.csv'))
-        self.genome_scores = pd.read_csv(os.path.join(self.data_dir, 'genome-scores.csv'))
-        self.genome_tags = pd.read_csv(os.path.join(self.data_dir, 'genome-tags.csv'))
-        self.links = pd.read_csv(os.path.join(self.data_dir, 'links.csv'))
+        self.movies = self.read_csv('movies.csv')
+        self.ratings = self.read_csv('ratings.csv')
+        self.tags = self.read_csv('tags.csv')
+        self.genome_scores = self.read_csv('genome-scores.csv')
+        self.genome_tags = self.read_csv('genome-tags.csv')
+        self.links = self.read_csv('links.csv')
 
         print("Данные успешно загружены!")
 
         return self
 
+    def read_csv(self, file_name):
+        return read_csv_cached(os.path.join(self.data_dir, file_name), cache_dir=self.cache_dir)
+
+    def iter_ratings_chunks(self, chunksize=1_000_000):
+        yield from iter_csv_chunks(os.path.join(self.data_dir, 'ratings.csv'), chunksize)
+
     def preprocess_data(self):
         
         print("Предобработка данных...")
@@ -62,13 +274,10 @@ class DataProcessor:
 
         print("Создание матрицы пользователь-фильм...")
 
-        user_item_matrix = self.ratings.pivot_table(
-            index='userId',
-            columns='movieId',
-            values='rating'
-        ).fillna(0)
+        user_item_matrix = UserItemMatrix.from_ratings(self.ratings)
 
-        print(f"Матрица пользователь-фильм создана: {user_item_matrix.shape}")
+        print(f"Матрица пользователь-фильм создана: {user_item_matrix.shape}, "
+              f"ненулевых элементов: {user_item_matrix.matrix.nnz}")
 
         return user_item_matrix
 
@@ -76,48 +285,71 @@ class DataProcessor:
 
         print("Создание профилей пользователей...")
 
-        all_genres = []
-        for genres_list in self.movies['genres_list']:
-            if isinstance(genres_list, list):
-                all_genres.extend(genres_list)
-        unique_genres = sorted(list(set(all_genres)))
+        unique_genres, genre_movie_ids, genre_matrix = build_genre_index(self.movies)
 
-        user_profiles = {}
+        if isinstance(user_item_matrix, pd.DataFrame):
+            user_item_matrix = UserItemMatrix(
+                sp.csr_matrix(user_item_matrix.values),
+                user_item_matrix.index,
+                user_item_matrix.columns
+            )
 
-        for user_id in user_item_matrix.index:
-            rated_movies = user_item_matrix.loc[user_id]
-            rated_movies = rated_movies[rated_movies > 0]
+        ratings_matrix = user_item_matrix.matrix
+        movie_rows = pd.Index(genre_movie_ids).get_indexer(user_item_matrix.movie_ids)
 
-            if len(rated_movies) == 0:
-                continue
+        # Фильмы, отсутствующие в movies, получают нулевую строку жанров
+        genre_matrix = sp.vstack([genre_matrix, sp.csr_matrix((1, len(unique_genres)))]).tocsr()
+        movie_rows = np.where(movie_rows >= 0, movie_rows, genre_matrix.shape[0] - 1)
 
-            genre_profile = {genre: 0 for genre in unique_genres}
+        genre_weights = np.asarray((ratings_matrix @ genre_matrix[movie_rows]).todense())
 
-            for movie_id, rating in rated_movies.items():
-                movie_data = self.movies[self.movies['movieId'] == movie_id]
-
-                if not movie_data.empty and isinstance(movie_data['genres_list'].iloc[0], list):
-                    movie_genres = movie_data['genres_list'].iloc[0]
+        return self.finalize_user_profiles(
+            user_item_matrix.user_ids,
+            unique_genres,
+            genre_weights,
+            user_item_matrix.mean_ratings(),
+            user_item_matrix.rated_counts(),
+            save_path=save_path
+        )
 
-                    for genre in movie_genres:
-                        if genre in genre_profile:
-                            genre_profile[genre] += rating
+    def create_user_profiles_streaming(self, chunksize=1_000_000, save_path=None):
+        """Профили пользователей по ratings.csv, прочитанному блоками: память ограничена размером блока"""
 
-            total_weight = sum(genre_profile.values())
-            if total_weight > 0:
-                for genre in genre_profile:
-                    genre_profile[genre] /= total_weight
+        print(f"Создание профилей пользователей в потоковом режиме (блоки по {chunksize} оценок)...")
 
-            user_profiles[user_id] = genre_profile
+        if self.movies is None:
+            self.movies = self.read_csv('movies.csv')
 
-        user_profiles_df = pd.DataFrame.from_dict(user_profiles, orient='index')
+        stats = StreamingRatingStats(self.movies)
+        for chunk in self.iter_ratings_chunks(chunksize):
+            stats.update(chunk)
 
-        user_mean_ratings = user_item_matrix.replace(0, np.nan).mean(axis=1).fillna(0)
-        user_profiles_df['mean_rating'] = user_mean_ratings
+        user_ids, genre_weights, mean_rating, rated_count = stats.user_arrays()
 
-        user_rated_count = (user_item_matrix > 0).sum(axis=1)
-        user_profiles_df['rated_count'] = user_rated_count
+        return self.finalize_user_profiles(
+            user_ids,
+            stats.genres,
+            genre_weights,
+            mean_rating,
+            rated_count,
+            save_path=save_path,
+            movie_stats=stats.movie_stats()
+        )
 
+    def finalize_user_profiles(self, user_ids, unique_genres, genre_weights, mean_rating, rated_count,
+                               save_path=None, movie_stats=None):
+        total_weight = genre_weights.sum(axis=1, keepdims=True)
+        genre_weights = np.divide(genre_weights, total_weight,
+                                  out=genre_weights, where=total_weight > 0)
+
+        has_ratings = rated_count > 0
+        user_profiles_df = pd.DataFrame(
+            genre_weights[has_ratings],
+            index=user_ids[has_ratings],
+            columns=unique_genres
+        )
+        user_profiles_df['mean_rating'] = mean_rating[has_ratings]
+        user_profiles_df['rated_count'] = rated_count[has_ratings]
         scaler = StandardScaler()
         scaled_features = scaler.fit_transform(user_profiles_df)
         user_profiles_df_scaled = pd.DataFrame(
@@ -128,44 +360,158 @@ class DataProcessor:
 
         print(f"Профили пользователей созданы: {user_profiles_df.shape}")
 
-        def create_user_profiles(self, user_item_matrix, save_path=None):
-
-            if save_path:
-                try:
-                    save_dir = os.path.dirname(save_path)
-                    if save_dir and not os.path.exists(save_dir):
-                        os.makedirs(save_dir, exist_ok=True)
-                        print(f"Создана директория: {save_dir}")
-
-                    profiles_data = {
-                        'raw': user_profiles_df,
-                        'scaled': user_profiles_df_scaled,
-                        'scaler': scaler
-                    }
-
-                    joblib.dump(profiles_data, save_path)
-
-                    if os.path.exists(save_path):
-                        print(f"Профили пользователей успешно сохранены в {save_path}")
-                        print(f"Размер файла: {os.path.getsize(save_path)} байт")
-                    else:
-                        print(f"Ошибка: файл {save_path} не был создан")
-                except Exception as e:
-                    print(f"Ошибка при сохранении профилей пользователей: {e}")
-                    import traceback
-                    print(traceback.format_exc())
-
-            return user_profiles_df, user_profiles_df_scaled, scaler
+        if save_path:
+            try:
+                save_dir = os.path.dirname(save_path)
+                if save_dir and not os.path.exists(save_dir):
+                    os.makedirs(save_dir, exist_ok=True)
+                    print(f"Создана директория: {save_dir}")
+
+                profiles_data = {
+                    'raw': user_profiles_df,
+                    'scaled': user_profiles_df_scaled,
+                    'scaler': scaler
+                }
+                if movie_stats is not None:
+                    # По статистикам фильмов потокового режима MovieRecommender строит рейтинг популярности
+                    profiles_data['movie_stats'] = movie_stats
+
+                joblib.dump(profiles_data, save_path)
+
+                if os.path.exists(save_path):
+                    print(f"Профили пользователей успешно сохранены в {save_path}")
+                    print(f"Размер файла: {os.path.getsize(save_path)} байт")
+                else:
+                    print(f"Ошибка: файл {save_path} не был создан")
+            except Exception as e:
+                print(f"Ошибка при сохранении профилей пользователей: {e}")
+                import traceback
+                print(traceback.format_exc())
+
+        return user_profiles_df, user_profiles_df_scaled, scaler
+
+
+class StreamingRatingStats:
+    """Накопление статистик по блокам оценок без хранения всей таблицы ratings.
+
+    Копит по пользователям суммы оценок по жанрам, сумму и число оценок, по фильмам - сумму и
+    число оценок для рейтинга популярности. Массивы индексируются самими userId/movieId (в
+    MovieLens они плотные) и растут по мере появления новых идентификаторов.
+
+    Оценки одного пользователя должны идти подряд, как в ratings.csv MovieLens (он отсортирован
+    по userId). Последний пользователь блока откладывается до следующего блока, поэтому повторные
+    оценки одного фильма усредняются, как в UserItemMatrix.from_ratings, даже на границе блоков.
+    """
+
+    def __init__(self, movies):
+        self.genres, genre_movie_ids, self.genre_matrix = build_genre_index(movies)
+        self.genre_movie_index = pd.Index(genre_movie_ids)
+
+        self.user_genre_sums = np.zeros((0, len(self.genres)))
+        self.user_rating_sums = np.zeros(0)
+        self.user_counts = np.zeros(0, dtype=np.int64)
+        self.movie_rating_sums = np.zeros(0)
+        self.movie_counts = np.zeros(0, dtype=np.int64)
+        self.n_ratings = 0
+        self._pending = None
+
+    @staticmethod
+    def _grow(array, size):
+        if len(array) >= size:
+            return array
+        new_size = max(size, 2 * len(array))
+        grown = np.zeros((new_size,) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def update(self, chunk):
+        if self._pending is not None:
+            chunk = pd.concat([self._pending, chunk], ignore_index=True)
+        if len(chunk) == 0:
+            return
+
+        user_ids = chunk['userId'].to_numpy()
+        other_users = np.flatnonzero(user_ids != user_ids[-1])
+        tail_start = other_users[-1] + 1 if len(other_users) else 0
+        self._pending = chunk.iloc[tail_start:]
+        self._accumulate(chunk.iloc[:tail_start])
+
+    def _flush(self):
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            self._accumulate(pending)
+
+    def _accumulate(self, chunk):
+        if len(chunk) == 0:
+            return
+        n_rows = len(chunk)
+        if chunk.duplicated(['userId', 'movieId']).any():
+            chunk = chunk.groupby(['userId', 'movieId'], as_index=False)['rating'].mean()
+
+        user_ids = chunk['userId'].to_numpy()
+        movie_ids = chunk['movieId'].to_numpy()
+        ratings = chunk['rating'].to_numpy(dtype=np.float64)
+
+        users, user_positions = np.unique(user_ids, return_inverse=True)
+        size = int(users[-1]) + 1
+        self.user_genre_sums = self._grow(self.user_genre_sums, size)
+        self.user_rating_sums = self._grow(self.user_rating_sums, size)
+        self.user_counts = self._grow(self.user_counts, size)
+        if self.user_counts[users].any():
+            raise ValueError("Оценки одного пользователя должны идти подряд: "
+                             "отсортируйте ratings.csv по userId")
+
+        self.user_rating_sums[users] += np.bincount(user_positions, weights=ratings, minlength=len(users))
+        self.user_counts[users] += np.bincount(user_positions, minlength=len(users))
+
+        movie_rows = self.genre_movie_index.get_indexer(movie_ids)
+        known = movie_rows >= 0
+        chunk_matrix = sp.csr_matrix(
+            (ratings[known], (user_positions[known], movie_rows[known])),
+            shape=(len(users), self.genre_matrix.shape[0])
+        )
+        self.user_genre_sums[users] += (chunk_matrix @ self.genre_matrix).toarray()
+
+        size = int(movie_ids.max()) + 1
+        self.movie_rating_sums = self._grow(self.movie_rating_sums, size)
+        self.movie_counts = self._grow(self.movie_counts, size)
+        self.movie_rating_sums += np.bincount(movie_ids, weights=ratings, minlength=len(self.movie_rating_sums))
+        self.movie_counts += np.bincount(movie_ids, minlength=len(self.movie_counts))
+
+        self.n_ratings += n_rows
+
+    def user_arrays(self):
+        self._flush()
+        user_ids = np.flatnonzero(self.user_counts)
+        counts = self.user_counts[user_ids]
+        mean_rating = self.user_rating_sums[user_ids] / counts
+        return user_ids, self.user_genre_sums[user_ids].copy(), mean_rating, counts
+
+    def movie_stats(self):
+        """Средняя оценка и число оценок по фильмам - вход MovieRecommender.refresh_popularity"""
+        self._flush()
+        movie_ids = np.flatnonzero(self.movie_counts)
+        counts = self.movie_counts[movie_ids]
+        return pd.DataFrame({
+            'movieId': movie_ids,
+            'mean_rating': self.movie_rating_sums[movie_ids] / counts,
+            'count': counts,
+        })
 
 
 if __name__ == "__main__":
     processor = DataProcessor()
-    processor.load_data()
-    movies, ratings, tags, genome_scores, genome_tags, links = processor.preprocess_data()
-    user_item_matrix = processor.create_user_item_matrix()
-    user_profiles, user_profiles_scaled, scaler = processor.create_user_profiles(
-        user_item_matrix,
-        save_path='models/user_profiles.pkl'
-    )
+    if '--streaming' in sys.argv:
+        user_profiles, user_profiles_scaled, scaler = processor.create_user_profiles_streaming(
+            save_path='models/user_profiles.pkl'
+        )
+    else:
+        processor.load_data()
+        movies, ratings, tags, genome_scores, genome_tags, links = processor.preprocess_data()
+        user_item_matrix = processor.create_user_item_matrix()
+        user_profiles, user_profiles_scaled, scaler = processor.create_user_profiles(
+            user_item_matrix,
+            save_path='models/user_profiles.pkl'
+        )
 
     print("Обработка данных завершена!")
\ No newline at end of file
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import numpy as np
+import joblib
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+
+try:
+    from src.data_processing import read_csv_cached, UserItemMatrix
+except ImportError:
+    from data_processing import read_csv_cached, UserItemMatrix
+
+# Матрицы оценок в процессах обучения: 'users' - пользователь x фильм, 'items' - фильм x пользователь
+_worker_matrices = {}
+
+
+def _init_als_worker(user_major, item_major, n_threads=1):
+    _worker_matrices['users'] = user_major
+    _worker_matrices['items'] = item_major
+    _worker_matrices['n_threads'] = n_threads
+
+
+def _with_bias_column(factors):
+    """float64-копия векторов с добавленным столбцом единиц: его коэффициент - смещение строки"""
+    return np.hstack([np.asarray(factors, dtype=np.float64), np.ones((len(factors), 1))])
+
+
+def _normal_equations(fixed, targets, regularization):
+    """Матрица и правая часть задачи ridge-регрессии для одной строки (ALS-WR: штраф растет с числом оценок)"""
+    gram = fixed.T @ fixed
+    gram[np.diag_indices_from(gram)] += regularization * max(len(targets), 1)
+    return gram, fixed.T @ targets
+
+
+def _solve_block(side, start, end, fixed, row_offsets, column_offsets, regularization):
+    """Решает нормальные уравнения для строк start:end матрицы side при фиксированных векторах другой стороны.
+
+    Целевые значения - оценки за вычетом смещений строки и столбца. Системы одной пачки
+    решаются одним вызовом np.linalg.solve.
+    """
+    matrix = _worker_matrices[side]
+    n_dims = fixed.shape[1]
+    grams = np.empty((end - start, n_dims, n_dims))
+    rhs = np.empty((end - start, n_dims))
+
+    with threadpool_limits(limits=_worker_matrices.get('n_threads', 1)):
+        for position, row in enumerate(range(start, end)):
+            begin, finish = matrix.indptr[row], matrix.indptr[row + 1]
+            columns = matrix.indices[begin:finish]
+            targets = matrix.data[begin:finish] - row_offsets[row] - column_offsets[columns]
+            grams[position], rhs[position] = _normal_equations(fixed[columns], targets, regularization)
+        return np.linalg.solve(grams, rhs[..., np.newaxis])[..., 0]
+
+
+def _row_blocks(indptr, n_blocks):
+    """Границы непрерывных блоков строк с примерно равным числом оценок"""
+    n_rows = len(indptr) - 1
+    targets = np.linspace(0, indptr[-1], n_blocks + 1)[1:-1]
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(indptr, targets), [n_rows]]))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class ALSFactorization:
+    """Матричная факторизация явных оценок методом чередующихся наименьших квадратов (ALS).
+
+    Оценка приближается как global_mean + item_bias + user_bias + user_factors . item_factors.
+    Смещения фильмов считаются один раз как сглаженные средние, остальное чередованием: при
+    фиксированных векторах фильмов векторы пользователей находятся независимыми малыми
+    регрессиями, и наоборот. Факторы хранятся в float32. Нового пользователя достаточно
+    "вложить" (fold_in) одной регрессией по его оценкам, не переобучая модель.
+    """
+
+    def __init__(self, n_factors=64, regularization=0.05, iterations=10, bias_damping=25, random_state=42):
+        self.n_factors = n_factors
+        self.regularization = regularization
+        self.iterations = iterations
+        self.bias_damping = bias_damping
+        self.random_state = random_state
+
+    def fit(self, rating_index, n_jobs=None, blocks_per_job=4):
+        user_major = rating_index.matrix.tocsr().astype(np.float64)
+        item_major = user_major.T.tocsr()
+        n_users, n_items = user_major.shape
+
+        self.user_ids = np.asarray(rating_index.user_ids)
+        self.movie_ids = np.asarray(rating_index.movie_ids)
+        self.global_mean = float(user_major.data.mean()) if user_major.nnz else 0.0
+        item_counts = np.diff(item_major.indptr)
+        item_sums = np.asarray(item_major.sum(axis=1)).ravel()
+        self.item_biases = ((item_sums - self.global_mean * item_counts)
+                            / (item_counts + self.bias_damping)).astype(np.float32)
+
+        rng = np.random.default_rng(self.random_state)
+        self.item_factors = (rng.standard_normal((n_items, self.n_factors)) * 0.1).astype(np.float32)
+        self.user_factors = np.zeros((n_users, self.n_factors), dtype=np.float32)
+        self.user_biases = np.zeros(n_users, dtype=np.float32)
+
+        n_jobs = max(1, n_jobs or os.cpu_count() or 1)
+        user_blocks = _row_blocks(user_major.indptr, n_jobs * blocks_per_job)
+        item_blocks = _row_blocks(item_major.indptr, n_jobs * blocks_per_job)
+        n_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+        print(f"Обучение ALS: {n_users} пользователей x {n_items} фильмов, {user_major.nnz} оценок, "
+              f"{self.n_factors} факторов, {n_jobs} процессов")
+
+        executor = None
+        if n_jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_als_worker,
+                                           initargs=(user_major, item_major, n_threads))
+        else:
+            _init_als_worker(user_major, item_major, n_threads)
+
+        def solve(side, blocks, *args):
+            if executor is None:
+                return np.vstack([_solve_block(side, start, end, *args) for start, end in blocks])
+            futures = [executor.submit(_solve_block, side, start, end, *args) for start, end in blocks]
+            return np.vstack([future.result() for future in futures])
+
+        try:
+            zero_users = np.zeros(n_users, dtype=np.float64)
+            for iteration in range(self.iterations):
+                start = time.perf_counter()
+                # Пользователи: вектор и смещение по оценкам за вычетом global_mean + item_bias
+                solution = solve('users', user_blocks, _with_bias_column(self.item_factors),
+                                 zero_users + self.global_mean, self.item_biases.astype(np.float64),
+                                 self.regularization)
+                self.user_factors = solution[:, :-1].astype(np.float32)
+                self.user_biases = solution[:, -1].astype(np.float32)
+
+                # Фильмы: векторы по оценкам за вычетом global_mean + item_bias + user_bias
+                self.item_factors = solve('items', item_blocks, self.user_factors.astype(np.float64),
+                                          self.item_biases.astype(np.float64) + self.global_mean,
+                                          self.user_biases.astype(np.float64),
+                                          self.regularization).astype(np.float32)
+                print(f"Итерация {iteration + 1}/{self.iterations}: {time.perf_counter() - start:.2f} с")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _worker_matrices.clear()
+
+        return self
+
+    def rows(self, movie_ids):
+        """Номера фильмов в модели, -1 для неизвестных"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self.movie_ids) == 0:
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self.movie_ids) - 1)
+        return np.where(self.movie_ids[rows] == movie_ids, rows, -1)
+
+    def fold_in(self, movie_ids, ratings):
+        """Вектор и смещение пользователя, не участвовавшего в обучении, по его оценкам"""
+        rows = self.rows(movie_ids)
+        known = rows >= 0
+        rows = rows[known]
+        targets = np.asarray(ratings, dtype=np.float64)[known] - self.global_mean - self.item_biases[rows]
+        gram, rhs = _normal_equations(_with_bias_column(self.item_factors[rows]), targets, self.regularization)
+        solution = np.linalg.solve(gram, rhs)
+        return solution[:-1].astype(np.float32), float(solution[-1]), rows
+
+    def predict(self, movie_ids, ratings):
+        """Предсказанные оценки всех фильмов модели и номера уже оцененных фильмов"""
+        user_factors, user_bias, rated_rows = self.fold_in(movie_ids, ratings)
+        predicted = self.item_factors @ user_factors
+        predicted += self.item_biases
+        predicted += self.global_mean + user_bias
+        return predicted, rated_rows
+
+    def arrays(self, prefix):
+        return {
+            f'{prefix}_user_ids': self.user_ids,
+            f'{prefix}_movie_ids': self.movie_ids,
+            f'{prefix}_user_factors': self.user_factors,
+            f'{prefix}_user_biases': self.user_biases,
+            f'{prefix}_item_factors': self.item_factors,
+            f'{prefix}_item_biases': self.item_biases,
+        }
+
+    def params(self):
+        return {
+            'n_factors': self.n_factors,
+            'regularization': self.regularization,
+            'iterations': self.iterations,
+            'bias_damping': self.bias_damping,
+            'random_state': self.random_state,
+            'global_mean': self.global_mean,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix, params):
+        if f'{prefix}_item_factors' not in arrays or not params:
+            return None
+        params = dict(params)
+        global_mean = params.pop('global_mean')
+        model = cls(**params)
+        model.global_mean = global_mean
+        for name in ['user_ids', 'movie_ids', 'user_factors', 'user_biases', 'item_factors', 'item_biases']:
+            setattr(model, name, arrays[f'{prefix}_{name}'])
+        return model
+
+
+def build_factorization_model(ratings, n_factors=64, regularization=0.05, iterations=10, n_jobs=None,
+                              save_model_path=None):
+    """Обучает ALS по таблице оценок или UserItemMatrix и при необходимости сохраняет модель"""
+    rating_index = ratings if isinstance(ratings, UserItemMatrix) else UserItemMatrix.from_ratings(ratings)
+    start = time.perf_counter()
+    model = ALSFactorization(n_factors=n_factors, regularization=regularization,
+                             iterations=iterations).fit(rating_index, n_jobs=n_jobs)
+    print(f"Модель ALS обучена за {time.perf_counter() - start:.1f} с")
+
+    if save_model_path:
+        joblib.dump({'factorization': model}, save_model_path)
+        print(f"Модель матричной факторизации сохранена в {save_model_path}")
+
+    return model
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    ratings = read_csv_cached(f'{data_dir}/ratings.csv', cache_dir=f'{data_dir}/.cache')
+    build_factorization_model(ratings, save_model_path='models/mf_model.pkl')
+    print("Обучение матричной факторизации завершено!")
@@ -0,0 +1,114 @@
+import copy
+import time
+import numpy as np
+import pandas as pd
+
+try:
+    from src.clustering import UserClustering
+    from src.neighbors import IVFNeighborIndex
+    from src.recommender import model_user_ids
+except ImportError:
+    from clustering import UserClustering
+    from neighbors import IVFNeighborIndex
+    from recommender import model_user_ids
+
+
+def updated_scaler(scaler, removed, added):
+    """Копия StandardScaler со средними и дисперсиями после удаления строк removed и добавления added.
+
+    Статистики пересчитываются через суммы и суммы квадратов признаков, без прохода по всем профилям.
+    """
+    n_seen = np.asarray(scaler.n_samples_seen_, dtype=np.float64)
+    sums = scaler.mean_ * n_seen + added.sum(axis=0) - removed.sum(axis=0)
+    squares = (scaler.var_ + scaler.mean_ ** 2) * n_seen + (added ** 2).sum(axis=0) - (removed ** 2).sum(axis=0)
+    n_samples = n_seen + len(added) - len(removed)
+
+    new_scaler = copy.deepcopy(scaler)
+    new_scaler.n_samples_seen_ = n_samples.astype(np.int64) if n_samples.ndim else int(n_samples)
+    new_scaler.mean_ = sums / n_samples
+    new_scaler.var_ = np.maximum(squares / n_samples - new_scaler.mean_ ** 2, 0.0)
+    scale = np.sqrt(new_scaler.var_)
+    # Как в sklearn: признаки без разброса не масштабируются
+    new_scaler.scale_ = np.where(scale < 10 * np.finfo(np.float64).eps, 1.0, scale)
+    return new_scaler
+
+
+def rescale(values, old_scaler, new_scaler):
+    """Точки в масштабе old_scaler (например, центры кластеров) в масштабе new_scaler"""
+    return (values * old_scaler.scale_ + old_scaler.mean_ - new_scaler.mean_) / new_scaler.scale_
+
+
+def apply_user_changes(recommender, user_ids, ratings):
+    """Обновляет модели recommender текущими оценками пользователей UserDatabase.
+
+    user_ids - пользователи базы, чьи оценки изменились, ratings - все их оценки (userId, movieId,
+    rating). Их строки в индексе оценок и профили заменяются, статистики StandardScaler
+    пересчитываются, и все профили вместе с центрами кластеров переводятся в новый масштаб (это
+    покоординатное аффинное преобразование, средние участников кластеров сохраняются). Измененные
+    пользователи распределяются по кластерам через UserClustering.partial_fit, списки кластеров
+    и индекс соседей перестраиваются без обучения KMeans. Списки соседей фильмов и ALS не меняются.
+    """
+    start = time.perf_counter()
+    changed_ids = model_user_ids(user_ids)
+    ratings = pd.DataFrame({
+        'userId': model_user_ids(ratings['userId'].to_numpy()),
+        'movieId': ratings['movieId'].to_numpy(dtype=np.int64),
+        'rating': ratings['rating'].to_numpy(dtype=np.float64),
+    })
+
+    recommender.rating_index = recommender.rating_index.replace_users(changed_ids, ratings)
+    recommender.ratings = None
+
+    # Профили: новые строки измененных пользователей, статистики масштабирования - по разнице
+    active_ids, positions = np.unique(ratings['userId'].to_numpy(), return_inverse=True)
+    new_raw = recommender.build_profiles_frame(len(active_ids), positions, ratings['movieId'].to_numpy(),
+                                               ratings['rating'].to_numpy())
+    new_raw.index = pd.Index(active_ids)
+    removed_ids = np.setdiff1d(changed_ids, active_ids)
+
+    old_raw = recommender.user_profiles
+    replaced = old_raw.index.isin(changed_ids)
+    old_scaler = recommender.scaler
+    recommender.scaler = updated_scaler(old_scaler, old_raw.to_numpy(dtype=np.float64)[replaced],
+                                        new_raw.to_numpy(dtype=np.float64))
+
+    user_profiles = pd.concat([old_raw[~replaced], new_raw])
+    profiles_scaled = pd.DataFrame(recommender.scale_profiles(user_profiles), index=user_profiles.index,
+                                   columns=user_profiles.columns)
+    new_scaled = profiles_scaled.iloc[len(user_profiles) - len(new_raw):]
+
+    if recommender.kmeans_model is not None and recommender.user_clusters is not None:
+        recommender.kmeans_model.cluster_centers_ = rescale(recommender.kmeans_model.cluster_centers_,
+                                                            old_scaler, recommender.scaler)
+        # Прежние профили в новом масштабе: partial_fit вычитает их из сумм кластеров
+        clustering = UserClustering(user_profiles_scaled=pd.DataFrame(
+            recommender.scale_profiles(old_raw), index=old_raw.index, columns=old_raw.columns))
+        clustering.kmeans_model = recommender.kmeans_model
+        clustering.n_clusters = recommender.n_clusters
+        clustering.user_clusters = recommender.user_clusters
+        clustering.partial_fit(new_scaled, removed_user_ids=removed_ids)
+        recommender.user_clusters = clustering.user_clusters
+
+        if recommender.cluster_recommendations is not None:
+            recommender.cluster_recommendations = clustering.build_cluster_recommendations(recommender.rating_index)
+
+    knn = recommender.knn_model
+    profiles = profiles_scaled.to_numpy(dtype=np.float64)
+    if isinstance(knn, IVFNeighborIndex):
+        # Списки остаются прежними: сохранившиеся строки остаются в своих, новые - в ближайших
+        centroids = rescale(knn.centroids_.astype(np.float64), old_scaler, recommender.scaler)
+        new_lists = IVFNeighborIndex._nearest_lists(new_scaled.to_numpy(dtype=np.float32),
+                                                    centroids.astype(np.float32), 1)[:, 0]
+        labels = np.concatenate([knn.list_labels()[~replaced], new_lists])
+        knn.fit(profiles, centroids=centroids, labels=labels)
+    elif knn is not None:
+        knn.fit(profiles)
+
+    recommender.user_profiles = user_profiles
+    recommender.user_profiles_scaled = profiles_scaled
+    recommender.build_neighbor_search(recommender.neighbor_search,
+                                      getattr(recommender.neighbor_index, 'n_clusters_probe', 1))
+    recommender.refresh_rating_caches()
+
+    print(f"Модели обновлены за {time.perf_counter() - start:.1f} с: профилей обновлено {len(active_ids)}, "
+          f"удалено {len(removed_ids)}, всего {len(user_profiles)}")
@@ -0,0 +1,212 @@
+import sys
+import numpy as np
+import joblib
+import scipy.sparse as sp
+
+try:
+    from src.data_processing import read_csv_cached, UserItemMatrix
+except ImportError:
+    from data_processing import read_csv_cached, UserItemMatrix
+
+
+class ItemNeighbors:
+    """Списки K ближайших фильмов для каждого фильма.
+
+    movie_ids - отсортированные movieId, neighbors - номера строк соседей в movie_ids
+    (int32, -1 - пустое место), similarities - косинусная близость (float16); обе матрицы размера
+    n_movies x K и упорядочены по убыванию близости.
+    """
+
+    def __init__(self, movie_ids, neighbors, similarities):
+        self.movie_ids = np.asarray(movie_ids)
+        self.neighbors = neighbors
+        self.similarities = similarities
+
+    def rows(self, movie_ids):
+        """Номера строк для movieId, -1 для фильмов без списка соседей"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self.movie_ids) == 0:
+            return np.full(len(movie_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.movie_ids, movie_ids), len(self.movie_ids) - 1)
+        return np.where(self.movie_ids[rows] == movie_ids, rows, -1)
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    def arrays(self, prefix):
+        return {
+            f'{prefix}_movie_ids': self.movie_ids,
+            f'{prefix}_neighbors': self.neighbors,
+            f'{prefix}_similarities': self.similarities,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        if f'{prefix}_movie_ids' not in arrays:
+            return None
+        return cls(arrays[f'{prefix}_movie_ids'], arrays[f'{prefix}_neighbors'], arrays[f'{prefix}_similarities'])
+
+    def similar(self, movie_id, n=10):
+        """Фильмы, похожие на movie_id: (movieId, близость)"""
+        row = self.rows([movie_id])[0]
+        if row < 0:
+            return self.movie_ids[:0], np.array([], dtype=np.float32)
+        neighbors = self.neighbors[row]
+        valid = neighbors >= 0
+        neighbors = neighbors[valid][:n]
+        return self.movie_ids[neighbors], self.similarities[row][valid][:n].astype(np.float32)
+
+    def score(self, movie_ids, ratings):
+        """Кандидаты для пользователя из списков соседей оцененных им фильмов.
+
+        Возвращает movieId кандидатов, сумму близость x оценка (по ней ранжируются) и
+        взвешенную близостью среднюю оценку. Стоимость зависит только от числа оценок и K.
+        """
+        rows = self.rows(movie_ids)
+        known = rows >= 0
+        rows, ratings = rows[known], np.asarray(ratings, dtype=np.float32)[known]
+
+        neighbors = np.asarray(self.neighbors[rows]).ravel()
+        similarities = np.asarray(self.similarities[rows], dtype=np.float32).ravel()
+        weights = similarities * np.repeat(ratings, self.k)
+
+        valid = (neighbors >= 0) & (similarities > 0) & ~np.isin(neighbors, rows)
+        candidates, positions = np.unique(neighbors[valid], return_inverse=True)
+        weight_sums = np.bincount(positions, weights=weights[valid], minlength=len(candidates))
+        similarity_sums = np.bincount(positions, weights=similarities[valid], minlength=len(candidates))
+
+        return self.movie_ids[candidates], weight_sums, weight_sums / similarity_sums
+
+
+def top_k_cosine(vectors, k=50, block_size=1024, min_support=None):
+    """K ближайших по косинусу строк для каждой строки vectors (плотной или разреженной).
+
+    Близости считаются блоками по block_size строк, так что в памяти одновременно только
+    block_size x n_rows значений, а не полная матрица n_rows x n_rows. Для разреженных vectors
+    min_support отбрасывает пары строк, у которых меньше min_support общих ненулевых столбцов.
+    """
+    n_rows = vectors.shape[0]
+    k = min(k, max(n_rows - 1, 0))
+    support, support_t = None, None
+
+    if sp.issparse(vectors):
+        vectors = vectors.tocsr().astype(np.float32)
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        normalized = sp.diags(inverse.astype(np.float32)) @ vectors
+        normalized_t = normalized.T.tocsr()
+        if min_support and min_support > 1:
+            support = vectors.copy()
+            support.data = np.ones_like(support.data)
+            support_t = support.T.tocsr()
+    else:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1)
+        normalized = vectors / np.where(norms > 0, norms, 1)[:, np.newaxis]
+        normalized_t = normalized.T
+
+    neighbors = np.full((n_rows, k), -1, dtype=np.int32)
+    similarities = np.zeros((n_rows, k), dtype=np.float16)
+    if k == 0:
+        return neighbors, similarities
+
+    for start in range(0, n_rows, block_size):
+        end = min(start + block_size, n_rows)
+        block = normalized[start:end] @ normalized_t
+        block = block.toarray() if sp.issparse(block) else np.asarray(block)
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+        if support is not None:
+            # Число общих столбцов (например, пользователей, оценивших оба фильма)
+            block[(support[start:end] @ support_t).toarray() < min_support] = -np.inf
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+
+        # Соседи без общего сигнала (нулевая близость) не сохраняются
+        empty = ~(top_similarities > 0)
+        top[empty] = -1
+        top_similarities[empty] = 0
+        neighbors[start:end] = top
+        similarities[start:end] = top_similarities.astype(np.float16)
+
+    return neighbors, similarities
+
+
+def genome_matrix(genome_scores):
+    """Матрица релевантности тегов фильм x тег (float32) из genome-scores"""
+    movie_ids, movie_rows = np.unique(genome_scores['movieId'].to_numpy(), return_inverse=True)
+    tag_ids, tag_columns = np.unique(genome_scores['tagId'].to_numpy(), return_inverse=True)
+    matrix = np.zeros((len(movie_ids), len(tag_ids)), dtype=np.float32)
+    matrix[movie_rows, tag_columns] = genome_scores['relevance'].to_numpy(dtype=np.float32)
+    return movie_ids, tag_ids, matrix
+
+
+def build_genome_neighbors(genome_scores, k=50, block_size=1024, save_model_path=None):
+    """Похожие фильмы по тегам Tag Genome"""
+    print("Построение матрицы релевантности тегов...")
+    movie_ids, tag_ids, matrix = genome_matrix(genome_scores)
+    print(f"Матрица тегов: {len(movie_ids)} фильмов x {len(tag_ids)} тегов")
+
+    neighbors, similarities = top_k_cosine(matrix, k=k, block_size=block_size)
+    item_neighbors = ItemNeighbors(movie_ids.astype(np.int32), neighbors, similarities)
+    print(f"Найдено по {item_neighbors.k} похожих фильмов для {len(movie_ids)} фильмов")
+
+    if save_model_path:
+        joblib.dump({'item_neighbors': item_neighbors, 'source': 'genome'}, save_model_path)
+        print(f"Списки похожих фильмов сохранены в {save_model_path}")
+
+    return item_neighbors
+
+
+def centered_item_vectors(rating_index):
+    """Векторы фильмов фильм x пользователь из оценок за вычетом средней оценки пользователя.
+
+    Косинус таких векторов - скорректированная косинусная близость: фильмы похожи, если одни и те
+    же пользователи оценивают их выше или ниже своего обычного уровня.
+    """
+    matrix = rating_index.matrix.tocsr().astype(np.float32)
+    user_means = rating_index.mean_ratings().astype(np.float32)
+    centered = matrix.copy()
+    # Оценки, равные средней, остаются явными нулями: они не влияют на близость, но учитываются в min_support
+    centered.data -= np.repeat(user_means, np.diff(matrix.indptr))
+    return centered.T.tocsr()
+
+
+def build_rating_neighbors(ratings, k=50, min_support=5, block_size=1024, save_model_path=None):
+    """Похожие фильмы по совместным оценкам пользователей (item-based CF).
+
+    ratings - таблица оценок или UserItemMatrix. Близости считаются разреженными произведениями
+    блоков матрицы фильм x пользователь; пары фильмов, которые вместе оценили меньше min_support
+    пользователей, не учитываются.
+    """
+    rating_index = ratings if isinstance(ratings, UserItemMatrix) else UserItemMatrix.from_ratings(ratings)
+    print(f"Матрица оценок: {rating_index.shape[1]} фильмов x {rating_index.shape[0]} пользователей, "
+          f"{rating_index.matrix.nnz} оценок")
+
+    item_vectors = centered_item_vectors(rating_index)
+    neighbors, similarities = top_k_cosine(item_vectors, k=k, block_size=block_size, min_support=min_support)
+    item_neighbors = ItemNeighbors(np.asarray(rating_index.movie_ids).astype(np.int32), neighbors, similarities)
+    print(f"Найдено в среднем {(neighbors >= 0).sum(axis=1).mean():.1f} соседей "
+          f"для {len(item_neighbors.movie_ids)} фильмов")
+
+    if save_model_path:
+        joblib.dump({'item_neighbors': item_neighbors, 'source': 'ratings',
+                     'min_support': min_support}, save_model_path)
+        print(f"Списки соседей фильмов по оценкам сохранены в {save_model_path}")
+
+    return item_neighbors
+
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    genome_scores = read_csv_cached(f'{data_dir}/genome-scores.csv', cache_dir=f'{data_dir}/.cache')
+    build_genome_neighbors(genome_scores, save_model_path='models/content_model.pkl')
+    del genome_scores
+
+    ratings = read_csv_cached(f'{data_dir}/ratings.csv', cache_dir=f'{data_dir}/.cache')
+    build_rating_neighbors(ratings, save_model_path='models/item_model.pkl')
+    print("Построение списков похожих фильмов завершено!")
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import joblib
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+LATEST_NAME = 'LATEST'
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def _next_version(bundle_dir):
+    versions = [int(name[1:]) for name in os.listdir(bundle_dir)
+                if name.startswith('v') and name[1:].isdigit()]
+    return max(versions, default=0) + 1
+
+
+def resolve_bundle_dir(bundle_dir):
+    """Каталог конкретной версии: сам bundle_dir или версия, указанная в LATEST"""
+    latest_path = os.path.join(bundle_dir, LATEST_NAME)
+    if os.path.exists(latest_path):
+        with open(latest_path) as f:
+            return os.path.join(bundle_dir, f.read().strip())
+    return bundle_dir
+
+
+def bundle_exists(bundle_dir):
+    return bool(bundle_dir) and os.path.exists(os.path.join(resolve_bundle_dir(bundle_dir), MANIFEST_NAME))
+
+
+def save_model_bundle(bundle_dir, arrays, objects=None, frames=None, metadata=None):
+    """Записывает новую версию пакета моделей и переключает на нее LATEST.
+
+    arrays  - словарь имя -> np.ndarray, сохраняются в .npy и загружаются через mmap
+    objects - небольшие объекты sklearn, сохраняются через joblib
+    frames  - небольшие таблицы (фильмы), сохраняются в Feather или pickle
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    version = _next_version(bundle_dir)
+    version_name = f"v{version:04d}"
+    tmp_dir = os.path.join(bundle_dir, f".{version_name}.tmp")
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'arrays': {},
+        'objects': {},
+        'frames': {},
+        'metadata': metadata or {},
+    }
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        file_name = f"{name}.npy"
+        np.save(os.path.join(tmp_dir, file_name), array, allow_pickle=False)
+        manifest['arrays'][name] = {'file': file_name, 'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    for name, obj in (objects or {}).items():
+        file_name = f"{name}.joblib"
+        joblib.dump(obj, os.path.join(tmp_dir, file_name))
+        manifest['objects'][name] = {'file': file_name}
+
+    for name, frame in (frames or {}).items():
+        if HAS_PYARROW:
+            file_name = f"{name}.feather"
+            frame.reset_index(drop=True).to_feather(os.path.join(tmp_dir, file_name))
+        else:
+            file_name = f"{name}.pkl"
+            frame.to_pickle(os.path.join(tmp_dir, file_name))
+        manifest['frames'][name] = {'file': file_name}
+
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    version_dir = os.path.join(bundle_dir, version_name)
+    os.rename(tmp_dir, version_dir)
+
+    latest_tmp = os.path.join(bundle_dir, f".{LATEST_NAME}.tmp")
+    with open(latest_tmp, 'w') as f:
+        f.write(version_name)
+    os.replace(latest_tmp, os.path.join(bundle_dir, LATEST_NAME))
+
+    print(f"Пакет моделей {version_name} сохранен в {bundle_dir}")
+    return version_dir
+
+
+def load_model_bundle(bundle_dir, mmap_mode='r'):
+    """Загружает пакет моделей; массивы отображаются в память и разделяются между процессами"""
+    version_dir = resolve_bundle_dir(bundle_dir)
+    with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата пакета моделей: {manifest.get('format_version')}")
+
+    arrays = {
+        name: np.load(os.path.join(version_dir, spec['file']), mmap_mode=mmap_mode, allow_pickle=False)
+        for name, spec in manifest['arrays'].items()
+    }
+    objects = {
+        name: joblib.load(os.path.join(version_dir, spec['file']))
+        for name, spec in manifest['objects'].items()
+    }
+    frames = {}
+    for name, spec in manifest['frames'].items():
+        path = os.path.join(version_dir, spec['file'])
+        frames[name] = pd.read_feather(path) if path.endswith('.feather') else pd.read_pickle(path)
+
+    return {
+        'manifest': manifest,
+        'path': version_dir,
+        'arrays': arrays,
+        'objects': objects,
+        'frames': frames,
+    }
+
+
+def compile_model_bundle(bundle_dir, movies_path, ratings_path, user_profiles_path,
+                         kmeans_model_path, knn_model_path, content_model_path=None,
+                         item_model_path=None, mf_model_path=None):
+    """Собирает пакет моделей из результатов офлайн-конвейера (CSV и pkl-файлов)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.dirname(current_dir))
+    from src.recommender import MovieRecommender
+
+    recommender = MovieRecommender(
+        movies_path=movies_path,
+        ratings_path=ratings_path,
+        user_profiles_path=user_profiles_path,
+        kmeans_model_path=kmeans_model_path,
+        knn_model_path=knn_model_path,
+        content_model_path=content_model_path,
+        item_model_path=item_model_path,
+        mf_model_path=mf_model_path
+    )
+    return recommender.save_bundle(bundle_dir)
+
+
+if __name__ == "__main__":
+    compile_model_bundle(
+        'models/bundle',
+        movies_path='data/movies.csv',
+        ratings_path='data/ratings.csv',
+        user_profiles_path='models/user_profiles.pkl',
+        kmeans_model_path='models/kmeans_model.pkl',
+        knn_model_path='models/knn_model.pkl',
+        content_model_path='models/content_model.pkl',
+        item_model_path='models/item_model.pkl',
+        mf_model_path='models/mf_model.pkl'
+    )
+    print("Пакет моделей собран!")
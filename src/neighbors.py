@@ -0,0 +1,142 @@
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+
+class IVFNeighborIndex:
+    """Приближенный поиск соседей по инвертированным спискам (IVF).
+
+    Профили разбиваются по центроидам (обычно уже обученного KMeans), точки каждого списка лежат
+    непрерывным блоком. Запрос просматривает только n_probe ближайших к нему списков: чем больше
+    n_probe, тем выше полнота и дольше поиск. Интерфейс kneighbors совпадает с NearestNeighbors,
+    индексы соседей - позиции строк в исходной матрице профилей.
+    """
+
+    def __init__(self, n_neighbors=5, n_probe=4, n_lists=None, random_state=42):
+        self.n_neighbors = n_neighbors
+        self.n_probe = n_probe
+        self.n_lists = n_lists
+        self.random_state = random_state
+
+    def fit(self, X, centroids=None, labels=None):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        if centroids is None:
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+            kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3)
+            labels = kmeans.fit_predict(X)
+            centroids = kmeans.cluster_centers_
+        centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        if labels is None:
+            labels = self._nearest_lists(X, centroids, 1)[:, 0]
+        labels = np.asarray(labels)
+
+        order = np.argsort(labels, kind='stable')
+        self.centroids_ = centroids
+        self.n_lists = len(centroids)
+        self.ids_ = order.astype(np.int32)
+        self.data_ = X[order]
+        self.sq_norms_ = np.einsum('ij,ij->i', self.data_, self.data_)
+        self.offsets_ = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=self.n_lists))])
+        self.n_samples_fit_ = len(X)
+        return self
+
+    @staticmethod
+    def _nearest_lists(X, centroids, n_probe):
+        distances = (
+            np.einsum('ij,ij->i', X, X)[:, np.newaxis]
+            - 2 * X @ centroids.T
+            + np.einsum('ij,ij->i', centroids, centroids)[np.newaxis, :]
+        )
+        n_probe = min(n_probe, len(centroids))
+        if n_probe < len(centroids):
+            nearest = np.argpartition(distances, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            nearest = np.tile(np.arange(len(centroids)), (len(X), 1))
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        return np.take_along_axis(nearest, order, axis=1)
+
+    def list_labels(self):
+        """Номер списка для каждой строки исходной матрицы профилей"""
+        labels = np.empty(self.n_samples_fit_, dtype=np.int64)
+        labels[self.ids_] = np.repeat(np.arange(self.n_lists), np.diff(self.offsets_))
+        return labels
+
+    def _search_lists(self, X, sq_query, rows, lists, best_sq, best_pos):
+        """Просматривает списки lists для запросов rows (пары row-list) и обновляет лучшие k точек.
+
+        Запросы группируются по спискам: расстояния до точек списка считаются одним умножением матриц
+        для всех запросов, которые его просматривают. Возвращает число просмотренных точек по запросам.
+        """
+        n_neighbors = best_sq.shape[1]
+        n_seen = np.zeros(len(X), dtype=np.int64)
+        if len(rows) == 0:
+            return n_seen
+        order = np.argsort(lists, kind='stable')
+        rows, lists = rows[order], lists[order]
+        boundaries = np.flatnonzero(np.diff(lists)) + 1
+
+        for group, list_id in zip(np.split(rows, boundaries), lists[np.r_[0, boundaries]]):
+            start, end = self.offsets_[list_id], self.offsets_[list_id + 1]
+            if start == end:
+                continue
+            sq_distances = (self.sq_norms_[np.newaxis, start:end]
+                            - 2 * X[group] @ self.data_[start:end].T
+                            + sq_query[group, np.newaxis])
+            merged_sq = np.concatenate([best_sq[group], sq_distances], axis=1)
+            merged_pos = np.concatenate(
+                [best_pos[group], np.broadcast_to(np.arange(start, end), sq_distances.shape)], axis=1)
+            nearest = np.argpartition(merged_sq, n_neighbors - 1, axis=1)[:, :n_neighbors]
+            best_sq[group] = np.take_along_axis(merged_sq, nearest, axis=1)
+            best_pos[group] = np.take_along_axis(merged_pos, nearest, axis=1)
+            n_seen[group] += end - start
+        return n_seen
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        n_neighbors = n_neighbors or self.n_neighbors
+        if n_neighbors > self.n_samples_fit_:
+            raise ValueError(f"Expected n_neighbors <= n_samples_fit, but n_samples_fit = {self.n_samples_fit_}, "
+                             f"n_neighbors = {n_neighbors}")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        probe_order = self._nearest_lists(X, self.centroids_, self.n_lists)
+        sq_query = np.einsum('ij,ij->i', X, X)
+
+        best_sq = np.full((len(X), n_neighbors), np.inf, dtype=np.float32)
+        best_pos = np.zeros((len(X), n_neighbors), dtype=np.int64)
+
+        n_probe = min(self.n_probe, self.n_lists)
+        n_seen = self._search_lists(X, sq_query, np.repeat(np.arange(len(X)), n_probe),
+                                    probe_order[:, :n_probe].ravel(), best_sq, best_pos)
+        # Если в ближайших списках меньше n_neighbors точек, запросы просматривают следующие списки
+        while n_probe < self.n_lists:
+            short = np.flatnonzero(n_seen < n_neighbors)
+            if len(short) == 0:
+                break
+            n_seen += self._search_lists(X, sq_query, short, probe_order[short, n_probe], best_sq, best_pos)
+            n_probe += 1
+
+        order = np.argsort(best_sq, axis=1)
+        indices = self.ids_[np.take_along_axis(best_pos, order, axis=1)].astype(np.int64)
+        if return_distance:
+            distances = np.sqrt(np.maximum(np.take_along_axis(best_sq, order, axis=1), 0)).astype(np.float64)
+            return distances, indices
+        return indices
+
+
+class ClusterNeighborIndex(IVFNeighborIndex):
+    """Поиск соседей только среди участников ближайших кластеров обученного KMeans.
+
+    Списки - это кластеры из user_clusters, центры - kmeans_model.cluster_centers_, так что запрос
+    относится к тому же кластеру, что вернул бы kmeans_model.predict. Участники каждого кластера
+    заранее уложены непрерывным блоком с квадратами норм, и стоимость запроса зависит от размера
+    кластера, а не от числа пользователей. n_clusters_probe > 1 повышает полноту.
+    """
+
+    def __init__(self, kmeans_model, n_neighbors=5, n_clusters_probe=1):
+        super().__init__(n_neighbors=n_neighbors, n_probe=n_clusters_probe)
+        self.kmeans_model = kmeans_model
+        self.n_clusters_probe = n_clusters_probe
+
+    def fit(self, X, labels):
+        super().fit(X, centroids=self.kmeans_model.cluster_centers_, labels=labels)
+        self.n_clusters_ = self.n_lists
+        return self
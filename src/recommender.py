@@ -1,10 +1,49 @@
 import os
+import threading
 import numpy as np
 import pandas as pd
 import joblib
-from sklearn.metrics.pairwise import cosine_similarity
+import scipy.sparse as sp
+from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 
+try:
+    from src.data_processing import build_genre_index, iter_csv_chunks, read_csv_cached, UserItemMatrix
+    from src.model_bundle import bundle_exists, load_model_bundle, resolve_bundle_dir, save_model_bundle
+    from src.neighbors import ClusterNeighborIndex
+    from src.result_cache import RecommendationCache, ratings_fingerprint
+    from src.search import MovieSearchIndex
+    from src.item_similarity import ItemNeighbors
+    from src.factorization import ALSFactorization
+except ImportError:
+    from data_processing import build_genre_index, iter_csv_chunks, read_csv_cached, UserItemMatrix
+    from model_bundle import bundle_exists, load_model_bundle, resolve_bundle_dir, save_model_bundle
+    from neighbors import ClusterNeighborIndex
+    from result_cache import RecommendationCache, ratings_fingerprint
+    from search import MovieSearchIndex
+    from item_similarity import ItemNeighbors
+    from factorization import ALSFactorization
+
+
+def top_n_indices(scores, n):
+    """Индексы n наибольших значений по убыванию без полной сортировки; при равенстве - по возрастанию индекса"""
+    if n <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if n < len(scores):
+        # argpartition выбирает из равных на границе произвольные; берем первые по индексу
+        threshold = scores[np.argpartition(-scores, n - 1)[n - 1]]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[:n - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def model_user_ids(user_ids):
+    """userId пользователей UserDatabase в моделях: -id, чтобы не совпасть с userId MovieLens"""
+    return -np.asarray(user_ids, dtype=np.int64)
+
 
 class MovieRecommender:
     def __init__(self,
@@ -14,15 +53,48 @@ class MovieRecommender:
              ratings_path='data/ratings.csv',
              user_profiles_path='models/user_profiles.pkl',
              kmeans_model_path='models/kmeans_model.pkl',
-             knn_model_path='models/knn_model.pkl'):
+             knn_model_path='models/knn_model.pkl',
+             content_model_path='models/content_model.pkl',
+             item_model_path='models/item_model.pkl',
+             mf_model_path='models/mf_model.pkl',
+             bundle_path=None,
+             csv_cache_dir=None,
+             ratings_chunksize=None,
+             neighbor_search='knn',
+             n_clusters_probe=1,
+             recommendation_method='users',
+             result_cache_size=0,
+             result_cache_ttl=300):
         
         self.data_processor = data_processor
         self.clustering = clustering
         self.scaler = None
         self.knn_model = None
-
-        print(f"Загрузка файла фильмов из: {movies_path}")
-        print(f"Файл существует: {os.path.exists(movies_path)}")
+        self.user_profiles = None
+        self.user_profiles_scaled = None
+        self.kmeans_model = None
+        self.n_clusters = None
+        self.user_clusters = None
+        self.n_neighbors = None
+        self.model_version = None
+        self.bundle_path = bundle_path
+        self.bundle_version_dir = None
+        self.user_db_checkpoint = None
+        self.cluster_recommendations = None
+        self.content_neighbors = None
+        self.item_neighbors = None
+        self.factorization = None
+        self.factorization_catalog = None
+        self.recommendation_method = recommendation_method
+        self.search_index = None
+        self._search_index_lock = threading.Lock()
+        self.result_cache = RecommendationCache(result_cache_size, result_cache_ttl) if result_cache_size else None
+
+        if bundle_exists(bundle_path):
+            print(f"Инициализация MovieRecommender из пакета моделей: {bundle_path}")
+            self.load_bundle(bundle_path)
+            self.build_neighbor_search(neighbor_search, n_clusters_probe)
+            return
 
         print(f"Инициализация MovieRecommender с файлами:")
         print(f"- movies_path: {movies_path}")
@@ -32,184 +104,739 @@ class MovieRecommender:
         print(f"- knn_model_path: {knn_model_path}")
 
         try:
-            self.movies = pd.read_csv(movies_path)
+            self.movies = read_csv_cached(movies_path, cache_dir=csv_cache_dir)
             print(f"Загружено {len(self.movies)} фильмов")
         except Exception as e:
             print(f"Ошибка при загрузке файла фильмов: {e}")
             raise
 
+        self.build_movie_index()
+
         try:
-            self.ratings = pd.read_csv(ratings_path)
-            print(f"Загружено {len(self.ratings)} рейтингов")
+            if ratings_chunksize:
+                # Потоковый режим: оценки сразу собираются в CSR, общая таблица ratings не создается
+                self.ratings = None
+                self.rating_index = UserItemMatrix.from_chunks(iter_csv_chunks(ratings_path, ratings_chunksize))
+                print(f"Загружено {self.rating_index.matrix.nnz} рейтингов блоками по {ratings_chunksize}")
+            else:
+                self.ratings = read_csv_cached(ratings_path, cache_dir=csv_cache_dir)
+                print(f"Загружено {len(self.ratings)} рейтингов")
+                self.build_rating_index()
         except Exception as e:
             print(f"Ошибка при загрузке файла рейтингов: {e}")
             raise
 
-        if self.data_processor is None and os.path.exists(user_profiles_path):
-            try:
-                profiles_data = joblib.load(user_profiles_path)
-                self.user_profiles_raw = profiles_data.get('raw')
-                self.user_profiles_scaled = profiles_data.get('scaled')
-                self.scaler = profiles_data.get('scaler')
-                print(f"Профили пользователей успешно загружены из {user_profiles_path}")
-            except Exception as e:
-                print(f"Ошибка при загрузке профилей пользователей: {e}")
-
+        movie_stats = None
         if user_profiles_path and os.path.exists(user_profiles_path):
             try:
                 profiles_data = joblib.load(user_profiles_path)
                 self.user_profiles = profiles_data.get('raw')
                 self.user_profiles_scaled = profiles_data.get('scaled')
                 self.scaler = profiles_data.get('scaler')
+                movie_stats = profiles_data.get('movie_stats')
                 print(f"Загружены профили {len(self.user_profiles)} пользователей")
             except Exception as e:
                 print(f"Ошибка при загрузке профилей пользователей: {e}")
 
-        if self.clustering is None and os.path.exists(kmeans_model_path):
-            try:
-                clustering_data = joblib.load(kmeans_model_path)
-                self.kmeans_model = clustering_data.get('kmeans_model')
-                self.n_clusters = clustering_data.get('n_clusters')
-                self.user_clusters = clustering_data.get('user_clusters')
-                print(f"Модель кластеризации успешно загружена из {kmeans_model_path}")
-            except Exception as e:
-                print(f"Ошибка при загрузке модели кластеризации: {e}")
+        self.refresh_popularity(movie_stats=movie_stats)
 
         if kmeans_model_path and os.path.exists(kmeans_model_path):
             try:
                 clustering_data = joblib.load(kmeans_model_path)
                 self.kmeans_model = clustering_data.get('kmeans_model')
+                self.n_clusters = clustering_data.get('n_clusters')
                 self.user_clusters = clustering_data.get('user_clusters')
+                self.cluster_recommendations = clustering_data.get('cluster_recommendations')
                 print(f"Загружена модель кластеризации с {self.kmeans_model.n_clusters} кластерами")
             except Exception as e:
                 print(f"Ошибка при загрузке модели кластеризации: {e}")
 
-        if self.clustering is None and os.path.exists(knn_model_path):
+        if knn_model_path and os.path.exists(knn_model_path):
             try:
                 knn_data = joblib.load(knn_model_path)
                 self.knn_model = knn_data.get('knn_model')
                 self.n_neighbors = knn_data.get('n_neighbors')
-                print(f"Модель KNN успешно загружена из {knn_model_path}")
+                print("Загружена модель KNN")
             except Exception as e:
                 print(f"Ошибка при загрузке модели KNN: {e}")
 
-        if knn_model_path and os.path.exists(knn_model_path):
+        if content_model_path and os.path.exists(content_model_path):
             try:
-                knn_data = joblib.load(knn_model_path)
-                self.knn_model = knn_data.get('knn_model')
-                print("Загружена модель KNN")
+                self.content_neighbors = joblib.load(content_model_path).get('item_neighbors')
+                print(f"Загружены списки похожих фильмов для {len(self.content_neighbors.movie_ids)} фильмов")
             except Exception as e:
-                print(f"Ошибка при загрузке модели KNN: {e}")
-
-    def create_user_profile(self, user_ratings):
-       
-        print(f"Создание профиля пользователя на основе {len(user_ratings)} оценок")
+                print(f"Ошибка при загрузке списков похожих фильмов: {e}")
 
-        all_genres = []
-        for genres_list in self.movies['genres'].str.split('|'):
-            if isinstance(genres_list, list):
-                all_genres.extend(genres_list)
-        unique_genres = sorted(list(set(all_genres)))
+        if item_model_path and os.path.exists(item_model_path):
+            try:
+                self.item_neighbors = joblib.load(item_model_path).get('item_neighbors')
+                print(f"Загружены списки соседей по оценкам для {len(self.item_neighbors.movie_ids)} фильмов")
+            except Exception as e:
+                print(f"Ошибка при загрузке списков соседей по оценкам: {e}")
 
-        genre_profile = {genre: 0 for genre in unique_genres}
-        genre_counts = {genre: 0 for genre in unique_genres}
+        if mf_model_path and os.path.exists(mf_model_path):
+            try:
+                self.factorization = joblib.load(mf_model_path).get('factorization')
+                print(f"Загружена модель матричной факторизации: {len(self.factorization.movie_ids)} фильмов, "
+                      f"{self.factorization.n_factors} факторов")
+            except Exception as e:
+                print(f"Ошибка при загрузке модели матричной факторизации: {e}")
+
+        self.build_neighbor_search(neighbor_search, n_clusters_probe)
+
+    def build_neighbor_search(self, neighbor_search='knn', n_clusters_probe=1):
+        """Выбор способа поиска соседей: общий индекс KNN или поиск внутри ближайших кластеров KMeans"""
+        self.neighbor_search = neighbor_search
+        self.neighbor_index = self.knn_model
+
+        if neighbor_search == 'cluster':
+            if self.kmeans_model is None or self.user_clusters is None or self.user_profiles_scaled is None:
+                print("Модель кластеризации не загружена, используется общий индекс KNN")
+                return
+            labels = self.user_clusters['cluster'].reindex(self.user_profiles_scaled.index).to_numpy()
+            self.neighbor_index = ClusterNeighborIndex(
+                self.kmeans_model,
+                n_neighbors=self.n_neighbors or 5,
+                n_clusters_probe=n_clusters_probe
+            ).fit(self.user_profiles_scaled.to_numpy(), labels)
+            print(f"Построены индексы соседей для {self.neighbor_index.n_clusters_} кластеров")
+        elif neighbor_search != 'knn':
+            raise ValueError("neighbor_search должен быть 'knn' или 'cluster'")
+
+    @property
+    def user_profiles_raw(self):
+        return self.user_profiles
+
+    def save_bundle(self, bundle_dir):
+        """Сохраняет профили, кластеры, индекс соседей, фильмы и оценки в пакет моделей"""
+        matrix = self.rating_index.matrix
+        arrays = {
+            'profile_user_ids': self.user_profiles_scaled.index.to_numpy(),
+            'profiles_raw': self.user_profiles.to_numpy(dtype=np.float64),
+            'profiles_scaled': self.user_profiles_scaled.to_numpy(dtype=np.float64),
+            'ratings_indptr': matrix.indptr,
+            'ratings_indices': matrix.indices,
+            'ratings_data': matrix.data,
+            'ratings_user_ids': self.rating_index.user_ids,
+            'ratings_movie_ids': self.rating_index.movie_ids,
+            'movie_genre_matrix': self.movie_genre_matrix,
+            'movie_genre_masks': self.movie_genre_masks,
+            'popular_movie_ids': self.popular_movies['movieId'].to_numpy(),
+            'popular_scores': self.popular_movies['score'].to_numpy(),
+        }
+        if self.user_clusters is not None:
+            arrays['cluster_labels'] = self.user_clusters['cluster'].reindex(self.user_profiles_scaled.index).to_numpy()
+        if self.cluster_recommendations is not None:
+            for name, array in self.cluster_recommendations.items():
+                arrays[f'cluster_top_{name}'] = array
+        if self.content_neighbors is not None:
+            arrays.update(self.content_neighbors.arrays('content'))
+        if self.item_neighbors is not None:
+            arrays.update(self.item_neighbors.arrays('items'))
+        if self.factorization is not None:
+            arrays.update(self.factorization.arrays('mf'))
+
+        objects = {'scaler': self.scaler}
+        if self.knn_model is not None and not isinstance(self.knn_model, NearestNeighbors):
+            objects['knn_model'] = self.knn_model
+        if self.kmeans_model is not None:
+            objects['kmeans_model'] = self.kmeans_model
+
+        metadata = {
+            'profile_columns': list(self.user_profiles_scaled.columns),
+            'genres': list(self.genres),
+            'n_clusters': self.n_clusters,
+            'n_neighbors': self.n_neighbors,
+        }
+        if self.factorization is not None:
+            metadata['mf_params'] = self.factorization.params()
+        if self.user_db_checkpoint is not None:
+            metadata['user_db_checkpoint'] = self.user_db_checkpoint
+        if isinstance(self.knn_model, NearestNeighbors):
+            metadata['knn_params'] = {
+                'n_neighbors': self.knn_model.n_neighbors,
+                'algorithm': self.knn_model.algorithm,
+                'metric': self.knn_model.metric,
+            }
+
+        return save_model_bundle(bundle_dir, arrays, objects=objects,
+                                 frames={'movies': self.movies}, metadata=metadata)
+
+    def load_bundle(self, bundle_path):
+        bundle = load_model_bundle(bundle_path)
+        arrays = bundle['arrays']
+        metadata = bundle['manifest']['metadata']
+        self.model_version = bundle['manifest']['model_version']
+        self.bundle_version_dir = bundle['path']
+        # Номер изменения в UserDatabase, до которого оценки учтены (retrain_incremental.py)
+        self.user_db_checkpoint = metadata.get('user_db_checkpoint')
+
+        self.movies = bundle['frames']['movies']
+        self.genres = metadata['genres']
+        self.movie_index = pd.Index(self.movies['movieId'].to_numpy())
+        self.movie_genre_matrix = arrays['movie_genre_matrix']
+        self.movie_genre_masks = arrays['movie_genre_masks']
+
+        # Оценки хранятся только в CSR-индексе; таблица ratings не восстанавливается
+        self.ratings = None
+        self.rating_index = UserItemMatrix(
+            sp.csr_matrix((arrays['ratings_data'], arrays['ratings_indices'], arrays['ratings_indptr']),
+                          shape=(len(arrays['ratings_user_ids']), len(arrays['ratings_movie_ids'])),
+                          copy=False),
+            arrays['ratings_user_ids'],
+            arrays['ratings_movie_ids']
+        )
+        self.popular_movies = self.movies_frame(arrays['popular_movie_ids'], arrays['popular_scores'])
+
+        user_ids = pd.Index(arrays['profile_user_ids'])
+        columns = metadata['profile_columns']
+        self.user_profiles = pd.DataFrame(arrays['profiles_raw'], index=user_ids, columns=columns, copy=False)
+        self.user_profiles_scaled = pd.DataFrame(arrays['profiles_scaled'], index=user_ids,
+                                                 columns=columns, copy=False)
+        self.scaler = bundle['objects']['scaler']
+
+        self.kmeans_model = bundle['objects'].get('kmeans_model')
+        self.n_clusters = metadata.get('n_clusters')
+        if 'cluster_labels' in arrays:
+            self.user_clusters = pd.DataFrame({'cluster': arrays['cluster_labels']}, index=user_ids)
+        if 'cluster_top_offsets' in arrays:
+            self.cluster_recommendations = {
+                name[len('cluster_top_'):]: array for name, array in arrays.items() if name.startswith('cluster_top_')
+            }
+
+        self.content_neighbors = ItemNeighbors.from_arrays(arrays, 'content')
+        self.item_neighbors = ItemNeighbors.from_arrays(arrays, 'items')
+        self.factorization = ALSFactorization.from_arrays(arrays, 'mf', metadata.get('mf_params'))
+
+        self.n_neighbors = metadata.get('n_neighbors')
+        knn_params = metadata.get('knn_params')
+        if 'knn_model' in bundle['objects']:
+            self.knn_model = bundle['objects']['knn_model']
+        elif knn_params:
+            # Индекс соседей строится поверх отображенного в память массива профилей
+            self.knn_model = NearestNeighbors(**knn_params)
+            self.knn_model.fit(arrays['profiles_scaled'])
+
+        print(f"Загружен пакет моделей версии {self.model_version}: {len(self.movies)} фильмов, "
+              f"{len(self.user_profiles)} профилей, {self.rating_index.matrix.nnz} оценок")
+
+    def build_movie_index(self):
+        """Словарь жанров и индекс movieId -> строка / битовая маска жанров"""
+        self.movies = self.movies.drop_duplicates('movieId').reset_index(drop=True)
+        self.genres, movie_ids, genre_matrix = build_genre_index(self.movies)
+        self.movie_index = pd.Index(movie_ids)
+        self.movie_genre_matrix = genre_matrix.toarray().astype(np.float32)
+
+        genre_bits = np.left_shift(np.int64(1), np.arange(len(self.genres), dtype=np.int64))
+        self.movie_genre_masks = (self.movie_genre_matrix > 0).astype(np.int64) @ genre_bits
+
+        print(f"Построен индекс жанров: {len(self.genres)} жанров, {len(self.movie_index)} фильмов")
+
+    def movie_genre_pairs(self):
+        """Пары (movieId, жанр) каталога для статистики профилей в UserDatabase.sync_movie_genres"""
+        rows, columns = np.nonzero(self.movie_genre_matrix)
+        return list(zip(self.movie_index.to_numpy()[rows].tolist(),
+                        np.asarray(self.genres, dtype=object)[columns].tolist()))
+
+    def build_rating_index(self):
+        """Оценки обучающих пользователей в виде CSR: оценки каждого пользователя лежат непрерывным срезом"""
+        self.rating_index = UserItemMatrix.from_ratings(self.ratings)
+        print(f"Построен индекс оценок: {self.rating_index.shape[0]} пользователей, "
+              f"{self.rating_index.shape[1]} фильмов")
+
+    def search_movies(self, query='', genre=None, limit=100):
+        """Поиск по подстроке названия и жанру; индекс строится при первом запросе"""
+        if self.search_index is None:
+            with self._search_index_lock:
+                if self.search_index is None:
+                    self.search_index = MovieSearchIndex(self.movies['title'], self.movie_genre_masks, self.genres)
+                    print(f"Построен поисковый индекс: {len(self.search_index.contains)} вхождений n-грамм")
+        rows = self.search_index.search(query, genre, limit)
+        return self.movies.iloc[rows][['movieId', 'title', 'genres']]
+
+    def movies_frame(self, movie_ids, scores):
+        rows = self.movie_index.get_indexer(movie_ids)
+        recommendations = self.movies.iloc[rows][['movieId', 'title', 'genres']].reset_index(drop=True)
+        recommendations['score'] = scores
+        return recommendations
 
-        user_profile = {genre: 0 for genre in all_genres}
-        genre_counts = {genre: 0 for genre in all_genres}
+    def precomputed_frame(self, precomputed, n_recommendations=10):
+        """Таблица рекомендаций из готового списка (movie_id, score); фильмы не из каталога пропускаются"""
+        movie_ids = np.array([movie_id for movie_id, _ in precomputed], dtype=np.int64)
+        scores = np.array([score for _, score in precomputed], dtype=np.float64)
+        known = self.movie_index.get_indexer(movie_ids) >= 0
+        return self.movies_frame(movie_ids[known][:n_recommendations], scores[known][:n_recommendations])
 
+    def parse_user_ratings(self, user_ratings):
+        movie_ids = []
+        ratings = []
         for movie_id, rating in user_ratings.items():
             try:
-                movie_id = int(float(movie_id))
-                rating = float(rating)
+                movie_ids.append(int(float(movie_id)))
+                ratings.append(float(rating))
+            except (ValueError, TypeError) as e:
+                print(f"Ошибка при обработке фильма {movie_id}: {e}")
+        return np.array(movie_ids, dtype=np.int64), np.array(ratings, dtype=np.float64)
+
+    def profile_columns(self):
+        if getattr(self, 'user_profiles_scaled', None) is not None:
+            return list(self.user_profiles_scaled.columns)
+        return self.genres + ['mean_rating', 'rated_count']
+
+    def scale_profiles(self, profiles_df):
+        if self.scaler is None:
+            scaler = StandardScaler()
+            scaled = scaler.fit_transform(profiles_df)
+            self.scaler = scaler
+            return scaled
 
-                movie_data = self.movies[self.movies['movieId'] == movie_id]
+        # То же, что scaler.transform, но без проверок sklearn на каждый запрос
+        values = profiles_df.to_numpy(dtype=np.float64)
+        if self.scaler.with_mean:
+            values = values - self.scaler.mean_
+        if self.scaler.with_std:
+            values = values / self.scaler.scale_
+        return values
 
-                if not movie_data.empty:
-                    movie_genres = movie_data['genres'].iloc[0].split('|')
+    def create_user_profile(self, user_ratings):
 
-                    for genre in movie_genres:
-                        if genre in genre_profile:
-                            genre_profile[genre] += rating
-                            genre_counts[genre] += 1
-            except (ValueError, KeyError) as e:
-                print(f"Ошибка при обработке фильма {movie_id}: {e}")
-                continue
+        print(f"Создание профиля пользователя на основе {len(user_ratings)} оценок")
 
-        for genre in genre_profile:
-            if genre_counts[genre] > 0:
-                genre_profile[genre] /= genre_counts[genre]
+        movie_ids, ratings = self.parse_user_ratings(user_ratings)
 
-        user_profile_df = pd.DataFrame([user_profile])
+        rows = self.movie_index.get_indexer(movie_ids)
+        known = rows >= 0
+        genre_weights = ratings[known] @ self.movie_genre_matrix[rows[known]]
 
-        if self.scaler is not None:
-            user_profile_scaled = self.scaler.transform(user_profile_df)
-        else:
-            scaler = StandardScaler()
-            user_profile_scaled = scaler.fit_transform(user_profile_df)
-            self.scaler = scaler
+        return self.profile_from_sums(genre_weights, ratings.sum(), len(ratings))
 
-        return user_profile_df, user_profile_scaled
+    def create_user_profile_from_stats(self, profile):
+        """Профиль по готовой статистике (StoredUserProfile из UserDatabase), без чтения оценок"""
+        genre_weights = np.array([profile.genre_sums.get(genre, 0.0) for genre in self.genres], dtype=np.float64)
+        return self.profile_from_sums(genre_weights, profile.rating_sum, profile.rating_count)
 
-    def get_recommendations_by_similar_users(self, user_id, user_ratings, n_recommendations=10):
+    def profile_from_sums(self, genre_weights, rating_sum, rated_count):
+        """Признаки профиля из сумм оценок по жанрам, суммы и числа оценок"""
+        total_weight = genre_weights.sum()
+        if total_weight > 0:
+            genre_weights = genre_weights / total_weight
 
-        print(f"Получение рекомендаций для пользователя {user_id} на основе {len(user_ratings)} оценок")
+        features = dict(zip(self.genres, genre_weights))
+        features['mean_rating'] = rating_sum / rated_count if rated_count else 0.0
+        features['rated_count'] = rated_count
 
-        user_profile, user_profile_scaled = self.create_user_profile(user_ratings)
+        columns = self.profile_columns()
+        profile = np.array([[features.get(column, 0.0) for column in columns]])
+        user_profile_df = pd.DataFrame(profile, columns=columns)
 
-        if self.knn_model is None:
+        user_profile_scaled = self.scale_profiles(user_profile_df)
+
+        return user_profile_df, user_profile_scaled
+
+    def parse_users_ratings(self, users_ratings):
+        """Оценки многих пользователей в плоских массивах: номер пользователя в пачке, movieId, оценка"""
+        items = users_ratings.items() if isinstance(users_ratings, dict) else users_ratings
+
+        user_ids, positions, movie_ids, ratings = [], [], [], []
+        for user_id, user_ratings in items:
+            user_movie_ids, user_ratings_values = self.parse_user_ratings(user_ratings or {})
+            positions.append(np.full(len(user_movie_ids), len(user_ids), dtype=np.int64))
+            movie_ids.append(user_movie_ids)
+            ratings.append(user_ratings_values)
+            user_ids.append(user_id)
+
+        if not user_ids:
+            return user_ids, np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([])
+        return user_ids, np.concatenate(positions), np.concatenate(movie_ids), np.concatenate(ratings)
+
+    def create_user_profiles_batch(self, users_ratings):
+        """Профили сразу многих пользователей: одна разреженная матрица оценок и одно масштабирование.
+
+        users_ratings - словарь user_id -> {movieId: оценка} или последовательность таких пар.
+        Признаки совпадают с create_user_profile для каждого пользователя.
+        """
+        user_ids, positions, movie_ids, ratings = self.parse_users_ratings(users_ratings)
+        profiles_df = self.build_profiles_frame(len(user_ids), positions, movie_ids, ratings)
+        return user_ids, profiles_df, self.scale_profiles(profiles_df)
+
+    def build_profiles_frame(self, n_users, positions, movie_ids, ratings):
+        rows = self.movie_index.get_indexer(movie_ids)
+        known = rows >= 0
+        query_matrix = sp.csr_matrix((ratings[known], (positions[known], rows[known])),
+                                     shape=(n_users, len(self.movie_index)))
+        genre_weights = np.asarray(query_matrix @ self.movie_genre_matrix, dtype=np.float64)
+
+        totals = genre_weights.sum(axis=1, keepdims=True)
+        genre_weights = np.divide(genre_weights, totals, out=genre_weights, where=totals > 0)
+
+        rated_counts = np.bincount(positions, minlength=n_users)
+        rating_sums = np.bincount(positions, weights=ratings, minlength=n_users)
+
+        features = pd.DataFrame(genre_weights, columns=self.genres)
+        features['mean_rating'] = np.divide(rating_sums, rated_counts, out=np.zeros(n_users),
+                                            where=rated_counts > 0)
+        features['rated_count'] = rated_counts
+        return features.reindex(columns=self.profile_columns(), fill_value=0.0)
+
+    def get_recommendations_batch(self, users_ratings, n_recommendations=10):
+        """Рекомендации для многих пользователей за один проход.
+
+        Один вызов kneighbors на всю пачку, оценки соседей агрегируются произведениями разреженных
+        матриц. Результат - одна длинная таблица userId, rank, movieId, title, genres, score;
+        пользователи без оценок получают популярные фильмы.
+        """
+        user_ids, positions, movie_ids, ratings = self.parse_users_ratings(users_ratings)
+        n_users = len(user_ids)
+        print(f"Пакетные рекомендации для {n_users} пользователей")
+
+        profiles_df = self.build_profiles_frame(n_users, positions, movie_ids, ratings)
+        active = np.flatnonzero(np.bincount(positions, minlength=n_users) > 0)
+        if self.neighbor_index is None:
+            print("Модель KNN не загружена, для всех пользователей используются популярные фильмы")
+            active = active[:0]
+
+        result_positions, result_movies, result_scores = [], [], []
+
+        if len(active):
+            profiles_scaled = self.scale_profiles(profiles_df.iloc[active])
+            similar_users = self.find_similar_users(profiles_scaled, [user_ids[position] for position in active])
+
+            # Соседи и уже оцененные фильмы как разреженные матрицы: строка - пользователь пачки
+            active_rows = np.full(n_users, -1, dtype=np.int64)
+            active_rows[active] = np.arange(len(active))
+
+            neighbour_rows = self.rating_index.user_rows(similar_users.ravel())
+            query_rows = np.repeat(np.arange(len(active)), similar_users.shape[1])
+            found = neighbour_rows >= 0
+            neighbours = sp.csr_matrix((np.ones(found.sum()), (query_rows[found], neighbour_rows[found])),
+                                       shape=(len(active), self.rating_index.shape[0]))
+
+            rated_columns = self.rating_index.movie_columns(movie_ids)
+            found = rated_columns >= 0
+            rated = sp.csr_matrix((np.ones(found.sum()), (active_rows[positions[found]], rated_columns[found])),
+                                  shape=(len(active), self.rating_index.shape[1]))
+
+            matrix = self.rating_index.matrix
+            sums = (neighbours @ matrix).tocsr()
+            counts = (neighbours @ self.rating_index.indicator()).tocsr()
+            for product in (sums, counts, rated):
+                product.sum_duplicates()
+                product.sort_indices()
+
+            in_catalog = self.movie_index.get_indexer(self.rating_index.movie_ids) >= 0
+
+            for row, user_position in enumerate(active):
+                start, end = sums.indptr[row], sums.indptr[row + 1]
+                columns = sums.indices[start:end]
+                scores = sums.data[start:end] / counts.data[start:end]
+
+                keep = in_catalog[columns] & ~np.isin(columns, rated.indices[rated.indptr[row]:rated.indptr[row + 1]])
+                columns, scores = columns[keep], scores[keep]
+
+                top = top_n_indices(scores, n_recommendations)
+                result_positions.append(np.full(len(top), user_position, dtype=np.int64))
+                result_movies.append(self.rating_index.movie_ids[columns[top]])
+                result_scores.append(scores[top])
+
+        popular = self.popular_movies.head(n_recommendations)
+        for user_position in np.setdiff1d(np.arange(n_users), active):
+            result_positions.append(np.full(len(popular), user_position, dtype=np.int64))
+            result_movies.append(popular['movieId'].to_numpy())
+            result_scores.append(popular['score'].to_numpy())
+
+        if not result_positions:
+            return pd.DataFrame(columns=['userId', 'rank', 'movieId', 'title', 'genres', 'score'])
+
+        result_positions = np.concatenate(result_positions)
+        order = np.argsort(result_positions, kind='stable')
+        result_positions = result_positions[order]
+        recommendations = self.movies_frame(np.concatenate(result_movies)[order],
+                                            np.concatenate(result_scores)[order])
+
+        first = np.searchsorted(result_positions, result_positions, side='left')
+        recommendations.insert(0, 'rank', np.arange(len(result_positions)) - first + 1)
+        recommendations.insert(0, 'userId', pd.Series(user_ids, dtype=object).to_numpy()[result_positions])
+        return recommendations
+
+    def has_model_profile(self, user_id):
+        """Есть ли у пользователя базы собственный профиль в моделях (после retrain_incremental.py)"""
+        return user_id is not None and int(model_user_ids(user_id)) in self.user_profiles_scaled.index
+
+    def find_similar_users(self, profiles_scaled, user_ids):
+        """userId соседей для каждого профиля (строки - профили в порядке user_ids).
+
+        Пользователь базы, уже попавший в модели (retrain_incremental.py), ближе всех к самому себе:
+        запрашивается на одного соседа больше, и его собственная строка отбрасывается (или
+        последний сосед, если ее среди найденных нет). user_id None - пользователь без аккаунта.
+        """
+        profile_ids = self.user_profiles_scaled.index.to_numpy()
+        n_neighbors = min(self.n_neighbors or self.neighbor_index.n_neighbors, len(profile_ids) - 1)
+        indices = self.neighbor_index.kneighbors(profiles_scaled, n_neighbors=n_neighbors + 1, return_distance=False)
+        neighbour_ids = profile_ids[indices]
+
+        own_ids = np.array([model_user_ids(user_id) if user_id is not None else np.iinfo(np.int64).min
+                            for user_id in user_ids], dtype=np.int64)
+        keep = neighbour_ids != own_ids[:, np.newaxis]
+        keep[keep.all(axis=1), -1] = False
+        return neighbour_ids[keep].reshape(len(neighbour_ids), n_neighbors)
+
+    def select_unrated(self, movie_ids, scores, n_recommendations, is_rated, ordered=False):
+        """Позиции n лучших по scores фильмов, которые пользователь не оценил.
+
+        is_rated проверяется только для просматриваемых лучших кандидатов (их число удваивается,
+        пока не наберется n), а не для всех оценок пользователя. ordered - кандидаты уже упорядочены.
+        """
+        n_candidates = 2 * n_recommendations
+        while True:
+            if ordered:
+                top = np.arange(min(n_candidates, len(movie_ids)))
+            else:
+                top = top_n_indices(scores, n_candidates)
+            keep = top[~is_rated(movie_ids[top])]
+            if len(keep) >= n_recommendations or len(top) == len(movie_ids):
+                return keep[:n_recommendations]
+            n_candidates *= 2
+
+    def get_recommendations_by_similar_users(self, user_id, user_ratings, n_recommendations=10, profile=None):
+
+        if profile is not None:
+            print(f"Получение рекомендаций для пользователя {user_id} по готовому профилю "
+                  f"({profile.rating_count} оценок)")
+            user_profile, user_profile_scaled = self.create_user_profile_from_stats(profile)
+        else:
+            print(f"Получение рекомендаций для пользователя {user_id} на основе {len(user_ratings)} оценок")
+            user_profile, user_profile_scaled = self.create_user_profile(user_ratings)
+
+        if self.neighbor_index is None:
             print("Модель KNN не загружена, невозможно найти похожих пользователей")
             return self.get_popular_recommendations(n_recommendations)
 
-        distances, indices = self.knn_model.kneighbors(user_profile_scaled)
-        similar_users = [self.user_profiles_scaled.index[idx] for idx in indices[0]]
+        similar_users = self.find_similar_users(user_profile_scaled, [user_id])[0]
 
         print(f"Найдено {len(similar_users)} похожих пользователей")
 
-        similar_users_ratings = self.ratings[self.ratings['userId'].isin(similar_users)]
+        if profile is not None:
+            movie_ids, scores = self.aggregate_neighbour_ratings(similar_users, None)
+            top = self.select_unrated(movie_ids, scores, n_recommendations, profile.rated_mask)
+        else:
+            rated_movies, _ = self.parse_user_ratings(user_ratings)
+            movie_ids, scores = self.aggregate_neighbour_ratings(similar_users, rated_movies)
+            top = top_n_indices(scores, n_recommendations)
+
+        return self.movies_frame(movie_ids[top], scores[top])
 
-        movie_ratings = similar_users_ratings.groupby('movieId')['rating'].mean().reset_index()
+    def get_recommendations_by_cluster(self, user_id, user_ratings, n_recommendations=10, profile=None):
+        """Готовый список кластера пользователя за вычетом уже оцененных фильмов"""
 
-        movie_ratings = movie_ratings.sort_values('rating', ascending=False)
+        if self.cluster_recommendations is None or self.kmeans_model is None:
+            print("Списки рекомендаций кластеров не построены, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations, profile)
 
-        rated_movies = [int(float(movie_id)) for movie_id in user_ratings.keys()]
-        movie_ratings = movie_ratings[~movie_ratings['movieId'].isin(rated_movies)]
+        if profile is not None:
+            print(f"Получение рекомендаций кластера для пользователя {user_id} по готовому профилю")
+            user_profile, user_profile_scaled = self.create_user_profile_from_stats(profile)
+        else:
+            print(f"Получение рекомендаций кластера для пользователя {user_id} на основе {len(user_ratings)} оценок")
+            user_profile, user_profile_scaled = self.create_user_profile(user_ratings)
+        cluster_id = int(self.kmeans_model.predict(np.asarray(user_profile_scaled))[0])
+
+        tables = self.cluster_recommendations
+        start, end = tables['offsets'][cluster_id], tables['offsets'][cluster_id + 1]
+        movie_ids = np.asarray(tables['movie_ids'][start:end])
+        scores = np.asarray(tables['scores'][start:end])
+
+        if profile is not None:
+            keep = np.flatnonzero(self.movie_index.get_indexer(movie_ids) >= 0)
+            top = keep[self.select_unrated(movie_ids[keep], None, n_recommendations, profile.rated_mask,
+                                           ordered=True)]
+        else:
+            rated_movies, _ = self.parse_user_ratings(user_ratings)
+            keep = np.flatnonzero(~np.isin(movie_ids, rated_movies) & (self.movie_index.get_indexer(movie_ids) >= 0))
+            top = keep[:n_recommendations]
 
-        top_movies = movie_ratings.head(n_recommendations)
+        print(f"Кластер {cluster_id}: {end - start} фильмов в списке")
 
-        recommendations = pd.merge(top_movies, self.movies, on='movieId')
+        return self.movies_frame(movie_ids[top], scores[top].astype(np.float64))
 
-        recommendations = recommendations.rename(columns={'rating': 'score'})
+    def get_similar_movies(self, movie_id, n_recommendations=10):
+        """Похожие фильмы ("больше похожего") из готовых списков по Tag Genome"""
+        if self.content_neighbors is None:
+            print("Списки похожих фильмов не построены")
+            return self.movies_frame([], [])
 
-        recommendations = recommendations[['movieId', 'title', 'genres', 'score']]
+        movie_ids, similarities = self.content_neighbors.similar(int(float(movie_id)), self.content_neighbors.k)
+        known = self.movie_index.get_indexer(movie_ids) >= 0
+        return self.movies_frame(movie_ids[known][:n_recommendations],
+                                 similarities[known][:n_recommendations].astype(np.float64))
 
-        return recommendations
+    def get_recommendations_from_item_neighbors(self, item_neighbors, user_ratings, n_recommendations):
+        """Сумма списков соседей оцененных фильмов: ранжирование по сумме близость x оценка,
+        score - взвешенная близостью средняя оценка"""
+        movie_ids, ratings = self.parse_user_ratings(user_ratings)
+        candidates, weight_sums, predicted = item_neighbors.score(movie_ids, ratings)
 
-    def get_popular_recommendations(self, n_recommendations=10):
-        
-        print(f"Получение {n_recommendations} популярных фильмов")
+        keep = (self.movie_index.get_indexer(candidates) >= 0) & ~np.isin(candidates, movie_ids)
+        candidates, weight_sums, predicted = candidates[keep], weight_sums[keep], predicted[keep]
 
-        movie_stats = self.ratings.groupby('movieId').agg(
-            mean_rating=('rating', 'mean'),
-            count=('rating', 'count')
-        ).reset_index()
+        top = top_n_indices(weight_sums, n_recommendations)
+        return self.movies_frame(candidates[top], predicted[top])
 
-        popular_movies = movie_stats[movie_stats['count'] > 100]
+    def get_recommendations_by_content(self, user_id, user_ratings, n_recommendations=10):
+        """Рекомендации по сходству фильмов в Tag Genome"""
+        if self.content_neighbors is None:
+            print("Списки похожих фильмов не построены, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
 
-        popular_movies = popular_movies.sort_values('mean_rating', ascending=False)
+        print(f"Получение рекомендаций по содержанию для пользователя {user_id} на основе {len(user_ratings)} оценок")
+        recommendations = self.get_recommendations_from_item_neighbors(self.content_neighbors, user_ratings,
+                                                                       n_recommendations)
+        if recommendations.empty:
+            # У большинства фильмов MovieLens нет Tag Genome
+            print("Для оцененных фильмов нет списков похожих фильмов, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
+        return recommendations
 
-        top_movies = popular_movies.head(n_recommendations)
+    def get_recommendations_by_items(self, user_id, user_ratings, n_recommendations=10):
+        """Item-based CF: соседи оцененных фильмов по совместным оценкам пользователей"""
+        if self.item_neighbors is None:
+            print("Списки соседей по оценкам не построены, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
 
-        recommendations = pd.merge(top_movies, self.movies, on='movieId')
+        print(f"Получение рекомендаций по похожим фильмам для пользователя {user_id} на основе {len(user_ratings)} оценок")
+        recommendations = self.get_recommendations_from_item_neighbors(self.item_neighbors, user_ratings,
+                                                                       n_recommendations)
+        if recommendations.empty:
+            # Фильмы с малым числом совместных оценок (меньше min_support) не имеют списков соседей
+            print("Для оцененных фильмов нет списков соседей, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
+        return recommendations
 
-        recommendations = recommendations.rename(columns={'mean_rating': 'score'})
+    def get_recommendations_by_factorization(self, user_id, user_ratings, n_recommendations=10):
+        """Матричная факторизация: вектор пользователя по его оценкам и предсказание для всего каталога"""
+        if self.factorization is None:
+            print("Модель матричной факторизации не загружена, используется поиск похожих пользователей")
+            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
 
-        recommendations = recommendations[['movieId', 'title', 'genres', 'score']]
+        print(f"Получение рекомендаций ALS для пользователя {user_id} на основе {len(user_ratings)} оценок")
+
+        if self.factorization_catalog is None:
+            self.factorization_catalog = self.movie_index.get_indexer(self.factorization.movie_ids) >= 0
+
+        movie_ids, ratings = self.parse_user_ratings(user_ratings)
+        predicted, rated_rows = self.factorization.predict(movie_ids, ratings)
+        predicted[~self.factorization_catalog] = -np.inf
+        predicted[rated_rows] = -np.inf
+
+        top = top_n_indices(predicted, n_recommendations)
+        top = top[np.isfinite(predicted[top])]
+        return self.movies_frame(self.factorization.movie_ids[top], predicted[top].astype(np.float64))
+
+    def aggregate_neighbour_ratings(self, similar_users, rated_movies):
+        """Средние оценки соседей по фильмам, исключая уже оцененные (если rated_movies не None)
+        и отсутствующие в каталоге"""
+        rows = self.rating_index.user_rows(similar_users)
+        neighbour_ratings = self.rating_index.matrix[rows[rows >= 0]]
+
+        columns, positions = np.unique(neighbour_ratings.indices, return_inverse=True)
+        sums = np.bincount(positions, weights=neighbour_ratings.data, minlength=len(columns))
+        counts = np.bincount(positions, minlength=len(columns))
+
+        movie_ids = self.rating_index.movie_ids[columns]
+        keep = self.movie_index.get_indexer(movie_ids) >= 0
+        if rated_movies is not None:
+            keep &= ~np.isin(movie_ids, rated_movies)
+
+        return movie_ids[keep], sums[keep] / counts[keep]
+
+    def refresh_popularity(self, min_count=100, movie_stats=None):
+        """Кэш рейтинга популярных фильмов; при изменении оценок пересчитывается в refresh_rating_caches.
+
+        Считается по индексу оценок или по готовым статистикам movie_stats (movieId, mean_rating,
+        count), накопленным DataProcessor.create_user_profiles_streaming без общей таблицы оценок.
+        """
+        if movie_stats is None:
+            matrix = self.rating_index.matrix
+            n_movies = matrix.shape[1]
+            counts = np.bincount(matrix.indices, minlength=n_movies)
+            sums = np.bincount(matrix.indices, weights=matrix.data, minlength=n_movies)
+            movie_ids = self.rating_index.movie_ids
+            mean_ratings = np.divide(sums, counts, out=np.zeros(n_movies), where=counts > 0)
+        else:
+            movie_ids = movie_stats['movieId'].to_numpy()
+            counts = movie_stats['count'].to_numpy()
+            mean_ratings = movie_stats['mean_rating'].to_numpy(dtype=np.float64)
+
+        eligible = np.flatnonzero((counts > min_count) & (self.movie_index.get_indexer(movie_ids) >= 0))
+        mean_ratings = mean_ratings[eligible]
+        order = np.argsort(-mean_ratings, kind='stable')
+
+        self.popular_movies = self.movies_frame(movie_ids[eligible[order]], mean_ratings[order])
+        print(f"Рейтинг популярных фильмов обновлен: {len(self.popular_movies)} фильмов")
+
+    def refresh_rating_caches(self):
+        """Пересчитывает все, что зависит от оценок обучающих пользователей: рейтинг популярности и
+        кэш результатов. Вызывается после apply_user_changes и перезагрузки пакета моделей"""
+        self.refresh_popularity()
+        if self.result_cache is not None:
+            self.result_cache.clear()
+
+    def reload_bundle(self):
+        """Загружает новую версию пакета моделей, если LATEST указывает не на текущую; True, если загружена"""
+        if not bundle_exists(self.bundle_path) or resolve_bundle_dir(self.bundle_path) == self.bundle_version_dir:
+            return False
+        n_clusters_probe = getattr(self.neighbor_index, 'n_clusters_probe', 1)
+        self.load_bundle(self.bundle_path)
+        self.build_neighbor_search(self.neighbor_search, n_clusters_probe)
+        self.refresh_rating_caches()
+        return True
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает закэшированные рекомендации пользователя после изменения его оценок"""
+        if self.result_cache is not None:
+            self.result_cache.invalidate_user(user_id)
 
-        return recommendations
+    def get_popular_recommendations(self, n_recommendations=10):
 
-    def get_recommendations(self, user_id=None, user_ratings=None, n_recommendations=10):
+        print(f"Получение {n_recommendations} популярных фильмов")
 
-        if user_ratings and len(user_ratings) > 0:
-            return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
+        return self.popular_movies.head(n_recommendations).copy()
+
+    def compute_recommendations(self, user_id, user_ratings, n_recommendations, method, profile=None):
+        if profile is not None:
+            if method in ('users', 'cluster'):
+                # Профиль уже готов, оценки читаются только для проверки лучших кандидатов
+                if method == 'cluster':
+                    return self.get_recommendations_by_cluster(user_id, None, n_recommendations, profile)
+                return self.get_recommendations_by_similar_users(user_id, None, n_recommendations, profile)
+            user_ratings = profile.load_ratings()
+
+        if method == 'cluster':
+            return self.get_recommendations_by_cluster(user_id, user_ratings, n_recommendations)
+        if method == 'content':
+            return self.get_recommendations_by_content(user_id, user_ratings, n_recommendations)
+        if method == 'items':
+            return self.get_recommendations_by_items(user_id, user_ratings, n_recommendations)
+        if method == 'mf':
+            return self.get_recommendations_by_factorization(user_id, user_ratings, n_recommendations)
+        return self.get_recommendations_by_similar_users(user_id, user_ratings, n_recommendations)
+
+    def get_recommendations(self, user_id=None, user_ratings=None, n_recommendations=10, method=None, profile=None):
+        """Рекомендации по оценкам user_ratings или по готовому профилю profile (StoredUserProfile)"""
+
+        method = method or self.recommendation_method
+        if profile is not None and profile.rating_count > 0 or profile is None and user_ratings:
+            if self.result_cache is None:
+                return self.compute_recommendations(user_id, user_ratings, n_recommendations, method, profile)
+
+            fingerprint = profile.fingerprint if profile is not None else ratings_fingerprint(user_ratings)
+            # Собственный профиль пользователя в моделях исключается из его соседей: только тогда результат
+            # зависит от user_id, остальные пользователи с теми же оценками делят одну запись
+            key = (fingerprint, n_recommendations, method, user_id if self.has_model_profile(user_id) else None)
+            recommendations = self.result_cache.get(key)
+            if recommendations is None:
+                recommendations = self.compute_recommendations(user_id, user_ratings, n_recommendations,
+                                                               method, profile)
+                self.result_cache.put(key, recommendations, user_id=user_id)
+            return recommendations.copy()
 
         return self.get_popular_recommendations(n_recommendations)
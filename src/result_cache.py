@@ -0,0 +1,141 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+
+FINGERPRINT_MODULUS = 1 << 64
+
+
+def _mix64(values):
+    """Финальное перемешивание splitmix64 для массива uint64"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def rating_pair_hashes(movie_ids, ratings):
+    """64-битные хеши пар (movieId, оценка) по целому movieId и битам оценки в float64"""
+    movie_ids = np.asarray(movie_ids, dtype=np.int64).astype(np.uint64)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    with np.errstate(over='ignore'):
+        return _mix64(movie_ids * np.uint64(0x9E3779B97F4A7C15) + _mix64(ratings.view(np.uint64)))
+
+
+def format_fingerprint(value):
+    return f"{int(value) % FINGERPRINT_MODULUS:016x}"
+
+
+def ratings_fingerprint(user_ratings):
+    """Отпечаток набора оценок - сумма хешей пар по модулю 2^64.
+
+    Не зависит от порядка ключей и записи movieId ('1', '1.0', 1), а при изменении одной оценки
+    пересчитывается за O(1): из суммы вычитается хеш старой пары и прибавляется хеш новой
+    (так его ведет UserDatabase).
+    """
+    movie_ids, ratings, total = [], [], 0
+    for movie_id, rating in user_ratings.items():
+        try:
+            movie_ids.append(int(float(movie_id)))
+            ratings.append(float(rating))
+        except (ValueError, TypeError, OverflowError):
+            pair = f"{movie_id}:{rating}".encode('utf-8')
+            total += int.from_bytes(hashlib.blake2b(pair, digest_size=8).digest(), 'little')
+    if movie_ids:
+        total += int(rating_pair_hashes(movie_ids, ratings).sum(dtype=np.uint64))
+    return format_fingerprint(total)
+
+
+class RecommendationCache:
+    """Ограниченный кэш результатов рекомендаций: LRU по размеру и срок жизни записи (TTL).
+
+    Ключ - отпечаток набора оценок вместе с параметрами запроса, поэтому одинаковые наборы оценок
+    разных (в том числе анонимных) пользователей попадают в одну запись. Записи помечаются
+    пользователем, чтобы сбросить их при изменении его оценок. Потокобезопасен.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _remove(self, key):
+        """Удаляет запись и ее ключ из индексов всех ее пользователей; вызывается под блокировкой"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for user_id in entry[2]:
+            keys = self._user_keys.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[user_id]
+        return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _ = entry
+            if self.ttl is not None and self.clock() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, user_id=None):
+        with self._lock:
+            expires_at = self.clock() + self.ttl if self.ttl is not None else None
+            # Запись помнит своих пользователей, чтобы при вытеснении убрать ее ключ из _user_keys
+            previous = self._entries.get(key)
+            owners = previous[2] if previous is not None else set()
+            if user_id is not None:
+                owners.add(user_id)
+                self._user_keys.setdefault(user_id, set()).add(key)
+            self._entries[key] = (value, expires_at, owners)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """Удаляет записи, посчитанные для пользователя; вызывается при сохранении и удалении его оценок"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                if self._remove(key):
+                    self.invalidations += 1
+            self._user_keys.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
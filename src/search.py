@@ -0,0 +1,184 @@
+import numpy as np
+
+MAX_GRAM = 3
+
+
+class _Postings:
+    """Инвертированный индекс в виде CSR: отсортированные ключи n-грамм, границы и номера строк"""
+
+    def __init__(self, keys, rows, n_rows):
+        # Пара (ключ, строка) упаковывается в одно число: сортировка значений заметно быстрее argsort
+        if len(keys) and int(keys.max()) < np.iinfo(np.int64).max // max(n_rows, 1):
+            packed = np.sort(keys * n_rows + rows)
+            packed = packed[np.r_[True, packed[1:] != packed[:-1]]]
+            keys, rows = packed // n_rows, packed % n_rows
+        else:
+            order = np.lexsort((rows, keys))
+            keys, rows = keys[order], rows[order]
+            distinct = np.r_[True, (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])]
+            keys, rows = keys[distinct], rows[distinct]
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+        self.keys = keys[starts]
+        self.offsets = np.append(starts, len(keys))
+        self.rows = rows.astype(np.int32)
+
+    def get(self, key):
+        if key is None:
+            return self.rows[:0]
+        position = np.searchsorted(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return self.rows[:0]
+        return self.rows[self.offsets[position]:self.offsets[position + 1]]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class MovieSearchIndex:
+    """Поиск фильмов по подстроке названия с фильтром по жанру.
+
+    Для каждой n-граммы длиной от 1 до 3 символов хранится список фильмов, в названии которых она
+    встречается, а также отдельные списки для n-грамм в начале слова и в начале названия. Запрос
+    до трех символов отвечается одним списком, более длинный - пересечением списков его триграмм
+    с проверкой подстроки у оставшихся кандидатов. Набор результатов совпадает с
+    title.lower().contains(query), но упорядочен: сначала названия, начинающиеся с запроса, затем
+    совпадения с началом слова, затем остальные; внутри группы - порядок каталога.
+    """
+
+    def __init__(self, titles, genre_masks=None, genres=None):
+        self.titles = [str(title).lower() for title in np.asarray(titles, dtype=object)]
+        self.n_rows = len(self.titles)
+        self.genre_masks = np.asarray(genre_masks) if genre_masks is not None else None
+        self.genre_bits = {genre: np.int64(1) << np.int64(i) for i, genre in enumerate(genres or [])}
+
+        # Все названия в одном массиве кодовых точек, разделитель - символ с кодом 0
+        text = '\x00'.join(self.titles) + '\x00'
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        lengths = np.array([len(title) for title in self.titles], dtype=np.int64)
+        title_starts = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]).astype(np.int64)
+        row_of = np.repeat(np.arange(self.n_rows, dtype=np.int64), lengths + 1)
+
+        # Символы нумеруются плотно (разделитель - 0), ключ n-граммы - число в системе счисления
+        # по основанию "число символов"; короткие n-граммы дополняются нулями справа
+        unique_codes, code_ids = np.unique(codes, return_inverse=True)
+        self.char_ids = {chr(code): i for i, code in enumerate(unique_codes.tolist())}
+        self.base = len(unique_codes)
+        is_alnum = np.array([chr(code).isalnum() for code in unique_codes.tolist()])[code_ids]
+        is_title_start = np.zeros(len(codes), dtype=bool)
+        is_title_start[title_starts[lengths > 0]] = True
+        is_word_start = is_title_start | np.r_[False, ~is_alnum[:-1]]
+        is_word_start &= codes != 0
+
+        gram_keys, gram_rows, gram_word, gram_title = [], [], [], []
+        title_ends = np.repeat(title_starts + lengths, lengths + 1)
+        for length in range(1, MAX_GRAM + 1):
+            # n-грамма не должна пересекать разделитель названий
+            positions = np.flatnonzero(np.arange(len(codes)) + length <= title_ends)
+            keys = np.zeros(len(positions), dtype=np.int64)
+            for offset in range(MAX_GRAM):
+                keys *= self.base
+                if offset < length:
+                    keys += code_ids[positions + offset]
+            gram_keys.append(keys)
+            gram_rows.append(row_of[positions])
+            gram_word.append(is_word_start[positions])
+            gram_title.append(is_title_start[positions])
+
+        keys, rows = np.concatenate(gram_keys), np.concatenate(gram_rows)
+        word, title = np.concatenate(gram_word), np.concatenate(gram_title)
+        self.contains = _Postings(keys, rows, self.n_rows)
+        self.word_prefix = _Postings(keys[word], rows[word], self.n_rows)
+        self.title_prefix = _Postings(keys[title], rows[title], self.n_rows)
+        self._empty = np.array([], dtype=np.int32)
+
+    def gram_key(self, gram):
+        key = 0
+        for offset in range(MAX_GRAM):
+            key *= self.base
+            if offset < len(gram):
+                char_id = self.char_ids.get(gram[offset])
+                if not char_id:
+                    return None
+                key += char_id
+        return key
+
+    def genre_rows(self, genre):
+        if self.genre_masks is None or genre not in self.genre_bits:
+            return self._empty
+        return np.flatnonzero(self.genre_masks & self.genre_bits[genre]).astype(np.int32)
+
+    @staticmethod
+    def _intersect(candidates, rows):
+        """Пересечение отсортированных списков: бинарный поиск кандидатов (обычно их меньше) в rows"""
+        if len(candidates) == 0 or len(rows) == 0:
+            return candidates[:0]
+        positions = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+        return candidates[rows[positions] == candidates]
+
+    def _tiers(self, query):
+        """Группы ранжирования: (строки-кандидаты по порядку каталога, проверка названия или None)"""
+        if len(query) <= MAX_GRAM:
+            key = self.gram_key(query)
+            return [(self.title_prefix.get(key), None),
+                    (self.word_prefix.get(key), None),
+                    (self.contains.get(key), None)]
+
+        trigrams = {query[i:i + MAX_GRAM] for i in range(len(query) - MAX_GRAM + 1)}
+        lists = sorted((self.contains.get(self.gram_key(gram)) for gram in trigrams), key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = self._intersect(candidates, rows)
+
+        # Совпадение в начале слова или названия начинается с первой триграммы запроса в той же позиции
+        head = self.gram_key(query[:MAX_GRAM])
+
+        def at_word_start(title):
+            position = title.find(query)
+            while position > 0:
+                if not title[position - 1].isalnum():
+                    return True
+                position = title.find(query, position + 1)
+            return position == 0
+
+        return [(self._intersect(candidates, self.title_prefix.get(head)), lambda title: title.startswith(query)),
+                (self._intersect(candidates, self.word_prefix.get(head)), at_word_start),
+                (candidates, lambda title: query in title)]
+
+    def search(self, query='', genre=None, limit=100):
+        """Номера строк каталога для лучших limit совпадений"""
+        query = (query or '').lower()
+        filter_genre = genre and genre != 'all'
+        if filter_genre and (self.genre_masks is None or genre not in self.genre_bits):
+            return self._empty
+
+        if not query:
+            if not filter_genre:
+                return np.arange(min(limit, self.n_rows), dtype=np.int32)
+            return self.genre_rows(genre)[:limit]
+
+        # Группы просматриваются по очереди и только до набора limit результатов; каждая следующая
+        # группа включает предыдущие, поэтому уже найденные строки из нее исключаются
+        found = self._empty
+        for rows, check in self._tiers(query):
+            if filter_genre:
+                rows = rows[(self.genre_masks[rows] & self.genre_bits[genre]) != 0]
+            if len(found):
+                rows = rows[~np.isin(rows, found)]
+
+            needed = limit - len(found)
+            if check is None:
+                matches = rows[:needed]
+            else:
+                matches = []
+                for row in rows.tolist():
+                    if check(self.titles[row]):
+                        matches.append(row)
+                        if len(matches) == needed:
+                            break
+                matches = np.array(matches, dtype=np.int32)
+
+            found = np.concatenate([found, matches])
+            if len(found) >= limit:
+                break
+        return found
@@ -75,40 +75,110 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Изменения оценок копятся в очереди и уходят одним запросом /rate_movies после паузы в кликах;
+    // несколько кликов по одному фильму схлопываются в последнее значение (null - удаление).
+    // После сетевой ошибки или ответа 5xx отправка повторяется с растущей паузой, до RATING_FLUSH_MAX_DELAY;
+    // пакет, отклоненный с 4xx, не повторяется
+    const RATING_FLUSH_DELAY = 700;
+    const RATING_FLUSH_MAX_DELAY = 60000;
+    const pendingRatingChanges = new Map();
+    let ratingFlushTimer = null;
+    let ratingFlushFailures = 0;
+    let ratingFlushInFlight = Promise.resolve();
+
     function saveRating(movieId, rating) {
-        console.log(`Отправка запроса на сохранение оценки: фильм ${movieId}, оценка ${rating}`);
+        queueRatingChange(movieId, rating);
+    }
+
+    function queueRatingChange(movieId, rating) {
+        console.log(`Оценка в очереди: фильм ${movieId}, оценка ${rating}`);
+        pendingRatingChanges.set(String(movieId), rating);
+
+        // Запланированный после ошибки повтор не сдвигается новыми кликами
+        if (ratingFlushFailures > 0 && ratingFlushTimer !== null) {
+            return;
+        }
+        clearTimeout(ratingFlushTimer);
+        ratingFlushTimer = setTimeout(flushRatingChanges, RATING_FLUSH_DELAY);
+    }
+
+    function takePendingRatingChanges() {
+        clearTimeout(ratingFlushTimer);
+        ratingFlushTimer = null;
+
+        const changes = Array.from(pendingRatingChanges, ([movieId, rating]) => ({
+            movie_id: movieId,
+            rating: rating
+        }));
+        pendingRatingChanges.clear();
+        return changes;
+    }
+
+    function flushRatingChanges() {
+        const changes = takePendingRatingChanges();
+        if (changes.length === 0) {
+            return ratingFlushInFlight;
+        }
 
-        fetch('/rate_movie', {
+        console.log(`Отправка ${changes.length} изменений оценок`);
+
+        ratingFlushInFlight = ratingFlushInFlight.then(() => fetch('/rate_movies', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({
-                movie_id: movieId,
-                rating: rating
-            })
+            body: JSON.stringify({ changes: changes })
         })
         .then(response => {
-            if (!response.ok) {
-                throw new Error('Ошибка сети при отправке оценки');
-            }
-            return response.json();
-        })
-        .then(data => {
-            console.log('Ответ сервера при сохранении оценки:', data);
-            if (data.success) {
-                console.log('Оценка успешно сохранена');
-            } else {
-                console.error('Ошибка при сохранении оценки:', data.message);
-                alert('Ошибка при сохранении оценки: ' + data.message);
+            if (response.status >= 500) {
+                // Ошибка сервера может быть временной: пакет отправляется повторно
+                throw new Error(`HTTP ${response.status}`);
             }
+            ratingFlushFailures = 0;
+            return response.json()
+                .catch(() => ({ success: false, message: `HTTP ${response.status}` }))
+                .then(data => {
+                    console.log('Ответ сервера при сохранении оценок:', data);
+                    if (!response.ok || !data.success) {
+                        // 4xx (нет входа, неверные данные): повтор не поможет, пакет отбрасывается
+                        console.error('Сервер отклонил изменения оценок:', data.message);
+                        alert('Ошибка при сохранении оценок: ' + data.message);
+                    }
+                });
         })
         .catch(error => {
-            console.error('Ошибка при сохранении оценки:', error);
-            alert('Произошла ошибка при сохранении оценки');
-        });
+            // Сетевая ошибка или 5xx
+            console.error('Ошибка при сохранении оценок:', error);
+            // Неотправленные изменения возвращаются в очередь, если их не перекрыли новые клики
+            changes.forEach(function(change) {
+                if (!pendingRatingChanges.has(change.movie_id)) {
+                    pendingRatingChanges.set(change.movie_id, change.rating);
+                }
+            });
+
+            const retryDelay = Math.min(RATING_FLUSH_MAX_DELAY, RATING_FLUSH_DELAY * 2 ** (ratingFlushFailures + 1));
+            ratingFlushFailures += 1;
+            console.log(`Повторная отправка оценок через ${retryDelay} мс`);
+            clearTimeout(ratingFlushTimer);
+            ratingFlushTimer = setTimeout(flushRatingChanges, retryDelay);
+
+            if (ratingFlushFailures === 1) {
+                alert('Произошла ошибка при сохранении оценок');
+            }
+        }));
+        return ratingFlushInFlight;
     }
 
+    // При уходе со страницы остаток очереди отправляется через sendBeacon
+    window.addEventListener('pagehide', function() {
+        if (!isLoggedIn || pendingRatingChanges.size === 0) {
+            return;
+        }
+        const body = new Blob([JSON.stringify({ changes: takePendingRatingChanges() })],
+                              { type: 'application/json' });
+        navigator.sendBeacon('/rate_movies', body);
+    });
+
     function deleteRating(movieId) {
         console.log(`Удаление оценки для фильма ${movieId}`);
 
@@ -124,39 +194,15 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        const formData = new FormData();
-        formData.append('movie_id', movieId);
+        const ratingInput = document.querySelector(`input[name="rating_${movieId}"]`);
+        if (ratingInput) {
+            ratingInput.value = '';
+            const stars = ratingInput.closest('.rating-container').querySelectorAll('.star');
+            updateStarsDisplay(stars, 0);
+        }
+        updateSelectedMovies();
 
-        fetch('/delete_rating', {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Ошибка сети при удалении оценки');
-            }
-            return response.json();
-        })
-        .then(data => {
-            console.log('Ответ сервера при удалении оценки:', data);
-            if (data.success) {
-                console.log('Оценка успешно удалена');
-                const ratingInput = document.querySelector(`input[name="rating_${movieId}"]`);
-                if (ratingInput) {
-                    ratingInput.value = '';
-                    const stars = ratingInput.closest('.rating-container').querySelectorAll('.star');
-                    updateStarsDisplay(stars, 0);
-                }
-                updateSelectedMovies();
-            } else {
-                console.error('Ошибка при удалении оценки:', data.message);
-                alert('Ошибка при удалении оценки: ' + data.message);
-            }
-        })
-        .catch(error => {
-            console.error('Ошибка при удалении оценки:', error);
-            alert('Произошла ошибка при удалении оценки');
-        });
+        queueRatingChange(movieId, null);
     }
 
     function updateSelectedMovies() {
@@ -295,10 +341,12 @@ function getRecommendations() {
         return;
     }
 
-    fetch('/get_recommendations', {
+    // Для авторизованного пользователя рекомендации считаются по оценкам из БД - сначала отправляем очередь
+    flushRatingChanges()
+    .then(() => fetch('/get_recommendations', {
         method: 'POST',
         body: formData
-    })
+    }))
     .then(response => response.json())
     .then(data => {
         document.getElementById('loading').style.display = 'none';
@@ -0,0 +1,19 @@
+import os
+import sys
+import contextlib
+import io
+
+import pytest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'benchmarks'))
+
+from synthetic import make_recommender
+
+
+@pytest.fixture(scope='session')
+def recommender(tmp_path_factory):
+    """Небольшой рекомендатель на синтетических данных: 300 пользователей, 200 фильмов"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return make_recommender(str(tmp_path_factory.mktemp('recommender')), 300, 200, 6000)
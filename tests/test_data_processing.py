@@ -0,0 +1,80 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from synthetic import make_movies, make_ratings
+from src.data_processing import DataProcessor, StreamingRatingStats, UserItemMatrix
+from src.recommender import MovieRecommender
+
+
+def write_ratings_with_duplicates(data_dir):
+    movies = make_movies(200)
+    ratings = make_ratings(300, 200, 6000)
+    # Повторные оценки тех же фильмов рядом с исходными, в том числе на границах блоков
+    repeats = ratings.iloc[::7].assign(rating=lambda frame: 5.5 - frame['rating'])
+    ratings = pd.concat([ratings, repeats]).sort_values('userId', kind='stable').reset_index(drop=True)
+    movies.to_csv(os.path.join(data_dir, 'movies.csv'), index=False)
+    ratings.to_csv(os.path.join(data_dir, 'ratings.csv'), index=False)
+    return movies, ratings
+
+
+def test_from_chunks_averages_duplicate_ratings():
+    ratings = pd.DataFrame({
+        'userId': [1, 1, 2, 1, 3],
+        'movieId': [10, 20, 10, 10, 30],
+        'rating': [4.0, 3.0, 5.0, 2.0, 1.5],
+    })
+    expected = UserItemMatrix.from_ratings(ratings)
+    chunked = UserItemMatrix.from_chunks([ratings.iloc[:2], ratings.iloc[2:]])
+
+    np.testing.assert_array_equal(chunked.user_ids, expected.user_ids)
+    np.testing.assert_array_equal(chunked.movie_ids, expected.movie_ids)
+    np.testing.assert_allclose(chunked.matrix.toarray(), expected.matrix.toarray())
+    assert chunked.matrix[0, 0] == 3.0
+
+
+def test_streaming_profiles_match_in_memory_with_duplicates(tmp_path):
+    movies, ratings = write_ratings_with_duplicates(str(tmp_path))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = DataProcessor(data_dir=str(tmp_path), use_cache=False)
+        processor.movies = movies
+        processor.ratings = ratings
+        expected, _, _ = processor.create_user_profiles(processor.create_user_item_matrix())
+        streamed, _, _ = DataProcessor(data_dir=str(tmp_path), use_cache=False).create_user_profiles_streaming(
+            chunksize=997)
+
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False, check_index_type=False)
+
+
+def test_streaming_movie_stats_feed_popularity(tmp_path):
+    data_dir, models_dir = str(tmp_path / 'data'), str(tmp_path / 'models')
+    os.makedirs(data_dir)
+    write_ratings_with_duplicates(data_dir)
+    profiles_path = os.path.join(models_dir, 'user_profiles.pkl')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        DataProcessor(data_dir=data_dir, use_cache=False).create_user_profiles_streaming(
+            chunksize=997, save_path=profiles_path)
+        recommender = MovieRecommender(
+            movies_path=os.path.join(data_dir, 'movies.csv'), ratings_path=os.path.join(data_dir, 'ratings.csv'),
+            user_profiles_path=profiles_path, kmeans_model_path=None, knn_model_path=None,
+            content_model_path=None, item_model_path=None, mf_model_path=None)
+        streamed = recommender.popular_movies
+        recommender.refresh_popularity()
+
+    assert len(streamed) > 0
+    np.testing.assert_array_equal(streamed['movieId'], recommender.popular_movies['movieId'])
+    np.testing.assert_allclose(streamed['score'], recommender.popular_movies['score'])
+
+
+def test_streaming_rejects_unsorted_users():
+    stats = StreamingRatingStats(make_movies(10))
+    stats.update(pd.DataFrame({'userId': [1, 1, 2], 'movieId': [1, 2, 3], 'rating': [4.0, 3.0, 5.0]}))
+    stats.update(pd.DataFrame({'userId': [3, 1], 'movieId': [1, 4], 'rating': [2.0, 1.0]}))
+    with pytest.raises(ValueError):
+        stats.user_arrays()
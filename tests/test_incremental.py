@@ -0,0 +1,64 @@
+import contextlib
+import io
+
+import pandas as pd
+
+from synthetic import make_recommender
+from src.incremental import apply_user_changes
+from src.recommender import MovieRecommender
+
+
+def test_own_profile_is_not_a_neighbour(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = make_recommender(str(tmp_path), 300, 200, 6000)
+        user_ratings = {'1': 5.0, '2': 4.5, '3': 1.0, '40': 3.0}
+        apply_user_changes(recommender, [7], pd.DataFrame({
+            'userId': 7, 'movieId': [int(m) for m in user_ratings], 'rating': list(user_ratings.values())}))
+        _, profile_scaled = recommender.create_user_profile(user_ratings)
+
+    n_neighbors = recommender.n_neighbors
+    anonymous = recommender.find_similar_users(profile_scaled, [None])[0]
+    own = recommender.find_similar_users(profile_scaled, [7])[0]
+    assert anonymous[0] == -7
+    assert len(own) == n_neighbors and -7 not in own
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        batch = recommender.get_recommendations_batch({7: user_ratings}, 10)
+    assert len(batch) == 10
+    assert not set(batch['movieId']) & {1, 2, 3, 40}
+
+
+def test_reloaded_bundle_refreshes_popularity(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        trainer = make_recommender(str(tmp_path), 300, 200, 6000)
+        bundle_dir = str(tmp_path / 'bundle')
+        trainer.save_bundle(bundle_dir)
+        app_recommender = MovieRecommender(bundle_path=bundle_dir, result_cache_size=16)
+        app_recommender.get_recommendations(None, {'1': 5.0, '2': 4.0}, 10)
+        assert app_recommender.result_cache.stats()['size'] == 1
+        assert not app_recommender.reload_bundle()
+
+        # 150 новых пользователей ставят минимальную оценку самому популярному фильму
+        top_movie = int(trainer.popular_movies['movieId'].iloc[0])
+        user_ids = list(range(1, 151))
+        apply_user_changes(trainer, user_ids, pd.DataFrame({'userId': user_ids, 'movieId': top_movie, 'rating': 0.5}))
+        trainer.save_bundle(bundle_dir)
+        assert app_recommender.reload_bundle()
+
+    assert app_recommender.model_version == 2
+    assert app_recommender.result_cache.stats()['size'] == 0
+    assert int(app_recommender.popular_movies['movieId'].iloc[0]) != top_movie
+    pd.testing.assert_frame_equal(app_recommender.popular_movies, trainer.popular_movies)
+
+
+def test_cache_key_includes_user_only_with_model_profile(tmp_path):
+    user_ratings = {'1': 5.0, '2': 4.5, '3': 1.0, '40': 3.0}
+    with contextlib.redirect_stdout(io.StringIO()):
+        recommender = make_recommender(str(tmp_path), 300, 200, 6000, result_cache_size=16)
+        apply_user_changes(recommender, [7], pd.DataFrame({
+            'userId': 7, 'movieId': [int(m) for m in user_ratings], 'rating': list(user_ratings.values())}))
+        for user_id in (None, 8, 9, 7):
+            recommender.get_recommendations(user_id, user_ratings, 10)
+
+    stats = recommender.result_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 2, 2)
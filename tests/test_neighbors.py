@@ -0,0 +1,22 @@
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from src.neighbors import IVFNeighborIndex
+
+
+def test_ivf_probes_more_lists_when_nearest_are_short():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 5)).astype(np.float32)
+    labels = np.r_[np.zeros(3, dtype=int), np.ones(3, dtype=int), np.full(94, 2)]
+    centroids = np.stack([X[:3].mean(axis=0), X[3:6].mean(axis=0), X[6:].mean(axis=0)])
+
+    index = IVFNeighborIndex(n_neighbors=8, n_probe=1).fit(X, centroids=centroids, labels=labels)
+    distances, indices = index.kneighbors(X[:6])
+
+    assert np.isfinite(distances).all()
+    assert all(len(set(row)) == 8 for row in indices)
+    np.testing.assert_allclose(distances, np.linalg.norm(X[indices] - X[:6, np.newaxis], axis=2), atol=1e-3)
+
+    index.n_probe = 3
+    exact = NearestNeighbors(n_neighbors=8).fit(X).kneighbors(X[:6], return_distance=False)
+    np.testing.assert_array_equal(index.kneighbors(X[:6], return_distance=False), exact)
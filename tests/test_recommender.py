@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.item_similarity import ItemNeighbors
+
+
+def covered_neighbors(movie_ids, k=5):
+    """Списки соседей только для movie_ids: каждый фильм похож на следующие k"""
+    movie_ids = np.asarray(movie_ids, dtype=np.int32)
+    rows = np.arange(len(movie_ids))
+    neighbors = ((rows[:, np.newaxis] + np.arange(1, k + 1)) % len(movie_ids)).astype(np.int32)
+    similarities = np.full(neighbors.shape, 0.5, dtype=np.float16)
+    return ItemNeighbors(movie_ids, neighbors, similarities)
+
+
+def test_content_recommendations_fall_back_without_genome_coverage(recommender):
+    recommender.content_neighbors = covered_neighbors(np.arange(1, 21))
+    try:
+        covered = recommender.get_recommendations_by_content(None, {'1': 5.0, '2': 4.0}, 10)
+        uncovered = recommender.get_recommendations_by_content(None, {'150': 5.0, '151': 4.0}, 10)
+    finally:
+        recommender.content_neighbors = None
+
+    assert len(covered) > 0
+    assert set(covered['movieId']) <= set(range(1, 21))
+    assert len(uncovered) == 10
+    assert not {150, 151} & set(uncovered['movieId'])
+
+
+def test_item_recommendations_fall_back_without_neighbour_lists(recommender):
+    recommender.item_neighbors = covered_neighbors(np.arange(1, 21))
+    try:
+        covered = recommender.get_recommendations_by_items(None, {'1': 5.0, '2': 4.0}, 10)
+        uncovered = recommender.get_recommendations_by_items(None, {'150': 5.0, '151': 4.0}, 10)
+    finally:
+        recommender.item_neighbors = None
+
+    assert len(covered) > 0
+    assert set(covered['movieId']) <= set(range(1, 21))
+    assert len(uncovered) == 10
+    assert not {150, 151} & set(uncovered['movieId'])
@@ -0,0 +1,26 @@
+from src.result_cache import RecommendationCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_user_index_shrinks_on_eviction_and_expiry():
+    clock = FakeClock()
+    cache = RecommendationCache(max_size=2, ttl=10, clock=clock)
+    cache.put('a', 1, user_id=1)
+    cache.put('b', 2, user_id=2)
+    cache.put('c', 3, user_id=2)
+    assert cache._user_keys == {2: {'b', 'c'}}
+
+    clock.now = 20
+    assert cache.get('b') is None
+    assert cache._user_keys == {2: {'c'}}
+
+    cache.invalidate_user(2)
+    assert cache._user_keys == {}
+    assert cache.stats()['size'] == 0
@@ -1,16 +1,86 @@
 import os
 import sqlite3
+import hashlib
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from src.result_cache import format_fingerprint, rating_pair_hashes
+
+# Ограничение числа параметров в одном запросе IN (...)
+IN_CHUNK_SIZE = 500
+
+
+class StoredUserProfile:
+    """Профиль пользователя, который UserDatabase ведет при каждой записи оценок.
+
+    genre_sums - суммы оценок по жанрам (по фильмам из movie_genres), rating_sum и rating_count -
+    по всем оценкам, fingerprint совпадает с ratings_fingerprint всех оценок пользователя.
+    Сами оценки читаются только по требованию: rated_mask проверяет лишь переданных кандидатов.
+    """
+
+    def __init__(self, db, user_id, genre_sums, rating_sum, rating_count, fingerprint):
+        self.db = db
+        self.user_id = user_id
+        self.genre_sums = genre_sums
+        self.rating_sum = rating_sum
+        self.rating_count = rating_count
+        self.fingerprint = fingerprint
+
+    def rated_mask(self, movie_ids):
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(movie_ids) == 0 or not self.rating_count:
+            return np.zeros(len(movie_ids), dtype=bool)
+        rated = self.db.get_rated_movies(self.user_id, movie_ids.tolist())
+        return np.isin(movie_ids, np.fromiter(rated, dtype=np.int64, count=len(rated)))
+
+    def load_ratings(self):
+        return self.db.get_user_ratings(self.user_id)
+
+
 class UserDatabase:
-    def __init__(self, db_path='user_ratings.db'):
+    """Пользователи и их оценки в SQLite.
+
+    Каждый поток держит одно соединение и переиспользует его (вместе с кэшем подготовленных
+    запросов sqlite3). База работает в режиме WAL: чтения не блокируются записью, а конкурирующие
+    записи ждут busy_timeout вместо немедленной ошибки database is locked.
+
+    Вместе с оценками в той же транзакции обновляется статистика профиля пользователя (суммы
+    оценок по жанрам, сумма и число оценок, отпечаток), поэтому get_user_profile читает готовый
+    профиль за O(жанров) независимо от числа оценок. Жанры фильмов задает sync_movie_genres.
+    """
+
+    def __init__(self, db_path='user_ratings.db', busy_timeout=5000, cached_statements=256):
         
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
         self.init_db()
 
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # После fork (например, в воркерах gunicorn) соединение родителя не используется
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout / 1000,
+                                   cached_statements=self.cached_statements)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """Закрывает соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connection()
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -34,28 +104,93 @@ class UserDatabase:
         )
         ''')
 
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS precomputed_recommendations (
+            user_id INTEGER,
+            rank INTEGER,
+            movie_id INTEGER,
+            score REAL,
+            ratings_fingerprint TEXT,
+            method TEXT,
+            model_version INTEGER,
+            computed_at TIMESTAMP,
+            PRIMARY KEY (user_id, rank),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Готовые рекомендации, посчитанные до появления этих столбцов, не отдаются: метод и версия неизвестны
+        precomputed_columns = [row[1] for row in
+                               cursor.execute('PRAGMA table_info(precomputed_recommendations)').fetchall()]
+        for column, column_type in [('method', 'TEXT'), ('model_version', 'INTEGER')]:
+            if column not in precomputed_columns:
+                cursor.execute(f'ALTER TABLE precomputed_recommendations ADD COLUMN {column} {column_type}')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movie_genres (
+            movie_id INTEGER,
+            genre TEXT,
+            PRIMARY KEY (movie_id, genre)
+        ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_genre_stats (
+            user_id INTEGER,
+            genre TEXT,
+            weight_sum REAL,
+            PRIMARY KEY (user_id, genre)
+        ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_rating_stats (
+            user_id INTEGER PRIMARY KEY,
+            rating_sum REAL,
+            rating_count INTEGER,
+            ratings_fingerprint TEXT,
+            change_seq INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+
+        # База, созданная до появления номеров изменений: они начинаются с 0
+        stats_columns = [row[1] for row in cursor.execute('PRAGMA table_info(user_rating_stats)').fetchall()]
+        if 'change_seq' not in stats_columns:
+            cursor.execute('ALTER TABLE user_rating_stats ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_rating_stats_change_seq ON user_rating_stats (change_seq)')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
+
         conn.commit()
-        conn.close()
+
+        # База, созданная до появления статистики профилей: статистика строится по имеющимся оценкам
+        has_ratings = conn.execute('SELECT EXISTS (SELECT 1 FROM user_ratings)').fetchone()[0]
+        has_stats = conn.execute('SELECT EXISTS (SELECT 1 FROM user_rating_stats)').fetchone()[0]
+        if has_ratings and not has_stats:
+            self.rebuild_profile_stats()
 
     def register_user(self, username, password):
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            conn = self._connection()
+            with conn:
+                cursor = conn.cursor()
 
-            cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-            user = cursor.fetchone()
-            if user:
-                conn.close()
-                return None  
+                cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
+                user = cursor.fetchone()
+                if user:
+                    return None  
 
-            cursor.execute(
-                'INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)',
-                (username, password, datetime.now())
-            )
-            user_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+                cursor.execute(
+                    'INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)',
+                    (username, password, datetime.now())
+                )
+                user_id = cursor.lastrowid
             return user_id
         except Exception as e:
             print(f"Ошибка при регистрации пользователя: {e}")
@@ -63,60 +198,213 @@ class UserDatabase:
 
     def authenticate_user(self, username, password):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
+            cursor = self._connection().execute(
                 'SELECT id FROM users WHERE username = ? AND password = ?',
                 (username, password)
             )
             user = cursor.fetchone()
-            conn.close()
             return user[0] if user else None
         except Exception as e:
             print(f"Ошибка при аутентификации пользователя: {e}")
             return None
 
-    def save_rating(self, user_id, movie_id, rating):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+    def _write_transaction(self):
+        """Соединение с открытой транзакцией записи (BEGIN IMMEDIATE): прежние оценки, прочитанные
+        внутри нее, не изменятся до фиксации; использовать как with self._write_transaction() as conn"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
 
-            cursor.execute(
-                'SELECT id FROM user_ratings WHERE user_id = ? AND movie_id = ?',
-                (user_id, movie_id)
-            )
-            existing_rating = cursor.fetchone()
+    def _current_ratings(self, conn, user_id, movie_ids):
+        current = {}
+        for start in range(0, len(movie_ids), IN_CHUNK_SIZE):
+            chunk = movie_ids[start:start + IN_CHUNK_SIZE]
+            current.update(conn.execute(
+                f'SELECT movie_id, rating FROM user_ratings WHERE user_id = ? '
+                f'AND movie_id IN ({",".join("?" * len(chunk))})',
+                (user_id, *chunk)
+            ).fetchall())
+        return current
 
-            if existing_rating:
-                cursor.execute(
-                    'UPDATE user_ratings SET rating = ?, timestamp = ? WHERE user_id = ? AND movie_id = ?',
-                    (rating, datetime.now(), user_id, movie_id)
-                )
-            else:
-                cursor.execute(
-                    'INSERT INTO user_ratings (user_id, movie_id, rating, timestamp) VALUES (?, ?, ?, ?)',
-                    (user_id, movie_id, rating, datetime.now())
-                )
+    def _next_change_seq(self, conn):
+        """Номер очередной транзакции записи оценок: транзакции записи идут по одной, поэтому номера растут"""
+        return conn.execute('SELECT COALESCE(MAX(change_seq), 0) + 1 FROM user_rating_stats').fetchone()[0]
 
-            conn.commit()
-            conn.close()
+    def _apply_changes(self, conn, changes, timestamp):
+        """Записывает изменения (user_id, movie_id, оценка или None для удаления[, время]) и обновляет
+        статистику профилей.
+
+        Вызывается внутри транзакции записи; время по умолчанию - timestamp. Изменения
+        складываются во временную таблицу, и все обновления делаются запросами над ней: суммы
+        жанров меняются на разницу новой и прежней оценки, сумма, число оценок и отпечаток
+        пользователя - на вклад измененных пар. Возвращает число измененных оценок.
+        """
+        latest = {}
+        for change in changes:
+            user_id, movie_id, rating = change[:3]
+            latest[(user_id, int(movie_id))] = (None if rating is None else float(rating),
+                                                change[3] if len(change) > 3 else timestamp)
+        if not latest:
+            return 0
+
+        conn.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS rating_changes ('
+            'user_id INTEGER, movie_id INTEGER, rating REAL, timestamp TIMESTAMP, PRIMARY KEY (user_id, movie_id))'
+        )
+        conn.execute('DELETE FROM rating_changes')
+        conn.executemany('INSERT INTO rating_changes (user_id, movie_id, rating, timestamp) VALUES (?, ?, ?, ?)',
+                         [(user_id, movie_id, rating, rating_time)
+                          for (user_id, movie_id), (rating, rating_time) in latest.items()])
+
+        rows = conn.execute(
+            'SELECT c.user_id, c.movie_id, c.rating, r.rating FROM rating_changes c '
+            'LEFT JOIN user_ratings r ON r.user_id = c.user_id AND r.movie_id = c.movie_id'
+        ).fetchall()
+
+        # Суммы жанров: разница оценок по жанрам фильма (запрос - до изменения самих оценок)
+        conn.execute(
+            'INSERT INTO user_genre_stats (user_id, genre, weight_sum) '
+            'SELECT c.user_id, g.genre, SUM(COALESCE(c.rating, 0) - COALESCE(r.rating, 0)) '
+            'FROM rating_changes c JOIN movie_genres g ON g.movie_id = c.movie_id '
+            'LEFT JOIN user_ratings r ON r.user_id = c.user_id AND r.movie_id = c.movie_id '
+            'WHERE c.rating IS NOT NULL OR r.rating IS NOT NULL GROUP BY c.user_id, g.genre '
+            'ON CONFLICT (user_id, genre) DO UPDATE SET weight_sum = weight_sum + excluded.weight_sum'
+        )
+
+        # Сумма, число и отпечаток: вклад измененных пар по пользователям
+        user_ids, movie_ids, new, old = zip(*rows)
+        new = np.array([np.nan if rating is None else rating for rating in new], dtype=np.float64)
+        old = np.array([np.nan if rating is None else rating for rating in old], dtype=np.float64)
+        added = rating_pair_hashes(movie_ids, np.nan_to_num(new)).tolist()
+        removed = rating_pair_hashes(movie_ids, np.nan_to_num(old)).tolist()
+
+        deltas, changed = {}, 0
+        for user_id, new_rating, old_rating, added_hash, removed_hash in zip(
+                user_ids, new.tolist(), old.tolist(), added, removed):
+            delta = deltas.setdefault(user_id, [0.0, 0, 0])
+            if new_rating == new_rating:
+                delta[0] += new_rating
+                delta[1] += 1
+                delta[2] += added_hash
+            if old_rating == old_rating:
+                delta[0] -= old_rating
+                delta[1] -= 1
+                delta[2] -= removed_hash
+            changed += new_rating == new_rating or old_rating == old_rating
+
+        stats = {row[0]: row[1:] for row in conn.execute(
+            'SELECT user_id, rating_sum, rating_count, ratings_fingerprint FROM user_rating_stats '
+            'WHERE user_id IN (SELECT DISTINCT user_id FROM rating_changes)'
+        ).fetchall()}
+        change_seq = self._next_change_seq(conn)
+        stats_rows = []
+        for user_id, (rating_delta, count_delta, hash_delta) in deltas.items():
+            rating_sum, rating_count, fingerprint = stats.get(user_id, (0.0, 0, format_fingerprint(0)))
+            stats_rows.append((user_id, rating_sum + rating_delta, rating_count + count_delta,
+                               format_fingerprint(int(fingerprint, 16) + hash_delta), change_seq))
+        conn.executemany(
+            'INSERT OR REPLACE INTO user_rating_stats '
+            '(user_id, rating_sum, rating_count, ratings_fingerprint, change_seq) VALUES (?, ?, ?, ?, ?)',
+            stats_rows
+        )
+
+        conn.execute(
+            'INSERT INTO user_ratings (user_id, movie_id, rating, timestamp) '
+            'SELECT user_id, movie_id, rating, timestamp FROM rating_changes WHERE rating IS NOT NULL '
+            'ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating, timestamp = excluded.timestamp'
+        )
+        conn.execute(
+            'DELETE FROM user_ratings WHERE (user_id, movie_id) IN '
+            '(SELECT user_id, movie_id FROM rating_changes WHERE rating IS NULL)'
+        )
+        conn.execute('DELETE FROM rating_changes')
+        return changed
+
+    def save_rating(self, user_id, movie_id, rating):
+        try:
+            with self._write_transaction() as conn:
+                self._apply_changes(conn, [(user_id, movie_id, rating)], datetime.now())
             return True
         except Exception as e:
             print(f"Ошибка при сохранении оценки: {e}")
             return False
 
+    def apply_rating_changes(self, user_id, ratings, deletions=()):
+        """Сохраняет и удаляет оценки пользователя одной транзакцией.
+
+        ratings - словарь movie_id -> rating, deletions - movie_id, оценки которых нужно удалить.
+        """
+        changes = [(user_id, movie_id, rating) for movie_id, rating in ratings.items()]
+        changes += [(user_id, movie_id, None) for movie_id in deletions]
+        try:
+            with self._write_transaction() as conn:
+                self._apply_changes(conn, changes, datetime.now())
+            return True
+        except Exception as e:
+            print(f"Ошибка при сохранении изменений оценок: {e}")
+            return False
+
+    def save_ratings_bulk(self, ratings, batch_size=10000):
+        """Массовая загрузка оценок: (user_id, movie_id, rating) или (user_id, movie_id, rating, timestamp).
+
+        Оценки пишутся пачками по batch_size, каждая пачка - одна транзакция с UPSERT, повторная
+        оценка того же фильма заменяет прежнюю. Возвращает число записанных строк.
+        """
+        written = 0
+        batch = []
+        now = datetime.now()
+
+        def write(batch):
+            with self._write_transaction() as conn:
+                self._apply_changes(conn, batch, now)
+            return len(batch)
+
+        try:
+            for row in ratings:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    written += write(batch)
+                    batch = []
+            if batch:
+                written += write(batch)
+        except Exception as e:
+            print(f"Ошибка при массовой загрузке оценок (записано {written}): {e}")
+        return written
+
+    def export_ratings(self, user_id=None, chunksize=10000):
+        """Оценки одного или всех пользователей блоками DataFrame (userId, movieId, rating, timestamp).
+
+        Блоки читаются по первичному ключу, так что память не зависит от размера таблицы, а колонки
+        совпадают с ratings.csv и подходят для UserItemMatrix.from_chunks.
+        """
+        query = 'SELECT id, user_id, movie_id, rating, timestamp FROM user_ratings WHERE id > ?'
+        if user_id is not None:
+            query += ' AND user_id = ?'
+        query += ' ORDER BY id LIMIT ?'
+
+        last_id = 0
+        while True:
+            params = (last_id, user_id, chunksize) if user_id is not None else (last_id, chunksize)
+            try:
+                rows = self._connection().execute(query, params).fetchall()
+            except Exception as e:
+                print(f"Ошибка при выгрузке оценок: {e}")
+                return
+            if not rows:
+                return
+
+            last_id = rows[-1][0]
+            chunk = pd.DataFrame([row[1:] for row in rows], columns=['userId', 'movieId', 'rating', 'timestamp'])
+            yield chunk
+
     def get_user_ratings(self, user_id):
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
+            cursor = self._connection().execute(
                 'SELECT movie_id, rating FROM user_ratings WHERE user_id = ?',
                 (user_id,)
             )
-            ratings = cursor.fetchall()
-            conn.close()
-            return {str(movie_id): rating for movie_id, rating in ratings}
+            return {str(movie_id): rating for movie_id, rating in cursor.fetchall()}
         except Exception as e:
             print(f"Ошибка при получении оценок пользователя: {e}")
             return {}
@@ -124,15 +412,191 @@ class UserDatabase:
     def delete_rating(self, user_id, movie_id):
  
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                'DELETE FROM user_ratings WHERE user_id = ? AND movie_id = ?',
-                (user_id, movie_id)
-            )
-            conn.commit()
-            conn.close()
+            with self._write_transaction() as conn:
+                self._apply_changes(conn, [(user_id, movie_id, None)], datetime.now())
             return True
         except Exception as e:
             print(f"Ошибка при удалении оценки: {e}")
             return False
+
+    def iter_users_ratings(self, users_per_page=1000):
+        """Оценки всех пользователей по одному: (user_id, {movie_id: rating}).
+
+        Читается постранично по user_id, каждая страница целиком, поэтому во время обхода в базу
+        можно писать (например, готовые рекомендации).
+        """
+        last_user_id = -1
+        while True:
+            try:
+                conn = self._connection()
+                user_ids = [row[0] for row in conn.execute(
+                    'SELECT DISTINCT user_id FROM user_ratings WHERE user_id > ? ORDER BY user_id LIMIT ?',
+                    (last_user_id, users_per_page)
+                ).fetchall()]
+                if not user_ids:
+                    return
+                rows = conn.execute(
+                    'SELECT user_id, movie_id, rating FROM user_ratings WHERE user_id BETWEEN ? AND ?',
+                    (user_ids[0], user_ids[-1])
+                ).fetchall()
+            except Exception as e:
+                print(f"Ошибка при чтении оценок пользователей: {e}")
+                return
+
+            page = {user_id: {} for user_id in user_ids}
+            for user_id, movie_id, rating in rows:
+                page[user_id][str(movie_id)] = rating
+            yield from page.items()
+            last_user_id = user_ids[-1]
+
+    def save_precomputed_recommendations(self, rows, fingerprints, method, model_version=None):
+        """Заменяет готовые рекомендации пользователей одной транзакцией.
+
+        rows - последовательность (user_id, rank, movie_id, score),
+        fingerprints - словарь user_id -> отпечаток оценок, по которым они посчитаны,
+        method и model_version - способ рекомендаций и версия пакета моделей расчета.
+        """
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany('DELETE FROM precomputed_recommendations WHERE user_id = ?',
+                                 [(user_id,) for user_id in fingerprints])
+                computed_at = datetime.now()
+                conn.executemany(
+                    'INSERT INTO precomputed_recommendations '
+                    '(user_id, rank, movie_id, score, ratings_fingerprint, method, model_version, computed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    ((user_id, rank, movie_id, score, fingerprints[user_id], method, model_version, computed_at)
+                     for user_id, rank, movie_id, score in rows)
+                )
+            return True
+        except Exception as e:
+            print(f"Ошибка при сохранении готовых рекомендаций: {e}")
+            return False
+
+    def get_precomputed_recommendations(self, user_id):
+        """Готовые рекомендации пользователя: (отпечаток оценок, способ, версия пакета моделей,
+        [(movie_id, score), ...]) или (None, None, None, [])"""
+        try:
+            rows = self._connection().execute(
+                'SELECT movie_id, score, ratings_fingerprint, method, model_version FROM precomputed_recommendations '
+                'WHERE user_id = ? ORDER BY rank',
+                (user_id,)
+            ).fetchall()
+            if not rows:
+                return None, None, None, []
+            return rows[0][2], rows[0][3], rows[0][4], [(movie_id, score) for movie_id, score, *_ in rows]
+        except Exception as e:
+            print(f"Ошибка при получении готовых рекомендаций: {e}")
+            return None, None, None, []
+
+    def get_rated_movies(self, user_id, movie_ids):
+        """Множество movie_id из переданных, которые пользователь оценил"""
+        try:
+            return set(self._current_ratings(self._connection(), user_id, list(movie_ids)))
+        except Exception as e:
+            print(f"Ошибка при проверке оценок пользователя: {e}")
+            return set()
+
+    def get_user_profile(self, user_id):
+        """Готовая статистика профиля пользователя (StoredUserProfile) без чтения его оценок"""
+        try:
+            # Один запрос - один согласованный снимок статистики
+            rows = self._connection().execute(
+                'SELECT s.rating_sum, s.rating_count, s.ratings_fingerprint, g.genre, g.weight_sum '
+                'FROM user_rating_stats s LEFT JOIN user_genre_stats g ON g.user_id = s.user_id '
+                'WHERE s.user_id = ?',
+                (user_id,)
+            ).fetchall()
+        except Exception as e:
+            print(f"Ошибка при получении профиля пользователя: {e}")
+            return None
+
+        if not rows:
+            return StoredUserProfile(self, user_id, {}, 0.0, 0, format_fingerprint(0))
+        rating_sum, rating_count, fingerprint = rows[0][:3]
+        genre_sums = {genre: weight_sum for *_, genre, weight_sum in rows if genre is not None}
+        return StoredUserProfile(self, user_id, genre_sums, rating_sum, rating_count, fingerprint)
+
+    def get_changed_ratings(self, since=None):
+        """Все текущие оценки пользователей, у которых оценки менялись после номера изменения since.
+
+        Возвращает (последний номер изменения, массив user_id, DataFrame userId, movieId, rating).
+        Пользователи, удалившие все оценки, есть в user_id, но не в таблице. Все читается одним
+        снимком базы; since=None - все пользователи. Следующий вызов с возвращенным номером вернет
+        только то, что изменилось после этого чтения.
+        """
+        since = -1 if since is None else since
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN')
+            try:
+                last_seq = conn.execute('SELECT COALESCE(MAX(change_seq), 0) FROM user_rating_stats').fetchone()[0]
+                user_ids = [row[0] for row in conn.execute(
+                    'SELECT user_id FROM user_rating_stats WHERE change_seq > ? ORDER BY user_id', (since,)
+                ).fetchall()]
+                rows = conn.execute(
+                    'SELECT r.user_id, r.movie_id, r.rating FROM user_rating_stats s '
+                    'JOIN user_ratings r ON r.user_id = s.user_id WHERE s.change_seq > ?',
+                    (since,)
+                ).fetchall()
+            finally:
+                conn.execute('COMMIT')
+        except Exception as e:
+            print(f"Ошибка при чтении измененных оценок: {e}")
+            return since, np.array([], dtype=np.int64), pd.DataFrame(columns=['userId', 'movieId', 'rating'])
+
+        ratings = pd.DataFrame(rows, columns=['userId', 'movieId', 'rating'])
+        return max(last_seq, since), np.array(user_ids, dtype=np.int64), ratings
+
+    def sync_movie_genres(self, movie_genres):
+        """Задает жанры фильмов (пары movie_id, жанр) для статистики профилей.
+
+        Если набор изменился (или задается впервые), таблица movie_genres заменяется и статистика
+        всех пользователей пересчитывается по их оценкам. Возвращает True, если был пересчет.
+        """
+        pairs = sorted({(int(movie_id), str(genre)) for movie_id, genre in movie_genres})
+        digest = hashlib.sha1(repr(pairs).encode('utf-8')).hexdigest()
+        row = self._connection().execute("SELECT value FROM settings WHERE key = 'movie_genres'").fetchone()
+        if row and row[0] == digest:
+            return False
+
+        with self._write_transaction() as conn:
+            conn.execute('DELETE FROM movie_genres')
+            conn.executemany('INSERT INTO movie_genres (movie_id, genre) VALUES (?, ?)', pairs)
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('movie_genres', ?)", (digest,))
+        self.rebuild_profile_stats()
+        print(f"Жанры фильмов обновлены: {len(pairs)} пар фильм-жанр, статистика профилей пересчитана")
+        return True
+
+    def rebuild_profile_stats(self, chunksize=100000):
+        """Пересчитывает статистику профилей всех пользователей по таблице user_ratings"""
+        with self._write_transaction() as conn:
+            conn.execute('DELETE FROM user_genre_stats')
+            conn.execute(
+                'INSERT INTO user_genre_stats (user_id, genre, weight_sum) '
+                'SELECT r.user_id, g.genre, SUM(r.rating) FROM user_ratings r '
+                'JOIN movie_genres g ON g.movie_id = r.movie_id GROUP BY r.user_id, g.genre'
+            )
+
+            totals = {}
+            cursor = conn.execute('SELECT user_id, movie_id, rating FROM user_ratings')
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                user_ids, movie_ids, ratings = (np.array(column) for column in zip(*rows))
+                hashes = rating_pair_hashes(movie_ids, ratings)
+                for user_id, rating, pair_hash in zip(user_ids.tolist(), ratings.tolist(), hashes.tolist()):
+                    rating_sum, rating_count, fingerprint = totals.get(user_id, (0.0, 0, 0))
+                    totals[user_id] = (rating_sum + rating, rating_count + 1, fingerprint + pair_hash)
+
+            # Статистика всех пользователей получает новый номер изменения
+            change_seq = self._next_change_seq(conn)
+            conn.execute('DELETE FROM user_rating_stats')
+            conn.executemany(
+                'INSERT INTO user_rating_stats (user_id, rating_sum, rating_count, ratings_fingerprint, change_seq) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((user_id, rating_sum, rating_count, format_fingerprint(fingerprint), change_seq)
+                 for user_id, (rating_sum, rating_count, fingerprint) in totals.items())
+            )